@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/3.2/ref/settings/
 """
 
 import os
+from datetime import timedelta
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -55,13 +56,19 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # first, so the time includes the rest of the middleware
+    "core.middleware.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
+    # has to come before anything that reads or changes the response body
+    "core.middleware.CompressionMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    # after AuthenticationMiddleware, it checks the user. Off without PROFILE_DIR
+    "core.middleware.ProfilerMiddleware",
 ]
 
 ROOT_URLCONF = "app.urls"
@@ -84,6 +91,11 @@ TEMPLATES = [
 
 WSGI_APPLICATION = "app.wsgi.application"
 
+# "uwsgi" (default) or "asgi" - see scripts/run.sh
+SERVER_MODE = os.environ.get("SERVER_MODE", "uwsgi")
+# under ASGI the read-only recipe/tag/ingredient views run in the thread pool
+ASYNC_READ_VIEWS = SERVER_MODE == "asgi"
+
 
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
@@ -99,6 +111,41 @@ DATABASES = {
     }
 }
 
+# read replicas, e.g. DB_REPLICA_HOSTS=replica1,replica2 (same name and credentials).
+# In tests they mirror the default db.
+DATABASE_REPLICAS = []
+for i, host in enumerate(filter(None, os.environ.get("DB_REPLICA_HOSTS", "").split(","))):
+    DATABASES[f"replica_{i}"] = {
+        **DATABASES["default"],
+        "HOST": host,
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_REPLICAS.append(f"replica_{i}")
+
+DATABASE_ROUTERS = ["core.db_routers.ReplicaRouter"]
+# after writing, a user keeps reading from the primary for this many seconds
+REPLICA_PIN_SECONDS = int(os.environ.get("REPLICA_PIN_SECONDS", 5))
+
+# shared cache (memcached) if configured, otherwise every process has its own
+if os.environ.get("MEMCACHED_LOCATION"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.memcached.PyMemcacheCache",
+            "LOCATION": os.environ["MEMCACHED_LOCATION"].split(","),
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+# per process, for things that have to keep working when memcached is down
+CACHES["local"] = {
+    "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    "LOCATION": "local",
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -119,6 +166,35 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# argon2, bcrypt or pbkdf2. The others stay in the list so existing hashes still
+# work, and are rehashed with the preferred one when the user logs in
+PASSWORD_HASHER = os.environ.get("PASSWORD_HASHER", "argon2")
+_HASHERS = {
+    "argon2": "core.hashers.Argon2PasswordHasher",
+    "bcrypt": "core.hashers.BCryptSHA256PasswordHasher",
+    "pbkdf2": "django.contrib.auth.hashers.PBKDF2PasswordHasher",
+}
+PASSWORD_HASHERS = [_HASHERS[PASSWORD_HASHER]] + [
+    hasher for name, hasher in _HASHERS.items() if name != PASSWORD_HASHER
+]
+# OWASP's minimum for argon2id (19MiB, 2 passes, 1 lane)
+ARGON2_TIME_COST = int(os.environ.get("ARGON2_TIME_COST", 2))
+ARGON2_MEMORY_COST = int(os.environ.get("ARGON2_MEMORY_COST", 19456))
+ARGON2_PARALLELISM = int(os.environ.get("ARGON2_PARALLELISM", 1))
+# OWASP minimum, 12 (django's default) is ~4x slower
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", 10))
+
+AUTHENTICATION_BACKENDS = ["core.backends.PasswordBackend"]
+# check passwords in a bounded thread pool, refusing logins when it's full
+PASSWORD_CHECK_OFFLOAD = bool(int(os.environ.get("PASSWORD_CHECK_OFFLOAD", 0)))
+PASSWORD_CHECK_WORKERS = int(
+    os.environ.get("PASSWORD_CHECK_WORKERS", os.cpu_count() or 1)
+)
+PASSWORD_CHECK_QUEUE = int(
+    os.environ.get("PASSWORD_CHECK_QUEUE", PASSWORD_CHECK_WORKERS * 4)
+)
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/3.2/topics/i18n/
 
@@ -140,7 +216,7 @@ STATIC_URL = "/static/static/"
 MEDIA_URL = "/static/media/"
 
 MEDIA_ROOT = "vol/web/media"
-STATIC_ROOT = "/vol/web/static"
+STATIC_ROOT = os.environ.get("STATIC_ROOT", "/vol/web/static")
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
@@ -150,11 +226,123 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 #
 AUTH_USER_MODEL = "core.User"
 
+# orjson backed renderer/parser - FAST_JSON=0 switches back to DRF's stdlib ones
+FAST_JSON = bool(int(os.environ.get("FAST_JSON", 1)))
+
 REST_FRAMEWORK = {
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
+    "DEFAULT_RENDERER_CLASSES": [
+        "core.renderers.ORJSONRenderer"
+        if FAST_JSON
+        else "rest_framework.renderers.JSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+    "DEFAULT_PARSER_CLASSES": [
+        "core.parsers.ORJSONParser" if FAST_JSON else "rest_framework.parsers.JSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ],
+    "DEFAULT_THROTTLE_CLASSES": [
+        "core.throttling.AnonSlidingWindowThrottle",
+        "core.throttling.UserSlidingWindowThrottle",
+        "core.throttling.ScopedSlidingWindowThrottle",
+    ],
+    # e.g. THROTTLE_RATE_TOKEN=5/min, an empty value turns the throttle off
+    "DEFAULT_THROTTLE_RATES": {
+        scope: os.environ.get(f"THROTTLE_RATE_{scope.upper()}", rate) or None
+        for scope, rate in [
+            ("anon", "300/min"),
+            ("user", "1200/min"),
+            ("token", "10/min"),
+            ("image_upload", "30/min"),
+            ("list", "120/min"),
+            ("write", "300/min"),
+        ]
+    },
+    # nginx is the only proxy in front of the app, X-Forwarded-For's last entry
+    # is the client address it saw
+    "NUM_PROXIES": int(os.environ.get("NUM_PROXIES", 1)),
 }
 
+# API tokens expire TOKEN_TTL after they were last used (checked at most every
+# TOKEN_REFRESH_INTERVAL, to not write on every request) and TOKEN_MAX_AGE after
+# they were issued no matter what
+TOKEN_TTL = timedelta(seconds=int(os.environ.get("TOKEN_TTL", 7 * 24 * 3600)))
+TOKEN_REFRESH_INTERVAL = timedelta(
+    seconds=int(os.environ.get("TOKEN_REFRESH_INTERVAL", 3600))
+)
+TOKEN_MAX_AGE = timedelta(seconds=int(os.environ.get("TOKEN_MAX_AGE", 30 * 24 * 3600)))
+
+# where the throttles keep their counters, and where they go when that's down
+THROTTLE_CACHE = os.environ.get("THROTTLE_CACHE", "default")
+THROTTLE_FALLBACK_CACHE = "local"
+
+# responses smaller than this aren't worth compressing
+COMPRESSION_MIN_SIZE = int(os.environ.get("COMPRESSION_MIN_SIZE", 1024))
+GZIP_LEVEL = int(os.environ.get("GZIP_LEVEL", 6))
+# brotli quality above ~5 gets very slow for dynamic responses
+BROTLI_QUALITY = int(os.environ.get("BROTLI_QUALITY", 4))
+
+# list responses with more rows than this are streamed instead of built in memory
+STREAMING_LIST_THRESHOLD = int(os.environ.get("STREAMING_LIST_THRESHOLD", 200))
+STREAMING_CHUNK_SIZE = int(os.environ.get("STREAMING_CHUNK_SIZE", 200))
+
+# most recipes a single bulk update/delete request may touch
+BULK_RECIPE_LIMIT = int(os.environ.get("BULK_RECIPE_LIMIT", 500))
+
+# most changes a single sync request returns
+SYNC_PAGE_SIZE = int(os.environ.get("SYNC_PAGE_SIZE", 500))
+
+# how long the response to a request with an Idempotency-Key header is kept for
+# replaying retries, and how long a retry waits for the first request to finish
+IDEMPOTENCY_KEY_TTL = timedelta(
+    seconds=int(os.environ.get("IDEMPOTENCY_KEY_TTL", 24 * 3600))
+)
+IDEMPOTENCY_LOCK_TIMEOUT = float(os.environ.get("IDEMPOTENCY_LOCK_TIMEOUT", 10))
+
+# readiness checks (core.health): seconds all of them get together, seconds a
+# result is reused for, and the free space the media volume needs
+HEALTH_CHECK_TIMEOUT = float(os.environ.get("HEALTH_CHECK_TIMEOUT", 2))
+HEALTH_CHECK_CACHE_SECONDS = float(os.environ.get("HEALTH_CHECK_CACHE_SECONDS", 5))
+HEALTH_CHECK_MEDIA_MIN_FREE_MB = int(
+    os.environ.get("HEALTH_CHECK_MEDIA_MIN_FREE_MB", 100)
+)
+
+# query fingerprint stats and slow query logging (core.querylog), off by default.
+# A SLOW_QUERY_MS query is logged, QUERY_EXPLAIN_RATE of the slow SELECTs with
+# their EXPLAIN ANALYZE plan (runs them a second time)
+QUERY_INSIGHTS = bool(int(os.environ.get("QUERY_INSIGHTS", 0)))
+SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", 200))
+QUERY_EXPLAIN_RATE = float(os.environ.get("QUERY_EXPLAIN_RATE", 0))
+
+# request profiles (core.middleware.ProfilerMiddleware): where the .prof files
+# go (unset turns profiling off), fraction of all requests profiled, and how
+# many of the newest files are kept
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "")
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", 0))
+PROFILE_KEEP = int(os.environ.get("PROFILE_KEEP", 200))
+
+# directory the worker processes keep their metrics in (core.metrics), so the
+# metrics endpoint can add them all up. Unset, each process only has its own
+METRICS_DIR = os.environ.get("METRICS_DIR", "")
+# when set, api/metrics/ wants "Authorization: Bearer <token>"
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+
+# background tasks (core.tasks): seconds a worker has to finish a task before
+# another one may take it, base delay of the exponential backoff between tries
+TASK_VISIBILITY_TIMEOUT = int(os.environ.get("TASK_VISIBILITY_TIMEOUT", 300))
+TASK_RETRY_DELAY = int(os.environ.get("TASK_RETRY_DELAY", 10))
+TASK_MAX_ATTEMPTS = int(os.environ.get("TASK_MAX_ATTEMPTS", 5))
+TASK_BATCH_SIZE = int(os.environ.get("TASK_BATCH_SIZE", 10))
+TASK_WORKER_PROCESSES = int(os.environ.get("TASK_WORKER_PROCESSES", 2))
+
 # this is necessary for being able to upload images via the browser API interface
 SPECTACULAR_SETTINGS = {
     "COMPONENT_SPLIT_REQUEST": True,
 }
+
+# generate the OpenAPI schema once instead of on every request (off while developing,
+# since the schema changes along with the code)
+SCHEMA_CACHE = bool(int(os.environ.get("SCHEMA_CACHE", int(not DEBUG))))
+# rendered schemas are also kept here, if set (the image prerenders them at build time)
+SCHEMA_CACHE_DIR = os.environ.get("SCHEMA_CACHE_DIR")
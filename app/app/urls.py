@@ -21,22 +21,25 @@ from django.urls import path, include
 from django.conf.urls.static import static
 from django.conf import settings
 
-# for generating API docs
-from drf_spectacular.views import (
-    SpectacularAPIView,
-    SpectacularSwaggerView,
-)
-
 from core import views as core_views
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/health-check/", core_views.health_check, name="health-check"),
-    # for the Spectacular view
-    path("api/schema/", SpectacularAPIView.as_view(), name="api-schema"),
+    path("api/health-check/ready/", core_views.ready, name="readiness"),
+    path("api/metrics/", core_views.metrics, name="metrics"),
+    # the Spectacular view is imported on first use, drf_spectacular is heavy
+    path(
+        "api/schema/",
+        core_views.lazy_view("core.schema.CachedSpectacularAPIView"),
+        name="api-schema",
+    ),
     path(
         "api/docs/",
-        SpectacularSwaggerView.as_view(url_name="api-schema"),
+        core_views.lazy_view(
+            "drf_spectacular.views.SpectacularSwaggerView",
+            url_name="api-schema",
+        ),
         name="api-docs",
     ),
     path("api/user/", include("user.urls")),
@@ -7,10 +7,24 @@ For more information on this file, see
 https://docs.djangoproject.com/en/3.2/howto/deployment/wsgi/
 """
 
+import gc
 import os
+from importlib import import_module
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
 
 application = get_wsgi_application()
+
+# Django only imports the urls (and with them all the views, serializers,
+# DRF...) on the first request. Doing it here means uWSGI does it once in the
+# master before forking, instead of every worker doing it on its first request.
+if os.environ.get("WSGI_PRELOAD", "1") == "1":
+    import_module(settings.ROOT_URLCONF)
+
+# Everything loaded so far lives for the whole process. Freezing it keeps the
+# garbage collector from writing to those objects, which would otherwise
+# un-share the copy-on-write pages the forked workers got from the master.
+gc.freeze()
@@ -4,3 +4,16 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from django.conf import settings
+        from django.db.backends.signals import connection_created
+
+        from core import metrics
+
+        # counts the queries of every connection for the metrics
+        connection_created.connect(metrics.install_query_counter)
+        if settings.QUERY_INSIGHTS:
+            from core import querylog
+
+            connection_created.connect(querylog.install)
@@ -0,0 +1,49 @@
+"""Authentication with expiring tokens"""
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+from core.models import ExpiringToken
+
+
+def issue_token(user):
+    """Create a new token for a login"""
+    return ExpiringToken.objects.create(user=user)
+
+
+class ExpiringTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication for ExpiringToken, sliding the expiry as it's used
+
+    Moving the expiry means a write, so it's only done when the token hasn't
+    been extended for TOKEN_REFRESH_INTERVAL - at most one UPDATE per token per
+    interval instead of one per request.
+    """
+
+    model = ExpiringToken
+
+    def authenticate_credentials(self, key):
+        now = timezone.now()
+        try:
+            token = self.model.objects.select_related("user").get(key=key)
+        except self.model.DoesNotExist:
+            raise exceptions.AuthenticationFailed(_("Invalid token."))
+
+        if token.expires <= now:
+            raise exceptions.AuthenticationFailed(_("Token has expired."))
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(
+                _("User inactive or deleted.")
+            )
+
+        expires = min(now + settings.TOKEN_TTL, token.max_expires)
+        if expires - token.expires >= settings.TOKEN_REFRESH_INTERVAL:
+            # filter on the old value so concurrent requests don't fight
+            self.model.objects.filter(key=key, expires__lt=expires).update(
+                expires=expires
+            )
+            token.expires = expires
+
+        return (token.user, token)
@@ -0,0 +1,50 @@
+"""Authentication backends"""
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+from core.hashers import PasswordCheckBusy, verify_password
+
+
+class PasswordBackend(ModelBackend):
+    """ModelBackend doing the password check through core.hashers
+
+    The hashing can then run in the bounded pool (PASSWORD_CHECK_OFFLOAD),
+    while the queries and saving an upgraded hash stay in the request thread.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        UserModel = get_user_model()
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = UserModel._default_manager.get_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            # hash anyway, so it doesn't take less time than for existing users
+            self._verify(request, password, None)
+            return None
+
+        is_correct, new_encoded = self._verify(
+            request, password, user.password
+        )
+        if not is_correct:
+            return None
+        if new_encoded:
+            # older hasher or cost - rehash now that we have the password
+            user.password = new_encoded
+            user.save(update_fields=["password"])
+        if self.user_can_authenticate(user):
+            return user
+        return None
+
+    def _verify(self, request, password, encoded):
+        try:
+            return verify_password(password, encoded)
+        except PasswordCheckBusy:
+            # a failed login for the admin, which can't answer with a 503.
+            # CreateTokenView looks for the flag and does
+            if request is not None:
+                request.password_check_busy = True
+            return False, None
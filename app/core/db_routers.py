@@ -0,0 +1,105 @@
+"""Database router sending reads of selected views to the read replicas"""
+
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.permissions import SAFE_METHODS
+
+from core import metrics
+
+# set while a view that opted in (ReplicaReadMixin) handles a safe request
+_use_replicas = ContextVar("use_replicas", default=False)
+
+
+@contextmanager
+def read_from_replicas():
+    """Route the reads inside the block to a replica (if there are any)"""
+    token = _use_replicas.set(True)
+    try:
+        yield
+    finally:
+        _use_replicas.reset(token)
+
+
+def _pin_key(user):
+    return f"replica-pin:{user.pk}"
+
+
+def pin_to_primary(user):
+    """Read from the primary for a while, so the user sees their own writes"""
+    cache.set(_pin_key(user), True, settings.REPLICA_PIN_SECONDS)
+
+
+def is_pinned(user):
+    pinned = bool(cache.get(_pin_key(user)))
+    result = "hit" if pinned else "miss"
+    metrics.CACHE_REQUESTS.inc(cache="replica_pin", result=result)
+    return pinned
+
+
+class ReplicaRouter:
+    """Send reads to a random replica while `read_from_replicas` is active
+
+    Everything else - writes, migrations and reads outside of opted-in views -
+    goes to the default database.
+    """
+
+    def db_for_read(self, model, **hints):
+        if not _use_replicas.get() or not settings.DATABASE_REPLICAS:
+            return None
+        # inside a transaction we have to see our own (uncommitted) writes
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # the replicas have the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaReadMixin:
+    """Serve the safe requests of a DRF view from the read replicas
+
+    Authentication still reads from the primary (a token created a moment ago
+    may not be on the replicas yet), and a user who just wrote something keeps
+    reading from the primary for REPLICA_PIN_SECONDS.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if (
+            request.method not in SAFE_METHODS
+            or not settings.DATABASE_REPLICAS
+        ):
+            return
+        if request.user.is_authenticated and is_pinned(request.user):
+            return
+        self._replica_token = _use_replicas.set(True)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if (
+            request.method not in SAFE_METHODS
+            and response.status_code < 400
+            and settings.DATABASE_REPLICAS
+            and request.user.is_authenticated
+        ):
+            pin_to_primary(request.user)
+        return super().finalize_response(request, response, *args, **kwargs)
+
+    def dispatch(self, request, *args, **kwargs):
+        self._replica_token = None
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            if self._replica_token is not None:
+                _use_replicas.reset(self._replica_token)
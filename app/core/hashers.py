@@ -0,0 +1,164 @@
+"""Password hashers with configurable cost, and off-thread password checks"""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from core import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class Argon2PasswordHasher(hashers.Argon2PasswordHasher):
+    """Argon2 with the cost taken from the settings
+
+    Django's defaults (100MiB, 8 lanes) are a lot for a web worker. Changing
+    the settings makes `must_update` true for older hashes, so they get
+    rehashed the next time the user logs in.
+    """
+
+    @property
+    def time_cost(self):
+        return settings.ARGON2_TIME_COST
+
+    @property
+    def memory_cost(self):
+        return settings.ARGON2_MEMORY_COST
+
+    @property
+    def parallelism(self):
+        return settings.ARGON2_PARALLELISM
+
+
+class BCryptSHA256PasswordHasher(hashers.BCryptSHA256PasswordHasher):
+    """bcrypt with the number of rounds taken from the settings"""
+
+    @property
+    def rounds(self):
+        return settings.BCRYPT_ROUNDS
+
+
+def _verify(password, encoded):
+    """Check a password, returning (is correct, new hash if it needs upgrading)
+
+    Same as django's check_password with a setter, minus the saving - so it
+    only burns CPU and can run in any thread. `encoded=None` hashes the
+    password anyway, so unknown users take as long as known ones.
+    """
+    if encoded is None:
+        hashers.make_password(password)
+        return False, None
+    if not hashers.check_password(password, encoded):
+        return False, None
+    preferred = hashers.get_hasher("default")
+    hasher = hashers.identify_hasher(encoded)
+    if hasher.algorithm != preferred.algorithm or preferred.must_update(
+        encoded
+    ):
+        return True, hashers.make_password(password, hasher=preferred)
+    return True, None
+
+
+class PasswordCheckBusy(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Too many logins in progress, try again in a moment."
+    default_code = "password_check_busy"
+    # becomes the Retry-After header
+    wait = 1
+
+
+class PasswordCheckPool:
+    """Bounded thread pool for password checks
+
+    At most `workers` hashes run at once per process, so logins can't take all
+    the CPU away from other requests, and at most `queue` more wait for a
+    thread. Anything past that is refused right away with a 503 instead of
+    piling up. The hashers release the GIL, so the threads really run in
+    parallel.
+    """
+
+    def __init__(self, workers=None, queue=None):
+        self.workers = workers
+        self.queue = queue
+        self._executor = None
+        self._slots = None
+        self._lock = threading.Lock()
+        self.metrics = {
+            "checks": 0,
+            "rejected": 0,
+            "in_flight": 0,
+            "wait_seconds": 0.0,
+            "check_seconds": 0.0,
+        }
+
+    def _setup(self):
+        # created lazily - threads don't survive uWSGI forking the workers
+        with self._lock:
+            if self._executor is None:
+                workers = self.workers or settings.PASSWORD_CHECK_WORKERS
+                queue = self.queue
+                if queue is None:
+                    queue = settings.PASSWORD_CHECK_QUEUE
+                self._slots = threading.BoundedSemaphore(workers + queue)
+                self._executor = ThreadPoolExecutor(
+                    workers, thread_name_prefix="password-check"
+                )
+
+    def _count(self, **changes):
+        with self._lock:
+            for name, value in changes.items():
+                self.metrics[name] += value
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.metrics)
+
+    def run(self, func, *args):
+        """Run func(*args) in the pool and return its result"""
+        if self._executor is None:
+            self._setup()
+        if not self._slots.acquire(blocking=False):
+            self._count(rejected=1)
+            metrics.PASSWORD_CHECKS_REJECTED.inc()
+            logger.warning("Password check queue full, refusing login")
+            raise PasswordCheckBusy()
+
+        self._count(in_flight=1)
+        queued = time.perf_counter()
+
+        def job():
+            started = time.perf_counter()
+            try:
+                return func(*args)
+            finally:
+                self._count(
+                    checks=1,
+                    wait_seconds=started - queued,
+                    check_seconds=time.perf_counter() - started,
+                )
+
+        try:
+            return self._executor.submit(job).result()
+        finally:
+            self._count(in_flight=-1)
+            self._slots.release()
+
+
+password_pool = PasswordCheckPool()
+
+
+def verify_password(password, encoded):
+    """Check a password inline, or in the pool with PASSWORD_CHECK_OFFLOAD"""
+    started = time.perf_counter()
+    if settings.PASSWORD_CHECK_OFFLOAD:
+        result = password_pool.run(_verify, password, encoded)
+    else:
+        result = _verify(password, encoded)
+    metrics.PASSWORD_CHECK_SECONDS.observe(time.perf_counter() - started)
+    return result
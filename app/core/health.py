@@ -0,0 +1,156 @@
+"""Readiness checks - database, cache and media volume - with bounded cost
+
+Every check runs in a small thread pool and gets HEALTH_CHECK_TIMEOUT seconds,
+so a hanging database or NFS mount makes the probe fail instead of hang. The
+result is kept for HEALTH_CHECK_CACHE_SECONDS and only one request per process
+runs the checks at a time, however many probes come in.
+"""
+
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+def check_database(alias):
+    conn = connections[alias]
+    try:
+        with conn.cursor() as cursor:
+            # in case the connection is fine but the server is stuck
+            timeout_ms = int(settings.HEALTH_CHECK_TIMEOUT * 1000)
+            cursor.execute("SET statement_timeout = %s", [timeout_ms])
+            cursor.execute("SELECT 1")
+    finally:
+        # the pool's threads shouldn't hold on to connections
+        conn.close()
+
+
+def check_cache():
+    key = f"health-check:{os.getpid()}"
+    value = str(time.time())
+    cache.set(key, value, 60)
+    if cache.get(key) != value:
+        raise RuntimeError("Value written to the cache didn't come back")
+
+
+def check_media():
+    root = settings.MEDIA_ROOT
+    # the storage creates it on the first upload too
+    os.makedirs(root, exist_ok=True)
+    with tempfile.NamedTemporaryFile(
+        dir=root, prefix=".health-check-"
+    ) as probe:
+        probe.write(b"ok")
+        probe.flush()
+        os.fsync(probe.fileno())
+    free = shutil.disk_usage(root).free
+    if free < settings.HEALTH_CHECK_MEDIA_MIN_FREE_MB * 1024 * 1024:
+        raise RuntimeError(
+            f"Only {free // (1024 * 1024)} MB left on the media volume"
+        )
+    return {"free_mb": free // (1024 * 1024)}
+
+
+def get_checks():
+    """(name, function, whether failing it makes the process not ready)"""
+    # a replica that's down shouldn't take the primary out of rotation too,
+    # so they're only reported like the cache
+    checks = [
+        (
+            f"database:{alias}",
+            lambda alias=alias: check_database(alias),
+            alias not in settings.DATABASE_REPLICAS,
+        )
+        for alias in settings.DATABASES
+    ]
+    # the app copes without memcached (see core.throttling), only reported
+    checks.append(("cache", check_cache, False))
+    checks.append(("media", check_media, True))
+    return checks
+
+
+class Readiness:
+    """Runs the checks and keeps the result for a short while"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        self._result = None
+        self._checked = 0.0
+
+    def _pool(self):
+        # created lazily and again after a fork - threads don't survive it
+        if self._pid != os.getpid():
+            self._executor = ThreadPoolExecutor(
+                len(get_checks()), thread_name_prefix="health-check"
+            )
+            self._pid = os.getpid()
+        return self._executor
+
+    def _run(self):
+        checks = get_checks()
+        pool = self._pool()
+        started = {}
+        futures = {}
+        for name, func, _ in checks:
+            started[name] = time.perf_counter()
+            futures[name] = pool.submit(func)
+        # one deadline for all of them, they run at the same time
+        deadline = time.perf_counter() + settings.HEALTH_CHECK_TIMEOUT
+        results = {}
+        for name, _, critical in checks:
+            result = {"ok": True, "critical": critical}
+            try:
+                details = futures[name].result(
+                    max(deadline - time.perf_counter(), 0)
+                )
+                result.update(details or {})
+            except FutureTimeout:
+                result.update(ok=False, error="Timed out")
+                logger.warning("Health check %s timed out", name)
+            except Exception as exc:
+                result.update(ok=False, error=str(exc) or repr(exc))
+                logger.warning("Health check %s failed", name, exc_info=True)
+            result["seconds"] = round(time.perf_counter() - started[name], 4)
+            results[name] = result
+        ready = all(r["ok"] for r in results.values() if r["critical"])
+        return {"ready": ready, "checks": results}
+
+    def check(self):
+        """Return {"ready": ..., "checks": {...}, "age": seconds since run}"""
+        with self._lock:
+            now = time.monotonic()
+            if self._result is None or now - self._checked >= (
+                settings.HEALTH_CHECK_CACHE_SECONDS
+            ):
+                self._result = self._run()
+                self._checked = now = time.monotonic()
+            return {**self._result, "age": round(now - self._checked, 2)}
+
+    def clear(self):
+        with self._lock:
+            self._result = None
+
+
+def without_details(result):
+    """Just which checks failed - the errors can name hosts and paths"""
+    checks = {}
+    for name, check in result["checks"].items():
+        checks[name] = {"ok": check["ok"], "critical": check["critical"]}
+        if not check["ok"]:
+            checks[name]["error"] = "failed"
+    return {**result, "checks": checks}
+
+
+readiness = Readiness()
@@ -0,0 +1,148 @@
+"""Replaying the response to retried requests (Idempotency-Key header)"""
+
+import functools
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import OperationalError, connection, transaction
+from django.http import QueryDict
+from django.utils import timezone
+from psycopg2 import errorcodes
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.response import Response
+
+from core.models import IdempotencyKey
+
+HEADER = "Idempotency-Key"
+
+
+class IdempotencyKeyInUse(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = (
+        "A request with this Idempotency-Key is still being processed."
+    )
+    default_code = "idempotency_key_in_use"
+
+
+class IdempotencyKeyMismatch(APIException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = (
+        "This Idempotency-Key was already used for a different request."
+    )
+    default_code = "idempotency_key_mismatch"
+
+
+def _digest(value):
+    if isinstance(value, UploadedFile):
+        digest = hashlib.sha256()
+        for chunk in value.chunks():
+            digest.update(chunk)
+        value.seek(0)
+        return f"{value.name}:{digest.hexdigest()}"
+    return value
+
+
+def fingerprint(request):
+    """sha256 of the method, path and (parsed) body of a request"""
+    data = request.data
+    if isinstance(data, QueryDict):
+        # multipart - the raw body is gone by now, files are hashed instead
+        data = {
+            name: [_digest(v) for v in values] for name, values in data.lists()
+        }
+    body = json.dumps(data, sort_keys=True, cls=DjangoJSONEncoder)
+    return hashlib.sha256(
+        f"{request.method} {request.path}\n{body}".encode()
+    ).digest()
+
+
+def _claim(user_id, key, digest):
+    """Store the key, returning True if this request gets to run
+
+    A retry of a request that's still running waits here - postgres makes the
+    INSERT wait for the first transaction's uncommitted row. Once that commits
+    it's a conflict (so replay the response), if it rolled back the retry runs.
+    Expired keys are taken over.
+    """
+    table = connection.ops.quote_name(IdempotencyKey._meta.db_table)
+    now = timezone.now()
+    timeout = f"{int(settings.IDEMPOTENCY_LOCK_TIMEOUT * 1000)}ms"
+    with connection.cursor() as cursor:
+        # only for this statement, not the queries of the view
+        cursor.execute(
+            "SELECT current_setting('lock_timeout'), "
+            "set_config('lock_timeout', %s, true)",
+            [timeout],
+        )
+        previous = cursor.fetchone()[0]
+        cursor.execute(
+            f"INSERT INTO {table} AS k (user_id, key, fingerprint, expires) "
+            "VALUES (%s, %s, %s, %s) ON CONFLICT (user_id, key) DO UPDATE "
+            "SET fingerprint = EXCLUDED.fingerprint, status_code = NULL, "
+            "data = NULL, expires = EXCLUDED.expires "
+            "WHERE k.expires < %s RETURNING id",
+            [user_id, key, digest, now + settings.IDEMPOTENCY_KEY_TTL, now],
+        )
+        claimed = cursor.fetchone() is not None
+        cursor.execute(
+            "SELECT set_config('lock_timeout', %s, true)", [previous]
+        )
+    return claimed
+
+
+def idempotent(method):
+    """Make a view method replay its response to retries with the same key
+
+    Requests without the header run as usual. The first request with a key
+    runs in a transaction together with storing its response, so a crash
+    halfway leaves nothing behind. Error responses aren't stored, a retry runs
+    the request again.
+    """
+
+    @functools.wraps(method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return method(self, request, *args, **kwargs)
+        if len(key) > 255:
+            raise ValidationError(
+                {HEADER: ["Ensure it has no more than 255 characters."]}
+            )
+
+        digest = fingerprint(request)
+        queryset = IdempotencyKey.objects.filter(user=request.user, key=key)
+        with transaction.atomic():
+            try:
+                with transaction.atomic():
+                    claimed = _claim(request.user.pk, key, digest)
+            except OperationalError as exc:
+                # waited IDEMPOTENCY_LOCK_TIMEOUT for the first request
+                pgcode = getattr(exc.__cause__, "pgcode", None)
+                if pgcode == errorcodes.LOCK_NOT_AVAILABLE:
+                    raise IdempotencyKeyInUse()
+                raise
+
+            if not claimed:
+                stored = queryset.get()
+                if bytes(stored.fingerprint) != digest:
+                    raise IdempotencyKeyMismatch()
+                return Response(
+                    stored.data,
+                    status=stored.status_code,
+                    headers={"Idempotent-Replayed": "true"},
+                )
+
+            response = method(self, request, *args, **kwargs)
+            if status.is_success(response.status_code):
+                queryset.update(
+                    status_code=response.status_code, data=response.data
+                )
+            else:
+                queryset.delete()
+        return response
+
+    return wrapper
@@ -0,0 +1,81 @@
+"""Django command comparing the JSON renderers/parsers on recipe payloads"""
+
+import io
+import timeit
+from collections import OrderedDict
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.serializer_helpers import ReturnList
+
+from core.parsers import ORJSONParser
+from core.renderers import ORJSONRenderer
+
+
+def make_payload(size):
+    """Build a list response that looks like the recipe list/detail output"""
+    recipes = [
+        OrderedDict(
+            id=i,
+            title=f"Recipe number {i}",
+            time_minutes=i % 120,
+            price=Decimal("5.25") + i % 100,
+            link="http://example.com/recipe.pdf",
+            description="Some longer description of the recipe " * 3,
+            image=f"http://example.com/static/media/uploads/recipe/{i}.jpg",
+            tags=[OrderedDict(id=t, name=f"Tag {t}") for t in range(3)],
+            ingredients=[
+                OrderedDict(id=n, name=f"Ingredient {n}") for n in range(6)
+            ],
+        )
+        for i in range(size)
+    ]
+    return ReturnList(recipes, serializer=None)
+
+
+class Command(BaseCommand):
+    """Django command for benchmarking the JSON renderers and parsers"""
+
+    help = "Benchmark stdlib vs orjson rendering/parsing across response sizes"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            default="1,10,100,1000,10000",
+            help="Comma-separated number of recipes per payload",
+        )
+        parser.add_argument(
+            "--repeat", type=int, default=5, help="Best of N timing runs"
+        )
+
+    def _best(self, func, repeat, number):
+        return min(timeit.repeat(func, repeat=repeat, number=number)) / number
+
+    def handle(self, *args, **options):
+        repeat = options["repeat"]
+        implementations = [
+            ("stdlib", JSONRenderer(), JSONParser()),
+            ("orjson", ORJSONRenderer(), ORJSONParser()),
+        ]
+        self.stdout.write(
+            f"{'size':>7} {'impl':>7} {'bytes':>10} "
+            f"{'render ms':>10} {'parse ms':>10}"
+        )
+        for size in [int(s) for s in options["sizes"].split(",")]:
+            data = make_payload(size)
+            # keep each measurement around ~0.2s no matter the payload size
+            number = max(1, 2000 // size)
+            for name, renderer, parser in implementations:
+                body = renderer.render(data)
+                render = self._best(
+                    lambda: renderer.render(data), repeat, number
+                )
+                parse = self._best(
+                    lambda: parser.parse(io.BytesIO(body)), repeat, number
+                )
+                self.stdout.write(
+                    f"{size:>7} {name:>7} {len(body):>10} "
+                    f"{render * 1000:>10.3f} {parse * 1000:>10.3f}"
+                )
@@ -0,0 +1,69 @@
+"""Django command to measure how many logins per second a core can check"""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.hashers import get_hasher
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from core.hashers import _verify
+
+
+class Command(BaseCommand):
+    """Django command timing the password check of each configured hasher"""
+
+    help = "Benchmark password checks (logins/s) per hasher and thread count"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--hashers",
+            default="argon2,bcrypt_sha256,pbkdf2_sha256",
+            help="Comma-separated hasher algorithms",
+        )
+        parser.add_argument("--seconds", type=float, default=2.0)
+        parser.add_argument(
+            "--threads",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Threads for the parallel run",
+        )
+
+    def _rate(self, encoded, seconds, threads):
+        def worker():
+            checks = 0
+            deadline = time.perf_counter() + seconds
+            while time.perf_counter() < deadline:
+                _verify("benchmark-password", encoded)
+                checks += 1
+            return checks
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(threads) as executor:
+            total = sum(executor.map(lambda _: worker(), range(threads)))
+        return total / (time.perf_counter() - started)
+
+    def handle(self, *args, **options):
+        cores = os.cpu_count() or 1
+        threads = options["threads"]
+        self.stdout.write(
+            f"{'hasher':>14} {'ms/check':>9} {'logins/s/core':>14} "
+            f"{f'logins/s ({threads} threads)':>24}"
+        )
+        for algorithm in options["hashers"].split(","):
+            hasher = get_hasher(algorithm)
+            encoded = hasher.encode("benchmark-password", hasher.salt())
+            # make this hasher the preferred one, so nothing gets "upgraded"
+            with override_settings(
+                PASSWORD_HASHERS=[
+                    f"{type(hasher).__module__}.{type(hasher).__name__}"
+                ]
+            ):
+                single = self._rate(encoded, options["seconds"], 1)
+                parallel = self._rate(encoded, options["seconds"], threads)
+            self.stdout.write(
+                f"{algorithm:>14} {1000 / single:>9.1f} {single:>14.1f} "
+                f"{parallel:>24.1f}"
+            )
+        self.stdout.write(f"({cores} cores available)")
@@ -0,0 +1,103 @@
+"""Django command to measure how much time the throttles add to each request"""
+
+import pickle
+import time
+import timeit
+from types import SimpleNamespace
+
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from rest_framework.throttling import UserRateThrottle
+
+from core.throttling import ScopedSlidingWindowThrottle
+
+
+class View:
+    throttle_scope = "benchmark"
+
+
+class Command(BaseCommand):
+    """Django command comparing DRF's throttle with the sliding window one"""
+
+    help = "Benchmark the per-request throttle overhead by request history"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--cache",
+            default="default",
+            help="Cache alias to keep the counters in",
+        )
+        parser.add_argument(
+            "--history",
+            default="10,100,1000,10000",
+            help="Comma-separated requests already made in the window",
+        )
+        parser.add_argument("--number", type=int, default=200)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def _request(self):
+        request = Request(APIRequestFactory().get("/api/recipe/recipes/"))
+        request.user = SimpleNamespace(pk=1, is_authenticated=True)
+        return request
+
+    def _drf(self, cache, rate, history):
+        throttle_class = type(
+            "Throttle", (UserRateThrottle,), {"rate": rate, "cache": cache}
+        )
+        throttle = throttle_class()
+        request = self._request()
+        # DRF keeps one timestamp per request made in the window
+        key = throttle.get_cache_key(request, View())
+        cache.set(key, [time.time()] * history, 3600)
+
+        def hit():
+            throttle_class().allow_request(request, View())
+
+        return hit, lambda: cache.get(key)
+
+    def _sliding(self, cache, rate, history):
+        throttle_class = type(
+            "Throttle",
+            (ScopedSlidingWindowThrottle,),
+            {"get_rate": lambda s: rate},
+        )
+        request = self._request()
+        # keep the prefilled counter in the current window for the whole run
+        now = time.time()
+        throttle = throttle_class()
+        throttle.allow_request(request, View())
+        key = f"throttle:benchmark:user-1:{int(now // 3600)}"
+        cache.set(key, history, 7200)
+
+        def hit():
+            throttle_class().allow_request(request, View())
+
+        return hit, lambda: cache.get(key)
+
+    def handle(self, *args, **options):
+        cache = caches[options["cache"]]
+        number, repeat = options["number"], options["repeat"]
+        self.stdout.write(
+            f"{'history':>8} {'throttle':>9} "
+            f"{'us/request':>11} {'stored bytes':>13}"
+        )
+        with override_settings(THROTTLE_CACHE=options["cache"]):
+            for history in [int(h) for h in options["history"].split(",")]:
+                # high enough that nothing gets throttled during the run
+                rate = f"{history * 2 + number * repeat * 2}/hour"
+                for name, setup in [
+                    ("drf", self._drf),
+                    ("sliding", self._sliding),
+                ]:
+                    cache.clear()
+                    hit, stored = setup(cache, rate, history)
+                    best = min(
+                        timeit.repeat(hit, repeat=repeat, number=number)
+                    )
+                    self.stdout.write(
+                        f"{history:>8} {name:>9} {best / number * 1e6:>11.1f} "
+                        f"{len(pickle.dumps(stored())):>13}"
+                    )
@@ -0,0 +1,27 @@
+"""Django command to check if there are any unapplied migrations"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.migrations.executor import MigrationExecutor
+
+
+class Command(BaseCommand):
+    """Exit with status 1 if migrations need to be applied
+
+    Much cheaper than running `migrate` when there's nothing to do - that one
+    always goes through the post_migrate handlers (content types, permissions).
+    """
+
+    help = "Exit with a non-zero status if there are unapplied migrations"
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        executor = MigrationExecutor(connections[options["database"]])
+        plan = executor.migration_plan(executor.loader.graph.leaf_nodes())
+        if plan:
+            raise CommandError(
+                f"{len(plan)} unapplied migration(s)", returncode=1
+            )
+        self.stdout.write("No unapplied migrations")
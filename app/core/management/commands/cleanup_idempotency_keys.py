@@ -0,0 +1,12 @@
+"""Django command to delete expired idempotency keys"""
+
+from core.management.commands import cleanup_tokens
+from core.models import IdempotencyKey
+
+
+class Command(cleanup_tokens.Command):
+    """Delete expired idempotency keys in batches, like cleanup_tokens"""
+
+    help = "Delete expired idempotency keys in batches"
+    model = IdempotencyKey
+    label = "idempotency keys"
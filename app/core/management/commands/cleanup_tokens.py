@@ -0,0 +1,52 @@
+"""Django command to delete expired API tokens"""
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.models import ExpiringToken
+
+
+class Command(BaseCommand):
+    """Delete expired tokens a batch at a time
+
+    Each batch is its own short DELETE by primary key, so rows are only locked
+    for a moment and logins/requests carry on while it runs. Meant to be run
+    periodically (cron, a scheduled container, ...).
+    """
+
+    help = "Delete expired API tokens in batches"
+    # any model with an indexed `expires` column works
+    model = ExpiringToken
+    label = "tokens"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=0.1,
+            help="Seconds to pause between batches",
+        )
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        deleted = 0
+        while True:
+            # uses the index on expires
+            expired = self.model.objects.filter(expires__lt=now)
+            pks = list(
+                expired.values_list("pk", flat=True)[: options["batch_size"]]
+            )
+            if not pks:
+                break
+            count, _ = self.model.objects.filter(
+                pk__in=pks, expires__lt=now
+            ).delete()
+            deleted += count
+            if len(pks) < options["batch_size"]:
+                break
+            time.sleep(options["sleep"])
+
+        self.stdout.write(f"Deleted {deleted} expired {self.label}")
@@ -0,0 +1,42 @@
+"""Django command to render the OpenAPI schema ahead of time"""
+
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+from django.urls import reverse
+
+from core.schema import CachedSpectacularAPIView, clear_schema_cache
+
+
+class Command(BaseCommand):
+    """Django command filling SCHEMA_CACHE_DIR, e.g. when building the image"""
+
+    help = "Render the OpenAPI schema in every format into SCHEMA_CACHE_DIR"
+
+    def handle(self, *args, **options):
+        if not settings.SCHEMA_CACHE_DIR:
+            raise CommandError("SCHEMA_CACHE_DIR isn't set")
+
+        # start from scratch, so the files match the current code
+        os.makedirs(settings.SCHEMA_CACHE_DIR, exist_ok=True)
+        for name in os.listdir(settings.SCHEMA_CACHE_DIR):
+            if name.startswith("schema-"):
+                os.remove(os.path.join(settings.SCHEMA_CACHE_DIR, name))
+        clear_schema_cache()
+
+        view = CachedSpectacularAPIView.as_view()
+        url = reverse("api-schema")
+        for renderer in CachedSpectacularAPIView.renderer_classes:
+            request = RequestFactory().get(
+                url, HTTP_ACCEPT=renderer.media_type
+            )
+            response = view(request)
+            if response.status_code != 200:
+                raise CommandError(
+                    f"{renderer.media_type}: got status {response.status_code}"
+                )
+            self.stdout.write(f"Rendered {renderer.media_type}")
+
+        self.stdout.write(self.style.SUCCESS("Schema rendered"))
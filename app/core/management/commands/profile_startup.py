@@ -0,0 +1,121 @@
+"""Django command to profile what a fresh worker spends its startup time on"""
+
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+
+# runs in a fresh interpreter, so nothing is imported or cached yet
+WARMUP_SCRIPT = """
+import json, os, time
+timings = []
+start = last = time.perf_counter()
+
+def phase(name):
+    global last
+    now = time.perf_counter()
+    timings.append((name, now - last))
+    last = now
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "app.settings")
+import django
+phase("import django")
+django.setup()
+phase("django.setup() (settings, apps, models)")
+
+from django.conf import settings
+from django.urls import get_resolver
+from importlib import import_module
+import_module(settings.ROOT_URLCONF)
+phase("import urlconf (views, serializers, DRF)")
+get_resolver()._populate()
+phase("populate url resolver")
+
+from django.test import Client
+settings.ALLOWED_HOSTS.append("testserver")
+client = Client()
+for path in json.loads(os.environ["PROFILE_STARTUP_PATHS"]):
+    client.get(path)
+    phase(f"first GET {path}")
+    client.get(path)
+    phase(f"second GET {path}")
+
+timings.append(("total", time.perf_counter() - start))
+print(json.dumps(timings))
+"""
+
+
+def parse_importtime(stderr):
+    """Parse `-X importtime` output into (module, self us, cumulative us)"""
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line.split(":", 1)[1].split("|")
+        modules.append((name.strip(), int(self_us), int(cumulative_us)))
+    return modules
+
+
+class Command(BaseCommand):
+    """Django command for profiling imports and first-request warm-up"""
+
+    help = (
+        "Report per-module import cost and the first-request warm-up breakdown"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--top", type=int, default=20, help="Number of modules to show"
+        )
+        parser.add_argument(
+            "--path",
+            action="append",
+            dest="paths",
+            help="URL to request during warm-up (can be repeated)",
+        )
+
+    def handle(self, *args, **options):
+        paths = options["paths"] or [
+            "/api/health-check/",
+            "/api/recipe/recipes/",
+        ]
+        env = dict(os.environ, PROFILE_STARTUP_PATHS=json.dumps(paths))
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", WARMUP_SCRIPT],
+            capture_output=True,
+            text=True,
+            env=env,
+            cwd=os.getcwd(),
+        )
+        if result.returncode != 0:
+            raise CommandError(result.stderr.strip().splitlines()[-1])
+
+        modules = parse_importtime(result.stderr)
+        packages = defaultdict(int)
+        for name, self_us, _ in modules:
+            packages[name.split(".")[0]] += self_us
+
+        self.stdout.write(self.style.MIGRATE_HEADING("Import time by package"))
+        for name, total in sorted(packages.items(), key=lambda p: -p[1])[
+            : options["top"]
+        ]:
+            self.stdout.write(f"  {total / 1000:>8.1f} ms  {name}")
+
+        self.stdout.write(
+            self.style.MIGRATE_HEADING(
+                "Slowest modules (cumulative, incl. imports)"
+            )
+        )
+        for name, _, cumulative in sorted(modules, key=lambda m: -m[2])[
+            : options["top"]
+        ]:
+            self.stdout.write(f"  {cumulative / 1000:>8.1f} ms  {name}")
+
+        self.stdout.write(self.style.MIGRATE_HEADING("Warm-up"))
+        for name, seconds in json.loads(
+            result.stdout.strip().splitlines()[-1]
+        ):
+            self.stdout.write(f"  {seconds * 1000:>8.1f} ms  {name}")
@@ -0,0 +1,120 @@
+"""Django command running the background task workers"""
+
+import multiprocessing
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.utils.module_loading import autodiscover_modules
+
+from core import tasks
+
+OUTCOMES = ["done", "retry", "failed"]
+
+
+class Command(BaseCommand):
+    """Run queued tasks in a pool of worker processes
+
+    Each process polls the queue on its own, taking a batch of due tasks at a
+    time. SIGTERM/SIGINT stop them after the task they're on.
+    """
+
+    help = "Run background tasks from the task queue"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--processes", type=int, default=settings.TASK_WORKER_PROCESSES
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=settings.TASK_BATCH_SIZE
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=1.0,
+            help="Seconds to wait when the queue is empty",
+        )
+        parser.add_argument(
+            "--stats-interval",
+            type=float,
+            default=60.0,
+            help="Seconds between throughput reports",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Run whatever is due in this process and exit",
+        )
+
+    def _work(self, stop, counters, options):
+        """Worker loop, in each of the pool's processes"""
+        worker = tasks.worker_name()
+        while not stop.is_set():
+            started = time.perf_counter()
+            outcomes = tasks.run_pending(worker, options["batch_size"])
+            with counters["seconds"].get_lock():
+                counters["seconds"].value += time.perf_counter() - started
+            for outcome in outcomes:
+                with counters[outcome].get_lock():
+                    counters[outcome].value += 1
+            if not outcomes:
+                if options["once"]:
+                    break
+                stop.wait(options["poll_interval"])
+
+    def _child(self, stop, counters, options):
+        try:
+            self._work(stop, counters, options)
+        finally:
+            connections.close_all()
+
+    def _report(self, counters, since, previous):
+        done = {name: int(counters[name].value) for name in OUTCOMES}
+        elapsed = time.monotonic() - since
+        rate = (done["done"] - previous) / elapsed if elapsed else 0
+        stats = tasks.queue_stats()
+        self.stdout.write(
+            f"{done['done']} done ({rate:.1f}/s), {done['retry']} retried, "
+            f"{done['failed']} failed, "
+            f"{counters['seconds'].value:.1f}s busy | "
+            f"queue: {stats['due']} due, {stats['running']} running, "
+            f"oldest {stats['oldest_due_seconds']:.1f}s"
+        )
+        return done["done"]
+
+    def handle(self, *args, **options):
+        # registers the @task functions of every app
+        autodiscover_modules("tasks")
+        context = multiprocessing.get_context("fork")
+        stop = context.Event()
+        counters = {name: context.Value("q", 0) for name in OUTCOMES}
+        counters["seconds"] = context.Value("d", 0.0)
+
+        if not options["once"]:
+            for signum in (signal.SIGTERM, signal.SIGINT):
+                signal.signal(signum, lambda *_: stop.set())
+
+        since = time.monotonic()
+        if options["once"] or options["processes"] <= 1:
+            self._work(stop, counters, options)
+            self._report(counters, since, 0)
+            return
+
+        # each process opens its own connection, none may be inherited
+        connections.close_all()
+        processes = [
+            context.Process(target=self._child, args=(stop, counters, options))
+            for _ in range(options["processes"])
+        ]
+        for process in processes:
+            process.start()
+
+        previous = 0
+        while any(process.is_alive() for process in processes):
+            time.sleep(1)
+            if time.monotonic() - since >= options["stats_interval"]:
+                previous = self._report(counters, since, previous)
+                since = time.monotonic()
+        self._report(counters, since, previous)
@@ -1,5 +1,5 @@
 """Django command to wait for the db to be available"""
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 from django.db.utils import OperationalError
 
 import time
@@ -9,9 +9,31 @@ from psycopg2 import OperationalError as Psycopg2Error
 class Command(BaseCommand):
     """Django commmand to wait for database."""
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--initial-interval",
+            type=float,
+            default=0.1,
+            help="Seconds to wait after the first failed attempt",
+        )
+        parser.add_argument(
+            "--max-interval",
+            type=float,
+            default=2.0,
+            help="Upper limit for the (doubling) wait between attempts",
+        )
+        parser.add_argument(
+            "--timeout",
+            type=float,
+            default=60.0,
+            help="Give up after this many seconds (0 waits forever)",
+        )
+
     def handle(self, *args, **options):
         # this will be shown in console
         self.stdout.write("Waiting for database...")
+        interval = options["initial_interval"]
+        deadline = time.monotonic() + options["timeout"]
         # boolean value to track if our db is up yet
         db_up = False
         while db_up is False:
@@ -20,7 +42,19 @@ class Command(BaseCommand):
                 self.check(databases=["default"])
                 db_up = True
             except (Psycopg2Error, OperationalError):
-                self.stdout.write("db unavailable, waiting 1 second...")
-                time.sleep(1)
+                if (
+                    options["timeout"]
+                    and time.monotonic() + interval > deadline
+                ):
+                    raise CommandError(
+                        "Database unavailable after "
+                        f"{options['timeout']:g} seconds"
+                    )
+                self.stdout.write(
+                    f"db unavailable, waiting {interval:g} seconds..."
+                )
+                time.sleep(interval)
+                # exponential backoff - quick retries first, then ease off
+                interval = min(interval * 2, options["max_interval"])
 
         self.stdout.write(self.style.SUCCESS("Database available!"))
@@ -0,0 +1,377 @@
+"""Prometheus-style counters and histograms, added up over all worker processes
+
+uWSGI runs several worker processes, and a scrape only reaches one of them.
+With METRICS_DIR set, every process keeps its values in its own mmap'ed file
+in there and the metrics endpoint adds up the files of all of them. The files
+of workers that have been recycled since are added to archive.db on the next
+scrape and removed, so counters don't go backwards and the files don't pile
+up. Without it (dev, tests) the values just live in the process.
+"""
+
+import bisect
+import fcntl
+import glob
+import json
+import mmap
+import os
+import struct
+import threading
+from contextvars import ContextVar
+
+from django.conf import settings
+
+# queries made by the current request and the request, see MetricsMiddleware
+request_queries = ContextVar("request_queries", default=None)
+current_request = ContextVar("current_request", default=None)
+
+# the values of dead processes, see _merge_dead
+ARCHIVE_FILE = "archive.db"
+
+
+def _padding(length):
+    # so the value after the 4 byte length and the key is 8-byte aligned
+    return (8 - (4 + length) % 8) % 8
+
+
+def _read(buffer):
+    """Yield (key, value, value position) of the samples in a values file"""
+    if len(buffer) < 8:
+        # just created by its process
+        return
+    used = struct.unpack_from("i", buffer, 0)[0]
+    pos = 8
+    while pos < used:
+        length = struct.unpack_from("i", buffer, pos)[0]
+        pos += 4
+        end = pos + length
+        key = bytes(buffer[pos:end]).decode()
+        pos = end + _padding(length)
+        yield key, struct.unpack_from("d", buffer, pos)[0], pos
+        pos += 8
+
+
+class _Values:
+    """The samples of this process, in memory"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def add(self, key, amount):
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def items(self):
+        with self._lock:
+            return list(self._values.items())
+
+
+class _FileValues:
+    """The samples of this process, in a file the other processes can read
+
+    A header with the bytes used, then per sample the key length, the key and
+    the value as a double. Adding to a sample seen before is a pack_into on the
+    mmap - no syscall.
+    """
+
+    INITIAL_SIZE = 1 << 16
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        # held for as long as the process lives, which is how _merge_dead
+        # tells the files of dead processes apart
+        while True:
+            self._file = open(path, "a+b")
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+            if os.fstat(self._file.fileno()).st_nlink:
+                break
+            # merged and removed while we were waiting for the lock
+            self._file.close()
+        size = os.fstat(self._file.fileno()).st_size
+        if size == 0:
+            size = self.INITIAL_SIZE
+            self._file.truncate(size)
+        self._map = mmap.mmap(self._file.fileno(), size)
+        if struct.unpack_from("i", self._map, 0)[0] == 0:
+            struct.pack_into("i", self._map, 0, 8)
+        # a recycled pid picks up where the old process left off
+        self._positions = {key: pos for key, _, pos in _read(self._map)}
+
+    def _append(self, key):
+        encoded = key.encode()
+        entry = (
+            struct.pack("i", len(encoded))
+            + encoded
+            + b" " * _padding(len(encoded))
+            + struct.pack("d", 0.0)
+        )
+        used = struct.unpack_from("i", self._map, 0)[0]
+        if used + len(entry) > len(self._map):
+            size = len(self._map) * 2
+            while used + len(entry) > size:
+                size *= 2
+            self._file.truncate(size)
+            self._map.close()
+            self._map = mmap.mmap(self._file.fileno(), size)
+        end = used + len(entry)
+        self._map[used:end] = entry
+        # readers only look at entries before `used`, so it goes last
+        struct.pack_into("i", self._map, 0, used + len(entry))
+        return used + len(entry) - 8
+
+    def add(self, key, amount):
+        with self._lock:
+            pos = self._positions.get(key)
+            if pos is None:
+                pos = self._positions[key] = self._append(key)
+            value = struct.unpack_from("d", self._map, pos)[0]
+            struct.pack_into("d", self._map, pos, value + amount)
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+
+def _merge_dead(directory):
+    """Add the files of dead processes to the archive and remove them
+
+    Every file that isn't locked is left over from a process that's gone.
+    """
+    archive = None
+    try:
+        for path in glob.glob(os.path.join(directory, "*.db")):
+            if os.path.basename(path) == ARCHIVE_FILE:
+                continue
+            with open(path, "rb") as values_file:
+                try:
+                    fcntl.flock(values_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue
+                if not os.fstat(values_file.fileno()).st_nlink:
+                    # another scrape merged it first
+                    continue
+                if archive is None:
+                    # its lock keeps other scrapes from merging too
+                    archive = _FileValues(
+                        os.path.join(directory, ARCHIVE_FILE)
+                    )
+                for key, value, _ in _read(values_file.read()):
+                    archive.add(key, value)
+                os.remove(path)
+    finally:
+        if archive is not None:
+            archive.close()
+
+
+class Registry:
+    """The metrics of the app and where their values are kept"""
+
+    def __init__(self):
+        self.metrics = {}
+        self.collectors = []
+        self._lock = threading.Lock()
+        self._pid = None
+        self._values = None
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def _store(self):
+        # created lazily and again after a fork, one file per process
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    if settings.METRICS_DIR:
+                        path = os.path.join(
+                            settings.METRICS_DIR, f"{os.getpid()}.db"
+                        )
+                        self._values = _FileValues(path)
+                    else:
+                        self._values = _Values()
+                    self._pid = os.getpid()
+        return self._values
+
+    def add(self, sample, labels, amount):
+        labels = sorted((name, str(value)) for name, value in labels.items())
+        key = json.dumps([sample, labels])
+        self._store().add(key, amount)
+
+    def collect(self):
+        """Return {(sample name, sorted labels): value} over all processes"""
+        if settings.METRICS_DIR:
+            _merge_dead(settings.METRICS_DIR)
+            totals = {}
+            for path in glob.glob(os.path.join(settings.METRICS_DIR, "*.db")):
+                with open(path, "rb") as values_file:
+                    data = values_file.read()
+                for key, value, _ in _read(data):
+                    totals[key] = totals.get(key, 0.0) + value
+            items = totals.items()
+        else:
+            items = self._store().items()
+        samples = {}
+        for key, value in items:
+            sample, labels = json.loads(key)
+            samples[sample, tuple(map(tuple, labels))] = value
+        return samples
+
+    def get_sample_value(self, sample, **labels):
+        """Current value of one sample, e.g. for tests"""
+        labels = tuple(
+            sorted((name, str(value)) for name, value in labels.items())
+        )
+        return self.collect().get((sample, labels), 0.0)
+
+    def render(self):
+        """All metrics in the Prometheus text format"""
+        samples = self.collect()
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.render(samples))
+        for collect in self.collectors:
+            lines.extend(collect())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format(sample, labels, value):
+    if labels:
+        text = ",".join(f'{name}="{_escape(v)}"' for name, v in labels)
+        sample = f"{sample}{{{text}}}"
+    value = int(value) if float(value).is_integer() else repr(float(value))
+    return f"{sample} {value}"
+
+
+class Counter:
+    """A value that only goes up"""
+
+    type = "counter"
+
+    def __init__(self, name, documentation, registry=registry):
+        self.name = name
+        self.documentation = documentation
+        self.registry = registry
+        registry.register(self)
+
+    def inc(self, amount=1, **labels):
+        self.registry.add(self.name, labels, amount)
+
+    def render(self, samples):
+        for (sample, labels), value in sorted(samples.items()):
+            if sample == self.name:
+                yield _format(sample, labels, value)
+
+
+class Histogram:
+    """Observations counted in buckets, plus their sum and count"""
+
+    type = "histogram"
+    # seconds
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+    def __init__(
+        self, name, documentation, buckets=DEFAULT_BUCKETS, registry=registry
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self.bounds = [f"{bound:g}" for bound in buckets] + ["+Inf"]
+        self.registry = registry
+        registry.register(self)
+
+    def observe(self, value, **labels):
+        # only its own bucket, the counts are made cumulative when rendering
+        le = self.bounds[bisect.bisect_left(self.buckets, value)]
+        self.registry.add(f"{self.name}_bucket", {**labels, "le": le}, 1)
+        self.registry.add(f"{self.name}_sum", labels, value)
+        self.registry.add(f"{self.name}_count", labels, 1)
+
+    def render(self, samples):
+        series = {}
+        for (sample, labels), value in samples.items():
+            if sample == f"{self.name}_bucket":
+                labels = dict(labels)
+                le = labels.pop("le")
+                series.setdefault(tuple(sorted(labels.items())), {})[
+                    le
+                ] = value
+        for labels, buckets in sorted(series.items()):
+            total = 0
+            for le in self.bounds:
+                total += buckets.get(le, 0)
+                yield _format(
+                    f"{self.name}_bucket", labels + (("le", le),), total
+                )
+            for suffix in ("_sum", "_count"):
+                value = samples.get((f"{self.name}{suffix}", labels), 0)
+                yield _format(f"{self.name}{suffix}", labels, value)
+
+
+def gauge_lines(name, documentation, values):
+    """Lines for a gauge worked out at scrape time, for Registry.collectors"""
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} gauge"]
+    for labels, value in values:
+        labels = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        lines.append(_format(name, labels, value))
+    return lines
+
+
+# the app's metrics
+
+REQUESTS = Counter(
+    "http_requests_total",
+    "Requests by view (viewset.action), method and status",
+)
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "Time to the response by view (viewset.action)",
+)
+REQUEST_QUERIES = Histogram(
+    "http_request_db_queries",
+    "Database queries per request by view (viewset.action)",
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100),
+)
+DB_QUERIES = Counter(
+    "db_queries_total", "Database queries by connection alias"
+)
+CACHE_REQUESTS = Counter(
+    "cache_requests_total", "Cache lookups by what they're for and hit/miss"
+)
+IMAGE_UPLOAD_BYTES = Histogram(
+    "recipe_image_upload_bytes",
+    "Size of uploaded recipe images",
+    buckets=(16e3, 64e3, 256e3, 1e6, 4e6, 16e6),
+)
+LOGINS = Counter("logins_total", "Token requests by result")
+PASSWORD_CHECK_SECONDS = Histogram(
+    "password_check_seconds",
+    "Time to check a password, including waiting for the pool",
+)
+PASSWORD_CHECKS_REJECTED = Counter(
+    "password_checks_rejected_total",
+    "Logins refused because the pool was full",
+)
+
+
+def count_query(execute, sql, params, many, context):
+    """Database execute wrapper counting every query, see CoreConfig"""
+    counts = request_queries.get()
+    if counts is not None:
+        counts[0] += 1
+    DB_QUERIES.inc(alias=context["connection"].alias)
+    return execute(sql, params, many, context)
+
+
+def install_query_counter(sender, connection, **kwargs):
+    # connection_created fires on every reconnect of the same wrapper
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_query)
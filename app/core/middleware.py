@@ -0,0 +1,388 @@
+"""Middleware shared by the whole project"""
+
+import asyncio
+import cProfile
+import glob
+import gzip
+import logging
+import os
+import random
+import re
+import secrets
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_sequence
+from rest_framework.exceptions import AuthenticationFailed
+
+from core import metrics
+from core.authentication import ExpiringTokenAuthentication
+
+logger = logging.getLogger(__name__)
+
+# brotli is optional - without it we only ever negotiate gzip
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/vnd.oai.openapi",
+    "application/javascript",
+    "text/",
+)
+
+
+def _accepted_encodings(header):
+    """Parse Accept-Encoding into a {coding: q} dict"""
+    accepted = {}
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if coding:
+            accepted[coding.lower()] = q
+    return accepted
+
+
+def negotiate_encoding(header):
+    """Pick the best content-coding we support for an Accept-Encoding header"""
+    accepted = _accepted_encodings(header)
+    if brotli is not None and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+def _brotli_sequence(sequence, quality):
+    """Brotli counterpart of django.utils.text.compress_sequence"""
+    compressor = brotli.Compressor(quality=quality)
+    for item in sequence:
+        data = compressor.process(item)
+        # flush every chunk so streamed list items reach the client right away
+        data += compressor.flush()
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+class CompressionMiddleware:
+    """Compress responses with brotli or gzip, whichever the client prefers
+
+    Like django's GZipMiddleware, but it also speaks brotli and leaves small
+    responses alone since compressing them costs more CPU than it saves.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # same trick as django's MiddlewareMixin - marks us as async
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        return self.process_response(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        # compressing is plain CPU work that doesn't touch the db, so it
+        # doesn't need the one thread-sensitive thread django uses for that
+        return await sync_to_async(
+            self.process_response, thread_sensitive=False
+        )(request, response)
+
+    def process_response(self, request, response):
+        """Compress the response if it's big enough and the client takes it"""
+        if response.has_header("Content-Encoding"):
+            return response
+        content_type = response.get("Content-Type", "")
+        if not content_type.startswith(COMPRESSIBLE_TYPES):
+            return response
+        if (
+            not response.streaming
+            and len(response.content) < settings.COMPRESSION_MIN_SIZE
+        ):
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        encoding = negotiate_encoding(
+            request.META.get("HTTP_ACCEPT_ENCODING", "")
+        )
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            if encoding == "br":
+                response.streaming_content = _brotli_sequence(
+                    response.streaming_content, settings.BROTLI_QUALITY
+                )
+            else:
+                response.streaming_content = compress_sequence(
+                    response.streaming_content
+                )
+            # we don't know the final length anymore
+            del response["Content-Length"]
+        else:
+            if encoding == "br":
+                compressed = brotli.compress(
+                    response.content, quality=settings.BROTLI_QUALITY
+                )
+            else:
+                compressed = gzip.compress(
+                    response.content,
+                    compresslevel=settings.GZIP_LEVEL,
+                    mtime=0,
+                )
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response["Content-Length"] = str(len(response.content))
+
+        # the compressed body isn't byte-for-byte the same anymore, so the etag
+        # has to be weak (the same thing django's GZipMiddleware does)
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response["ETag"] = "W/" + etag
+        response["Content-Encoding"] = encoding
+
+        return response
+
+
+# anything else is counted as "other", so clients can't make up new series
+METRIC_METHODS = {"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"}
+
+
+def metric_method(request):
+    return request.method if request.method in METRIC_METHODS else "other"
+
+
+def view_label(request):
+    """Name of the view in the metrics, like RecipeViewSet.list or readiness"""
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "unmatched"
+    cls = getattr(match.func, "cls", None)
+    if cls is None:
+        return match.view_name
+    actions = getattr(match.func, "actions", None)
+    if actions:
+        method = metric_method(request).lower()
+        return f"{cls.__name__}.{actions.get(method, method)}"
+    return cls.__name__
+
+
+class MetricsMiddleware:
+    """Count requests and record their latency and number of queries
+
+    Streamed responses are recorded once their body is sent, so the time and
+    queries include generating it. If that fails they're counted as a 500,
+    whatever status went out.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        started, token = time.perf_counter(), metrics.request_queries.set([0])
+        request_token = metrics.current_request.set(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            counts = metrics.request_queries.get()
+            metrics.request_queries.reset(token)
+            metrics.current_request.reset(request_token)
+        if response.streaming:
+            response.streaming_content = self.record_streamed(
+                request,
+                response.status_code,
+                started,
+                counts,
+                response.streaming_content,
+            )
+        else:
+            self.record(
+                request,
+                response.status_code,
+                time.perf_counter() - started,
+                counts[0],
+            )
+        return response
+
+    async def __acall__(self, request):
+        # the list is shared with the threads the view runs in (sync_to_async
+        # copies the context, not the list)
+        started, token = time.perf_counter(), metrics.request_queries.set([0])
+        request_token = metrics.current_request.set(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            counts = metrics.request_queries.get()
+            metrics.request_queries.reset(token)
+            metrics.current_request.reset(request_token)
+        if response.streaming:
+            response.streaming_content = self.record_streamed(
+                request,
+                response.status_code,
+                started,
+                counts,
+                response.streaming_content,
+            )
+        else:
+            self.record(
+                request,
+                response.status_code,
+                time.perf_counter() - started,
+                counts[0],
+            )
+        return response
+
+    def record_streamed(self, request, status, started, counts, content):
+        """Pass the body through and record the request when it's done"""
+        try:
+            yield from content
+        except Exception:
+            status = 500
+            raise
+        finally:
+            # the body is generated in the view's context (iter_in_context),
+            # which counts its queries in the same list
+            seconds = time.perf_counter() - started
+            self.record(request, status, seconds, counts[0])
+
+    def record(self, request, status, seconds, queries):
+        view = view_label(request)
+        metrics.REQUESTS.inc(
+            view=view,
+            method=metric_method(request),
+            status=status,
+        )
+        metrics.REQUEST_SECONDS.observe(seconds, view=view)
+        metrics.REQUEST_QUERIES.observe(queries, view=view)
+
+
+def _is_staff(request):
+    # the session user (admin) or the user of the API token
+    if request.user.is_authenticated:
+        return request.user.is_staff
+    try:
+        result = ExpiringTokenAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return False
+    return bool(result) and result[0].is_staff
+
+
+class ProfilerMiddleware:
+    """Profile requests with cProfile, keeping the stats in PROFILE_DIR
+
+    Staff get a profile of a request by sending `X-Profile: 1` (or
+    `?profile=1`), and the response tells them the file in `X-Profile-File`.
+    PROFILE_SAMPLE_RATE of all requests are profiled as well. Only the newest
+    PROFILE_KEEP files are kept. Without PROFILE_DIR the middleware isn't
+    loaded at all, so it costs nothing.
+
+    uWSGI only - under ASGI the view doesn't run in the thread being profiled.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PROFILE_DIR or settings.SERVER_MODE == "asgi":
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+
+    def __call__(self, request):
+        requested = bool(
+            request.headers.get("X-Profile") or request.GET.get("profile")
+        ) and _is_staff(request)
+        if not requested and random.random() >= settings.PROFILE_SAMPLE_RATE:
+            return self.get_response(request)
+
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        profiler.enable()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.disable()
+        if response.streaming:
+            # named now, the header goes out before the body is generated
+            name = self.file_name(request, None)
+            response.streaming_content = self.profile_streamed(
+                profiler, name, response.streaming_content
+            )
+        else:
+            name = self.file_name(request, time.perf_counter() - started)
+            name = self.save(profiler, name)
+        if requested and name:
+            response["X-Profile-File"] = name
+        return response
+
+    def profile_streamed(self, profiler, name, content):
+        """Keep profiling while the body is generated, then save the stats"""
+        iterator = iter(content)
+        try:
+            while True:
+                profiler.enable()
+                try:
+                    chunk = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    profiler.disable()
+                yield chunk
+        finally:
+            self.save(profiler, name)
+
+    def file_name(self, request, seconds):
+        view = re.sub(r"[^\w.-]", "_", view_label(request))
+        took = "streamed" if seconds is None else f"{seconds * 1000:.0f}ms"
+        # the random part keeps quick requests in the same second apart
+        return (
+            f"{timezone.now():%Y%m%d-%H%M%S}-{view}-{request.method}"
+            f"-{took}-{secrets.token_hex(4)}.prof"
+        )
+
+    def save(self, profiler, name):
+        """Write the stats to PROFILE_DIR and drop the oldest files"""
+        try:
+            profiler.dump_stats(os.path.join(settings.PROFILE_DIR, name))
+            self.prune()
+        except OSError:
+            # the request is more important than its profile
+            logger.exception("Couldn't save a request profile")
+            return None
+        return name
+
+    def prune(self):
+        paths = glob.glob(os.path.join(settings.PROFILE_DIR, "*.prof"))
+        if len(paths) <= settings.PROFILE_KEEP:
+            return
+        paths.sort(key=os.path.getmtime)
+        for path in paths[: len(paths) - settings.PROFILE_KEEP]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                # another worker got to it first
+                pass
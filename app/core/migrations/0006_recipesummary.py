@@ -0,0 +1,107 @@
+# Generated by Django 3.2.25 on 2026-10-19 14:01
+
+from django.conf import settings
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_summaries(apps, schema_editor):
+    """Create the summaries of the recipes that already exist"""
+    Recipe = apps.get_model("core", "Recipe")
+    RecipeSummary = apps.get_model("core", "RecipeSummary")
+    ids = list(Recipe.objects.order_by("id").values_list("id", flat=True))
+    for start in range(0, len(ids), 1000):
+        recipes = Recipe.objects.filter(id__in=ids[start : start + 1000])
+        summaries = []
+        for recipe in recipes.prefetch_related("tags", "ingredients"):
+            tags = sorted(recipe.tags.all(), key=lambda tag: tag.id)
+            ingredients = sorted(recipe.ingredients.all(), key=lambda ing: ing.id)
+            summaries.append(
+                RecipeSummary(
+                    recipe_id=recipe.id,
+                    user_id=recipe.user_id,
+                    title=recipe.title,
+                    time_minutes=recipe.time_minutes,
+                    price=recipe.price,
+                    link=recipe.link,
+                    tags=[{"id": tag.id, "name": tag.name} for tag in tags],
+                    ingredients=[
+                        {"id": ing.id, "name": ing.name} for ing in ingredients
+                    ],
+                    tag_ids=[tag.id for tag in tags],
+                    ingredient_ids=[ing.id for ing in ingredients],
+                )
+            )
+        RecipeSummary.objects.bulk_create(summaries)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0005_recipe_image"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RecipeSummary",
+            fields=[
+                (
+                    "recipe",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="summary",
+                        serialize=False,
+                        to="core.recipe",
+                    ),
+                ),
+                ("title", models.CharField(max_length=255)),
+                ("time_minutes", models.IntegerField()),
+                ("price", models.DecimalField(decimal_places=2, max_digits=5)),
+                ("link", models.CharField(blank=True, max_length=255)),
+                ("tags", models.JSONField(default=list)),
+                ("ingredients", models.JSONField(default=list)),
+                (
+                    "tag_ids",
+                    django.contrib.postgres.fields.ArrayField(
+                        base_field=models.BigIntegerField(), default=list, size=None
+                    ),
+                ),
+                (
+                    "ingredient_ids",
+                    django.contrib.postgres.fields.ArrayField(
+                        base_field=models.BigIntegerField(), default=list, size=None
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="recipesummary",
+            index=models.Index(
+                fields=["user", "-recipe"], name="summary_user_recipe_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="recipesummary",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["tag_ids"], name="summary_tag_ids_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="recipesummary",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["ingredient_ids"], name="summary_ingredient_ids_idx"
+            ),
+        ),
+        migrations.RunPython(backfill_summaries, migrations.RunPython.noop),
+    ]
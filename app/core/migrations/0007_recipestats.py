@@ -0,0 +1,81 @@
+# Generated by Django 3.2.25 on 2026-10-19 14:04
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# a copy of recipe.stats as it was, so this migration doesn't change with it
+PRICE_BUCKETS = [5, 10, 20, 50]
+
+
+def price_bucket(price):
+    lower = 0
+    for upper in PRICE_BUCKETS:
+        if price < upper:
+            return f"{lower}-{upper}"
+        lower = upper
+    return f"{lower}+"
+
+
+def _bump(counts, key, sign):
+    key = str(key)
+    counts[key] = counts.get(key, 0) + sign
+    if counts[key] <= 0:
+        del counts[key]
+
+
+def apply_summary(stats, summary, sign):
+    stats.recipe_count += sign
+    stats.total_time_minutes += sign * summary.time_minutes
+    stats.total_price += sign * summary.price
+    _bump(stats.price_buckets, price_bucket(summary.price), sign)
+    for tag_id in summary.tag_ids:
+        _bump(stats.tag_counts, tag_id, sign)
+    for ingredient_id in summary.ingredient_ids:
+        _bump(stats.ingredient_counts, ingredient_id, sign)
+
+
+def backfill_stats(apps, schema_editor):
+    """Compute the stats of the users that already have recipes"""
+    RecipeSummary = apps.get_model("core", "RecipeSummary")
+    RecipeStats = apps.get_model("core", "RecipeStats")
+    stats_by_user = {}
+    for summary in RecipeSummary.objects.order_by("user_id").iterator():
+        if summary.user_id not in stats_by_user:
+            stats_by_user[summary.user_id] = RecipeStats(user_id=summary.user_id)
+        apply_summary(stats_by_user[summary.user_id], summary, 1)
+    RecipeStats.objects.bulk_create(stats_by_user.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0006_recipesummary"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RecipeStats",
+            fields=[
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="recipe_stats",
+                        serialize=False,
+                        to="core.user",
+                    ),
+                ),
+                ("recipe_count", models.PositiveIntegerField(default=0)),
+                ("total_time_minutes", models.BigIntegerField(default=0)),
+                (
+                    "total_price",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                ("price_buckets", models.JSONField(default=dict)),
+                ("tag_counts", models.JSONField(default=dict)),
+                ("ingredient_counts", models.JSONField(default=dict)),
+            ],
+        ),
+        migrations.RunPython(backfill_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 3.2.25 on 2026-10-19 14:11
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def copy_authtoken_tokens(apps, schema_editor):
+    """Keep the tokens already handed out working, they expire like new ones"""
+    Token = apps.get_model("authtoken", "Token")
+    ExpiringToken = apps.get_model("core", "ExpiringToken")
+    now = django.utils.timezone.now()
+    ExpiringToken.objects.bulk_create(
+        [
+            ExpiringToken(
+                key=token.key,
+                user_id=token.user_id,
+                created=now,
+                expires=now + settings.TOKEN_TTL,
+            )
+            for token in Token.objects.iterator()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0007_recipestats"),
+        ("authtoken", "0003_tokenproxy"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ExpiringToken",
+            fields=[
+                (
+                    "key",
+                    models.CharField(max_length=40, primary_key=True, serialize=False),
+                ),
+                ("created", models.DateTimeField(default=django.utils.timezone.now)),
+                ("expires", models.DateTimeField(db_index=True)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="auth_tokens",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+        migrations.RunPython(copy_authtoken_tokens, migrations.RunPython.noop),
+    ]
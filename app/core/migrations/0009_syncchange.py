@@ -0,0 +1,107 @@
+# Generated by Django 3.2.25 on 2026-10-19 14:17
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+# everything that exists already counts as one change, tags and ingredients
+# before the recipes and the recipes before their links
+BACKFILL_CHANGES = """
+INSERT INTO core_syncchange (user_id, kind, object_id, related_id, seq, deleted)
+SELECT user_id, kind, object_id, related_id,
+       row_number() OVER (PARTITION BY user_id ORDER BY rank, object_id, related_id),
+       false
+FROM (
+    SELECT user_id, 'tag' AS kind, id AS object_id, 0 AS related_id, 1 AS rank
+    FROM core_tag
+    UNION ALL
+    SELECT user_id, 'ingredient', id, 0, 2 FROM core_ingredient
+    UNION ALL
+    SELECT user_id, 'recipe', id, 0, 3 FROM core_recipe
+    UNION ALL
+    SELECT r.user_id, 'recipe_tag', l.recipe_id, l.tag_id, 4
+    FROM core_recipe_tags l JOIN core_recipe r ON r.id = l.recipe_id
+    UNION ALL
+    SELECT r.user_id, 'recipe_ingredient', l.recipe_id, l.ingredient_id, 5
+    FROM core_recipe_ingredients l JOIN core_recipe r ON r.id = l.recipe_id
+) existing;
+
+INSERT INTO core_changecounter (user_id, seq)
+SELECT user_id, max(seq) FROM core_syncchange GROUP BY user_id;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0008_expiringtoken"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ChangeCounter",
+            fields=[
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        serialize=False,
+                        to="core.user",
+                    ),
+                ),
+                ("seq", models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="SyncChange",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("recipe", "recipe"),
+                            ("tag", "tag"),
+                            ("ingredient", "ingredient"),
+                            ("recipe_tag", "recipe tag"),
+                            ("recipe_ingredient", "recipe ingredient"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("object_id", models.BigIntegerField()),
+                ("related_id", models.BigIntegerField(default=0)),
+                ("seq", models.BigIntegerField()),
+                ("deleted", models.BooleanField(default=False)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="syncchange",
+            index=models.Index(fields=["user", "seq"], name="sync_change_user_seq_idx"),
+        ),
+        migrations.AddConstraint(
+            model_name="syncchange",
+            constraint=models.UniqueConstraint(
+                fields=("user", "kind", "object_id", "related_id"),
+                name="sync_change_object_unique",
+            ),
+        ),
+        migrations.RunSQL(BACKFILL_CHANGES, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,103 @@
+# Generated by Django 3.2.25 on 2026-10-19 14:39
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# the bitmaps as recipe.recommendations built them at the time, copied here so
+# this migration doesn't change with it
+def build_bitmaps(summaries):
+    slots = {}
+    for summary in summaries:
+        keys = [f"ingredient:{pk}" for pk in summary.ingredient_ids]
+        keys += [f"tag:{pk}" for pk in summary.tag_ids]
+        if summary.ingredient_ids:
+            keys.append(f"size:{len(summary.ingredient_ids)}")
+        if keys:
+            features = len(summary.ingredient_ids) + len(summary.tag_ids)
+            keys.append(f"features:{features}")
+        keys.append("slots")
+        for key in keys:
+            slots.setdefault((summary.user_id, key), []).append(summary.slot)
+    bitmaps = {}
+    for user_key, user_slots in slots.items():
+        data = bytearray(max(user_slots) // 8 + 1)
+        for slot in user_slots:
+            data[slot >> 3] |= 1 << (slot & 7)
+        bitmaps[user_key] = bytes(data)
+    return bitmaps
+
+
+def backfill_index(apps, schema_editor):
+    """Number each user's recipes and build their bitmaps"""
+    RecipeSummary = apps.get_model("core", "RecipeSummary")
+    IngredientIndex = apps.get_model("core", "IngredientIndex")
+    table = RecipeSummary._meta.db_table
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {table} s SET slot = n.slot FROM (SELECT recipe_id, "
+            "row_number() OVER (PARTITION BY user_id ORDER BY recipe_id) - 1 "
+            f"AS slot FROM {table}) n WHERE s.recipe_id = n.recipe_id"
+        )
+    summaries = RecipeSummary.objects.only(
+        "user_id", "slot", "ingredient_ids", "tag_ids"
+    )
+    IngredientIndex.objects.bulk_create(
+        [
+            IngredientIndex(user_id=user_id, key=key, bits=bits)
+            for (user_id, key), bits in build_bitmaps(summaries.iterator()).items()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0011_task"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="IngredientIndex",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("key", models.CharField(max_length=40)),
+                ("bits", models.BinaryField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name="recipesummary",
+            name="slot",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name="recipesummary",
+            index=models.Index(fields=["user", "slot"], name="summary_user_slot_idx"),
+        ),
+        migrations.AddField(
+            model_name="ingredientindex",
+            name="user",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="ingredientindex",
+            constraint=models.UniqueConstraint(
+                fields=("user", "key"), name="ingredient_index_unique"
+            ),
+        ),
+        migrations.RunPython(backfill_index, migrations.RunPython.noop),
+    ]
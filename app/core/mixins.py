@@ -0,0 +1,55 @@
+"""Mixins shared by the API views"""
+
+import functools
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from rest_framework.permissions import SAFE_METHODS
+
+
+def _run_view(view, request, *args, **kwargs):
+    """Run a sync view and render its response in a worker thread"""
+    # connections are per thread, and django only cleans up the ones that
+    # belong to the thread-sensitive thread at the end of a request - so this
+    # thread has to look after its own
+    close_old_connections()
+    try:
+        response = view(request, *args, **kwargs)
+        if hasattr(response, "render") and callable(response.render):
+            response = response.render()
+        return response
+    finally:
+        close_old_connections()
+
+
+def async_safe_reads(view):
+    """Wrap a sync DRF view so reads don't queue up behind each other under ASGI
+
+    Django 3.2 runs every sync view on one shared thread per process when it's
+    served over ASGI ("thread_sensitive"). That keeps code that isn't thread
+    safe happy, but it also means one slow query blocks every other request.
+    The ORM/serializer code here doesn't rely on that, so safe methods run in
+    the regular thread pool, while writes stay on the thread-sensitive thread
+    so they keep the same ordering/transaction behaviour as before.
+    """
+
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        thread_sensitive = request.method not in SAFE_METHODS
+        return await sync_to_async(
+            _run_view, thread_sensitive=thread_sensitive
+        )(view, request, *args, **kwargs)
+
+    return wrapper
+
+
+class AsyncReadMixin:
+    """Serve the view's safe methods from the thread pool on ASGI"""
+
+    @classmethod
+    def as_view(cls, *args, **initkwargs):
+        view = super().as_view(*args, **initkwargs)
+        if not settings.ASYNC_READ_VIEWS:
+            return view
+        return async_safe_reads(view)
@@ -1,9 +1,14 @@
 # we're gonna need those for filepath management
 import uuid
 import os
+import secrets
 
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import (
     AbstractBaseUser,
     BaseUserManager,
@@ -98,3 +103,282 @@ class Ingredient(models.Model):
 
     def __str__(self):
         return self.name
+
+
+class RecipeSummary(models.Model):
+    """Denormalized copy of a recipe with its tags and ingredients
+
+    The recipe list endpoint reads only from this table, so a page is one index
+    scan instead of joins through both M2M tables. Kept up to date by
+    recipe.summaries whenever a recipe, tag or ingredient changes.
+    """
+
+    recipe = models.OneToOneField(
+        Recipe,
+        primary_key=True,
+        on_delete=models.CASCADE,
+        related_name="summary",
+    )
+    # covered by the (user, recipe) index below
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        db_index=False,
+    )
+    title = models.CharField(max_length=255)
+    time_minutes = models.IntegerField()
+    price = models.DecimalField(max_digits=5, decimal_places=2)
+    link = models.CharField(max_length=255, blank=True)
+    # [{"id": 1, "name": "Vegan"}, ...] - exactly what the API returns
+    tags = models.JSONField(default=list)
+    ingredients = models.JSONField(default=list)
+    # for filtering by tags/ingredients
+    tag_ids = ArrayField(models.BigIntegerField(), default=list)
+    ingredient_ids = ArrayField(models.BigIntegerField(), default=list)
+    # the recipe's bit in its user's IngredientIndex bitmaps
+    slot = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # the list endpoint - WHERE user_id = ... ORDER BY recipe_id DESC
+            models.Index(
+                fields=["user", "-recipe"], name="summary_user_recipe_idx"
+            ),
+            GinIndex(fields=["tag_ids"], name="summary_tag_ids_idx"),
+            GinIndex(
+                fields=["ingredient_ids"], name="summary_ingredient_ids_idx"
+            ),
+            # looking up the recommended recipes by their bits
+            models.Index(
+                fields=["user", "slot"], name="summary_user_slot_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return self.title
+
+
+class RecipeStats(models.Model):
+    """Running totals over a user's recipes, for the stats endpoint
+
+    Updated by recipe.stats in the same transaction as the summaries, so
+    reading the stats never has to scan the recipes.
+    """
+
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        primary_key=True,
+        on_delete=models.CASCADE,
+        related_name="recipe_stats",
+    )
+    recipe_count = models.PositiveIntegerField(default=0)
+    total_time_minutes = models.BigIntegerField(default=0)
+    total_price = models.DecimalField(
+        max_digits=14, decimal_places=2, default=0
+    )
+    # {"<bucket>": recipes}, see recipe.stats.PRICE_BUCKETS
+    price_buckets = models.JSONField(default=dict)
+    # {"<tag/ingredient id>": recipes using it}
+    tag_counts = models.JSONField(default=dict)
+    ingredient_counts = models.JSONField(default=dict)
+
+    def __str__(self):
+        return f"Recipe stats of {self.user}"
+
+
+class IngredientIndex(models.Model):
+    """Bitmaps of a user's recipes, for recommendations and similar recipes
+
+    Bit n stands for the recipe whose summary has slot n. There's a row per
+    ingredient and per tag (the recipes using it), and per number of
+    ingredients and of tags + ingredients (the recipes with that many), plus
+    one with every recipe's bit for finding free slots. Kept up to date by
+    recipe.recommendations in the same transaction as the summaries.
+    """
+
+    # covered by the unique constraint
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        db_index=False,
+    )
+    # "ingredient:<id>", "tag:<id>", "size:<number of ingredients>",
+    # "features:<number of tags + ingredients>" or "slots"
+    key = models.CharField(max_length=40)
+    # little-endian
+    bits = models.BinaryField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "key"], name="ingredient_index_unique"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.key} of {self.user}"
+
+
+class ExpiringToken(models.Model):
+    """API token that expires, one per login
+
+    The expiry slides forward while the token is being used (see
+    core.authentication), up to TOKEN_MAX_AGE after it was created.
+    """
+
+    key = models.CharField(max_length=40, primary_key=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="auth_tokens",
+    )
+    created = models.DateTimeField(default=timezone.now)
+    # for cleanup_tokens - WHERE expires < now
+    expires = models.DateTimeField(db_index=True)
+
+    def save(self, *args, **kwargs):
+        if not self.key:
+            self.key = secrets.token_hex(20)
+        if not self.expires:
+            self.expires = self.created + settings.TOKEN_TTL
+        return super().save(*args, **kwargs)
+
+    @property
+    def max_expires(self):
+        return self.created + settings.TOKEN_MAX_AGE
+
+    def __str__(self):
+        return self.key
+
+
+class ChangeCounter(models.Model):
+    """Last sync sequence number handed out for a user
+
+    Bumping it locks the row until the transaction commits, so a user's
+    changes become visible in sequence order and a sync cursor never skips one.
+    """
+
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        primary_key=True,
+        on_delete=models.CASCADE,
+    )
+    seq = models.BigIntegerField(default=0)
+
+
+class SyncChange(models.Model):
+    """Latest change of every recipe, tag, ingredient and link of a user
+
+    One row per object (rewritten on every change), so a sync returns each
+    changed object once no matter how often it was edited. Deleted objects stay
+    as tombstones.
+    """
+
+    KIND_CHOICES = [
+        ("recipe", "recipe"),
+        ("tag", "tag"),
+        ("ingredient", "ingredient"),
+        ("recipe_tag", "recipe tag"),
+        ("recipe_ingredient", "recipe ingredient"),
+    ]
+
+    # covered by the indexes below
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        db_index=False,
+    )
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    # the tag/ingredient of a link, 0 otherwise (NULLs wouldn't be unique)
+    related_id = models.BigIntegerField(default=0)
+    seq = models.BigIntegerField()
+    deleted = models.BooleanField(default=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "kind", "object_id", "related_id"],
+                name="sync_change_object_unique",
+            )
+        ]
+        indexes = [
+            # WHERE user_id = ... AND seq > <cursor> ORDER BY seq
+            models.Index(
+                fields=["user", "seq"], name="sync_change_user_seq_idx"
+            ),
+        ]
+
+
+class IdempotencyKey(models.Model):
+    """Response to a request made with an Idempotency-Key header
+
+    A retry with the same key gets the stored response back instead of
+    creating the recipe/uploading the image again. See core.idempotency.
+    """
+
+    # covered by the unique constraint
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        db_index=False,
+    )
+    key = models.CharField(max_length=255)
+    # sha256 of the method, path and body - the same key with a different
+    # request is an error
+    fingerprint = models.BinaryField(max_length=32)
+    # both null while the first request is still running
+    status_code = models.PositiveSmallIntegerField(null=True)
+    data = models.JSONField(null=True, encoder=DjangoJSONEncoder)
+    expires = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "key"], name="idempotency_key_unique"
+            )
+        ]
+
+
+class Task(models.Model):
+    """Background task waiting for (or being run by) a run_tasks worker
+
+    Done tasks are deleted, failed ones stay around with their last error.
+    """
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (QUEUED, "queued"),
+        (RUNNING, "running"),
+        (FAILED, "failed"),
+    ]
+
+    # registered name, see core.tasks
+    name = models.CharField(max_length=200)
+    kwargs = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    status = models.CharField(
+        max_length=10, choices=STATUS_CHOICES, default=QUEUED
+    )
+    # when it may run. A worker taking the task pushes it forward by the
+    # visibility timeout - if the worker dies, another one picks it up then
+    run_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField()
+    locked_by = models.CharField(max_length=100, blank=True)
+    last_error = models.TextField(blank=True)
+    created = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # for the workers' WHERE status IN (...) ORDER BY run_at
+            models.Index(
+                fields=["run_at"],
+                condition=models.Q(status__in=["queued", "running"]),
+                name="task_ready_idx",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk}"
@@ -0,0 +1,114 @@
+"""Opt-in query instrumentation (QUERY_INSIGHTS=1)
+
+- time and count of every query per fingerprint - the SQL with the values and
+  IN/VALUES lists taken out - in the metrics (db_query_fingerprint_*)
+- queries slower than SLOW_QUERY_MS logged with the view they came from
+- for QUERY_EXPLAIN_RATE of the slow SELECTs, their EXPLAIN (ANALYZE, BUFFERS)
+  plan logged with them
+
+Only the fingerprint is logged, never the parameters - they can be emails,
+password hashes or tokens.
+"""
+
+import functools
+import logging
+import random
+import re
+import time
+
+from django.conf import settings
+
+from core import metrics
+from core.middleware import view_label
+
+logger = logging.getLogger(__name__)
+
+QUERIES = metrics.Counter(
+    "db_query_fingerprint_total",
+    "Queries by fingerprint (with QUERY_INSIGHTS)",
+)
+QUERY_SECONDS = metrics.Counter(
+    "db_query_fingerprint_seconds_total",
+    "Time spent in queries by fingerprint (with QUERY_INSIGHTS)",
+)
+
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_LISTS = re.compile(r"\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+")
+_SPACE = re.compile(r"\s+")
+
+
+@functools.lru_cache(maxsize=1024)
+def fingerprint(sql):
+    """The query with its values replaced, so its runs with other values match
+
+    `... WHERE id IN (%s, %s, %s) LIMIT 21` -> `... WHERE id IN (...) LIMIT ?`
+    """
+    sql = _LITERAL.sub("?", sql.replace("%s", "?"))
+    sql = _LISTS.sub("(...)", _LIST.sub("(...)", sql))
+    return _SPACE.sub(" ", sql).strip()
+
+
+def explain(connection, sql, params):
+    """EXPLAIN (ANALYZE, BUFFERS) of a query, or None if it couldn't run"""
+    # a cursor of its own on the raw connection - the query's cursor still has
+    # its rows to hand over, and this one doesn't go through the wrappers again
+    in_transaction = connection.in_atomic_block
+    with connection.connection.cursor() as cursor:
+        try:
+            if in_transaction:
+                # so a failure doesn't abort the request's transaction
+                cursor.execute("SAVEPOINT query_explain")
+            cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS) {sql}", params)
+            plan = "\n".join(row[0] for row in cursor.fetchall())
+            if in_transaction:
+                cursor.execute("RELEASE SAVEPOINT query_explain")
+            return plan
+        except Exception:
+            logger.exception("Couldn't explain a slow query")
+            if in_transaction:
+                cursor.execute("ROLLBACK TO SAVEPOINT query_explain")
+            return None
+
+
+def _current_view():
+    request = metrics.current_request.get()
+    return view_label(request) if request is not None else "-"
+
+
+def record_query(execute, sql, params, many, context):
+    """Database execute wrapper timing every query, see CoreConfig"""
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        seconds = time.perf_counter() - started
+        query = fingerprint(sql)
+        QUERIES.inc(query=query)
+        QUERY_SECONDS.inc(seconds, query=query)
+        if seconds * 1000 >= settings.SLOW_QUERY_MS:
+            _slow(query, seconds, sql, params, many, context)
+
+
+def _slow(query, seconds, sql, params, many, context):
+    plan = None
+    # ANALYZE runs the query again, so only for reads
+    if (
+        not many
+        and sql.lstrip()[:6].upper() == "SELECT"
+        and random.random() < settings.QUERY_EXPLAIN_RATE
+    ):
+        plan = explain(context["connection"], sql, params)
+    logger.warning(
+        "Slow query (%.1f ms) in %s: %s%s",
+        seconds * 1000,
+        _current_view(),
+        query,
+        f"\n{plan}" if plan else "",
+    )
+
+
+def install(sender, connection, **kwargs):
+    # connection_created fires on every reconnect of the same wrapper
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
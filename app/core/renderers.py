@@ -0,0 +1,88 @@
+"""Renderers shared by all the API views"""
+
+import contextvars
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+# orjson is optional - without it we just fall back to DRF's stdlib renderer
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+def _orjson_default(obj, _encoder=JSONEncoder()):
+    """Handle types orjson doesn't know (Decimal, lazy strings) the DRF way"""
+    return _encoder.default(obj)
+
+
+class ORJSONRenderer(JSONRenderer):
+    """JSON renderer backed by orjson, falling back to the stdlib one"""
+
+    # datetimes go through DRF's encoder so they look like before ("...Z")
+    options = (
+        orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if orjson
+        else 0
+    )
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        """Render `data` into JSON bytes"""
+        if data is None:
+            return b""
+
+        renderer_context = renderer_context or {}
+        indent = self.get_indent(accepted_media_type, renderer_context)
+        # orjson only knows one kind of pretty printing and no ascii escaping,
+        # so anything else goes down the slow (but compatible) path
+        if orjson is None or self.ensure_ascii or indent not in (None, 2):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        options = self.options
+        if indent:
+            options |= orjson.OPT_INDENT_2
+        ret = orjson.dumps(data, default=_orjson_default, option=options)
+
+        # same as DRF - keep the output a strict javascript subset
+        if b"\xe2\x80" in ret:
+            ret = ret.replace("\u2028".encode(), b"\\u2028").replace(
+                "\u2029".encode(), b"\\u2029"
+            )
+        return ret
+
+
+def iter_json_array(renderer, chunks):
+    """Render an iterable of lists as one JSON array, a chunk at a time
+
+    Each chunk is rendered on its own and only the brackets are stitched
+    together, so the first rows go out before the last ones are serialized.
+    """
+    separator = b"["
+    for chunk in chunks:
+        if not chunk:
+            continue
+        yield separator + renderer.render(chunk)[1:-1]
+        separator = b","
+    yield b"[]" if separator == b"[" else b"]"
+
+
+def iter_in_context(iterable):
+    """Iterate in the current context, even once the view has returned
+
+    A streamed body is generated after the middleware and the view are done,
+    which would lose the replica routing and the request's query count.
+    """
+    # copied right away, a generator would only copy it on the first next()
+    context = contextvars.copy_context()
+    iterator = iter(iterable)
+
+    def items():
+        while True:
+            try:
+                item = context.run(next, iterator)
+            except StopIteration:
+                return
+            yield item
+
+    return items()
@@ -0,0 +1,125 @@
+"""OpenAPI schema view that generates the schema once instead of per request"""
+
+import hashlib
+import os
+import threading
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+from drf_spectacular.views import SpectacularAPIView
+from rest_framework.settings import api_settings
+
+from core import metrics
+
+# rendered schemas of this process, {cache key: (content, etag)}
+_schema_cache = {}
+_lock = threading.Lock()
+
+
+def clear_schema_cache():
+    """Forget all the schemas rendered by this process"""
+    with _lock:
+        _schema_cache.clear()
+
+
+def _etag(content):
+    return '"%s"' % hashlib.sha256(content).hexdigest()[:32]
+
+
+def _cache_path(key):
+    media_type, lang, version = key
+    name = "-".join(
+        [media_type.replace("/", "_").replace("+", "_"), lang, version]
+    )
+    return os.path.join(settings.SCHEMA_CACHE_DIR, f"schema-{name}")
+
+
+def _read_disk(key):
+    if not settings.SCHEMA_CACHE_DIR:
+        return None
+    try:
+        with open(_cache_path(key), "rb") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def _write_disk(key, content):
+    """Save the schema for other workers/restarts, if the dir is writable"""
+    if not settings.SCHEMA_CACHE_DIR:
+        return
+    path = _cache_path(key)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(settings.SCHEMA_CACHE_DIR, exist_ok=True)
+        with open(tmp_path, "wb") as f:
+            f.write(content)
+        # rename is atomic, so no one ever reads a half written file
+        os.replace(tmp_path, path)
+    except OSError:
+        pass
+
+
+class CachedSpectacularAPIView(SpectacularAPIView):
+    """SpectacularAPIView generating each schema once per deploy
+
+    The schema only changes when the code does, so it's rendered on the first
+    request (or by `manage.py prerender_schema` at build time), kept in memory
+    and in SCHEMA_CACHE_DIR, and served with an ETag so clients that already
+    have it get a 304.
+    """
+
+    def _cache_key(self, request):
+        """Return the request's cache key, or None if it can't be cached"""
+        lang = request.GET.get("lang") or ""
+        if lang and lang not in dict(settings.LANGUAGES):
+            return None
+        version = self.api_version or request.version or ""
+        if not version and request.GET.get("version"):
+            version = request.GET["version"]
+            # arbitrary versions would grow the cache without bounds
+            if version not in (api_settings.ALLOWED_VERSIONS or ()):
+                return None
+        return (request.accepted_renderer.media_type, lang, version)
+
+    def get(self, request, *args, **kwargs):
+        key = self._cache_key(request) if settings.SCHEMA_CACHE else None
+        if key is None:
+            return super().get(request, *args, **kwargs)
+
+        entry = _schema_cache.get(key)
+        result = "miss" if entry is None else "hit"
+        metrics.CACHE_REQUESTS.inc(cache="schema", result=result)
+        if entry is None:
+            content = _read_disk(key)
+            if content is None:
+                response = super().get(request, *args, **kwargs)
+                content = request.accepted_renderer.render(
+                    response.data,
+                    request.accepted_media_type,
+                    self.get_renderer_context(),
+                )
+                _write_disk(key, content)
+            entry = (content, _etag(content))
+            with _lock:
+                _schema_cache[key] = entry
+
+        content, etag = entry
+        # compression middleware may have weakened our etag on the way out
+        if_none_match = request.headers.get("If-None-Match", "")
+        if etag in [
+            tag.strip().replace("W/", "") for tag in if_none_match.split(",")
+        ]:
+            response = HttpResponseNotModified()
+        else:
+            renderer = request.accepted_renderer
+            content_type = renderer.media_type
+            if renderer.charset:
+                content_type += f"; charset={renderer.charset}"
+            response = HttpResponse(content, content_type=content_type)
+            filename = self._get_filename(request, key[2] or None)
+            response["Content-Disposition"] = f'inline; filename="{filename}"'
+        response["ETag"] = etag
+        # always check the etag with us, the schema changes on every deploy
+        response["Cache-Control"] = "no-cache"
+        return response
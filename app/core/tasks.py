@@ -0,0 +1,168 @@
+"""Background tasks queued in a database table and run by `manage.py run_tasks`
+
+No broker - the tasks are rows in core_task, inserted in the same transaction
+as the request's own writes (so a rolled back request doesn't leave tasks
+behind), and workers take them with SELECT ... FOR UPDATE SKIP LOCKED.
+"""
+
+import logging
+import os
+import socket
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.db.models import Count, Min, Q
+from django.utils import timezone
+
+from core import metrics
+from core.models import Task
+
+logger = logging.getLogger(__name__)
+
+# task name -> function
+registry = {}
+
+
+def task(func=None, *, max_attempts=None):
+    """Register a function as a task and give it `.delay(**kwargs)` to queue it
+
+    The kwargs have to be JSON serializable, `delay=<seconds>` puts the task
+    off. Tasks may run more than once (a worker dying halfway), so they should
+    be safe to repeat.
+    """
+
+    def register(func):
+        name = f"{func.__module__}.{func.__name__}"
+        registry[name] = func
+        func.delay = lambda delay=0, **kwargs: enqueue(
+            name, kwargs, max_attempts, delay
+        )
+        return func
+
+    return register(func) if func else register
+
+
+def enqueue(name, kwargs=None, max_attempts=None, delay=0):
+    """Queue a task, workers see it once the current transaction commits"""
+    return Task.objects.create(
+        name=name,
+        kwargs=kwargs or {},
+        max_attempts=max_attempts or settings.TASK_MAX_ATTEMPTS,
+        run_at=timezone.now() + timedelta(seconds=delay),
+    )
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def claim(worker, limit=1, visibility_timeout=None):
+    """Take up to `limit` tasks that are due, oldest first
+
+    Tasks other workers are taking at the same moment are skipped instead of
+    waited for. A running task whose worker didn't finish it within the
+    visibility timeout is due again.
+    """
+    if visibility_timeout is None:
+        visibility_timeout = settings.TASK_VISIBILITY_TIMEOUT
+    now = timezone.now()
+    table = Task._meta.db_table
+    return list(
+        Task.objects.raw(
+            f"WITH due AS (SELECT id FROM {table} "
+            "WHERE status IN ('queued', 'running') AND run_at <= %s "
+            "ORDER BY run_at LIMIT %s FOR UPDATE SKIP LOCKED) "
+            f"UPDATE {table} t SET status = 'running', "
+            "attempts = attempts + 1, locked_by = %s, run_at = %s "
+            "FROM due WHERE t.id = due.id RETURNING t.*",
+            [now, limit, worker, now + timedelta(seconds=visibility_timeout)],
+        )
+    )
+
+
+def _retry_delay(attempts):
+    # 10s, 20s, 40s, ... with the default TASK_RETRY_DELAY
+    return settings.TASK_RETRY_DELAY * 2 ** (attempts - 1)
+
+
+def run(task_obj, worker):
+    """Run a claimed task, returning "done", "retry" or "failed"
+
+    The task's own queries and removing it from the queue commit together.
+    """
+    mine = Task.objects.filter(id=task_obj.id, locked_by=worker)
+    func = registry.get(task_obj.name)
+    if func is None:
+        error = f"Unknown task {task_obj.name}"
+    elif task_obj.attempts > task_obj.max_attempts:
+        # claimed again after the visibility timeout one time too many
+        error = "Timed out"
+    else:
+        try:
+            with transaction.atomic():
+                func(**task_obj.kwargs)
+                mine.delete()
+            return "done"
+        except Exception as exc:
+            logger.exception("Task %s failed", task_obj)
+            error = repr(exc)
+            if task_obj.attempts < task_obj.max_attempts:
+                mine.update(
+                    status=Task.QUEUED,
+                    run_at=timezone.now()
+                    + timedelta(seconds=_retry_delay(task_obj.attempts)),
+                    last_error=error,
+                )
+                return "retry"
+
+    mine.update(status=Task.FAILED, last_error=error)
+    return "failed"
+
+
+def run_pending(worker=None, limit=None):
+    """Claim a batch of due tasks and run them, returning the outcomes"""
+    worker = worker or worker_name()
+    limit = limit or settings.TASK_BATCH_SIZE
+    return [run(task_obj, worker) for task_obj in claim(worker, limit)]
+
+
+def _queue_gauges():
+    try:
+        stats = queue_stats()
+    except DatabaseError:
+        # the rest of the metrics are still worth having
+        logger.warning("Can't read the task queue for the metrics")
+        return []
+    return metrics.gauge_lines(
+        "tasks",
+        "Background tasks by state",
+        [
+            ({"state": state}, stats[state])
+            for state in ("due", "running", "failed")
+        ],
+    ) + metrics.gauge_lines(
+        "tasks_oldest_due_seconds",
+        "How long the oldest due task has been waiting",
+        [({}, stats["oldest_due_seconds"])],
+    )
+
+
+def queue_stats():
+    """Number of due/running/failed tasks and the oldest one's wait"""
+    now = timezone.now()
+    active = Q(status__in=[Task.QUEUED, Task.RUNNING])
+    stats = Task.objects.aggregate(
+        due=Count("id", filter=active & Q(run_at__lte=now)),
+        running=Count("id", filter=Q(status=Task.RUNNING, run_at__gt=now)),
+        failed=Count("id", filter=Q(status=Task.FAILED)),
+        oldest_due=Min("run_at", filter=active & Q(run_at__lte=now)),
+    )
+    oldest = stats.pop("oldest_due")
+    stats["oldest_due_seconds"] = (
+        (now - oldest).total_seconds() if oldest else 0
+    )
+    return stats
+
+
+metrics.registry.collectors.append(_queue_gauges)
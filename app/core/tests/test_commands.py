@@ -1,13 +1,19 @@
 """Test custom django management commands"""
 
 # we're gonna mock the database, so that's why line below
+from datetime import timedelta
+from io import StringIO
 from unittest.mock import patch
 
 from psycopg2 import OperationalError as Psycopg2Error
 
-from django.core.management import call_command
+from django.contrib.auth import get_user_model
+from django.core.management import call_command, CommandError
 from django.db.utils import OperationalError
-from django.test import SimpleTestCase
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from core.models import ExpiringToken
 
 
 # in the decorator, first we have directory of the tested file. "check" is used to simulate a response
@@ -35,3 +41,81 @@ class CommandTests(SimpleTestCase):
 
         self.assertEqual(patched_check.call_count, 6)
         patched_check.assert_called_with(databases=["default"])
+
+    @patch("time.sleep")
+    def test_wait_for_db_backoff(self, patched_sleep, patched_check):
+        """test the wait between attempts doubles up to the max interval"""
+        patched_check.side_effect = [OperationalError] * 5 + [True]
+
+        call_command("wait_for_db", initial_interval=0.5, max_interval=3)
+
+        waits = [c.args[0] for c in patched_sleep.call_args_list]
+        self.assertEqual(waits, [0.5, 1, 2, 3, 3])
+
+    @patch("time.monotonic")
+    @patch("time.sleep")
+    def test_wait_for_db_timeout(
+        self, patched_sleep, patched_monotonic, patched_check
+    ):
+        """test giving up once the timeout is reached"""
+        patched_check.side_effect = OperationalError
+        patched_monotonic.side_effect = [0, 0.1, 1, 5, 11]
+
+        with self.assertRaises(CommandError):
+            call_command("wait_for_db", timeout=10, initial_interval=1)
+
+        self.assertEqual(patched_check.call_count, 4)
+
+
+class CheckMigrationsTests(TestCase):
+    def test_no_unapplied_migrations(self):
+        """test the check passes when the test db is fully migrated"""
+        call_command("check_migrations", stdout=StringIO())
+
+    @patch("django.db.migrations.executor.MigrationExecutor.migration_plan")
+    def test_unapplied_migrations(self, patched_plan):
+        patched_plan.return_value = [("migration", False)]
+
+        with self.assertRaises(CommandError) as cm:
+            call_command("check_migrations", stdout=StringIO())
+
+        self.assertEqual(str(cm.exception), "1 unapplied migration(s)")
+        self.assertEqual(cm.exception.returncode, 1)
+
+
+class ProfileStartupTests(SimpleTestCase):
+    def test_parse_importtime(self):
+        """test parsing the -X importtime output"""
+        from core.management.commands.profile_startup import parse_importtime
+
+        stderr = (
+            "import time: self [us] | cumulative | imported package\n"
+            "import time:       120 |        120 |   yaml.error\n"
+            "import time:       300 |        420 | yaml\n"
+            "some other warning\n"
+        )
+
+        self.assertEqual(
+            parse_importtime(stderr),
+            [("yaml.error", 120, 120), ("yaml", 300, 420)],
+        )
+
+
+class CleanupTokensTests(TestCase):
+    @patch("time.sleep")
+    def test_deletes_expired_in_batches(self, patched_sleep):
+        user = get_user_model().objects.create_user(
+            "user@example.com", "pw123"
+        )
+        past = timezone.now() - timedelta(days=1)
+        for _ in range(5):
+            ExpiringToken.objects.create(user=user, expires=past)
+        valid = ExpiringToken.objects.create(user=user)
+        out = StringIO()
+
+        call_command("cleanup_tokens", batch_size=2, stdout=out)
+
+        self.assertIn("Deleted 5 expired tokens", out.getvalue())
+        self.assertEqual(list(ExpiringToken.objects.all()), [valid])
+        # 2 + 2 + 1, no pause after the last (short) batch
+        self.assertEqual(patched_sleep.call_count, 2)
@@ -0,0 +1,98 @@
+"""Tests for the read replica router"""
+
+from unittest import skipUnless
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.db_routers import ReplicaRouter, read_from_replicas
+from core.models import Tag
+
+TAGS_URL = reverse("recipe:tag-list")
+
+
+@override_settings(DATABASE_REPLICAS=["replica_0", "replica_1"])
+class ReplicaRouterTests(SimpleTestCase):
+    """Test where the router sends queries"""
+
+    def setUp(self):
+        self.router = ReplicaRouter()
+
+    def test_reads_go_to_default_by_default(self):
+        self.assertIsNone(self.router.db_for_read(Tag))
+
+    def test_reads_go_to_replica_when_enabled(self):
+        with read_from_replicas():
+            self.assertIn(
+                self.router.db_for_read(Tag), ["replica_0", "replica_1"]
+            )
+
+        self.assertIsNone(self.router.db_for_read(Tag))
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_no_replicas_configured(self):
+        with read_from_replicas():
+            self.assertIsNone(self.router.db_for_read(Tag))
+
+    def test_writes_and_migrations_go_to_default(self):
+        with read_from_replicas():
+            self.assertEqual(self.router.db_for_write(Tag), "default")
+
+        self.assertTrue(self.router.allow_migrate("default", "core"))
+        self.assertFalse(self.router.allow_migrate("replica_0", "core"))
+
+
+@skipUnless(
+    settings.DATABASE_REPLICAS, "no replicas configured (DB_REPLICA_HOSTS)"
+)
+class ReplicaRoutingApiTests(TransactionTestCase):
+    """Test the API reads from the replica stand-in (mirrors the test db)"""
+
+    databases = "__all__"
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            "user@example.com", "test123"
+        )
+        Tag.objects.create(user=self.user, name="Vegan")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.replica = connections[settings.DATABASE_REPLICAS[0]]
+
+    def _get_tags(self):
+        with CaptureQueriesContext(self.replica) as replica_queries:
+            res = self.client.get(TAGS_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data[0]["name"], "Vegan")
+        return replica_queries
+
+    @override_settings(DATABASE_REPLICAS=["replica_0"])
+    def test_list_reads_from_replica(self):
+        self.assertEqual(len(self._get_tags()), 1)
+
+    @override_settings(DATABASE_REPLICAS=["replica_0"])
+    def test_reads_in_transaction_stay_on_primary(self):
+        with transaction.atomic():
+            self.assertEqual(len(self._get_tags()), 0)
+
+    @override_settings(DATABASE_REPLICAS=["replica_0"])
+    def test_primary_after_write(self):
+        """Test a user reads their own writes from the primary for a while"""
+        tag = Tag.objects.get()
+        url = reverse("recipe:tag-detail", args=[tag.id])
+        res = self.client.patch(url, {"name": "Vegan"})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        self.assertEqual(len(self._get_tags()), 0)
+
+        cache.clear()
+        self.assertEqual(len(self._get_tags()), 1)
@@ -0,0 +1,148 @@
+"""Tests for the password hashers and offloaded password checks"""
+
+import threading
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import caches
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.hashers import PasswordCheckBusy, PasswordCheckPool, password_pool
+
+TOKEN_URL = reverse("user:token")
+
+
+class HasherTests(TestCase):
+    """Test the hashers and rehashing on login"""
+
+    def setUp(self):
+        caches["default"].clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "user@example.com", "testpass123"
+        )
+
+    def login(self, password="testpass123"):
+        return self.client.post(
+            TOKEN_URL, {"email": "user@example.com", "password": password}
+        )
+
+    def test_argon2_with_tuned_cost(self):
+        self.assertTrue(
+            self.user.password.startswith(
+                "argon2$argon2id$v=19$m=19456,t=2,p=1$"
+            )
+        )
+
+    def test_old_hash_upgraded_on_login(self):
+        self.user.password = make_password(
+            "testpass123", hasher="pbkdf2_sha256"
+        )
+        self.user.save()
+
+        res = self.login()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith("argon2$"))
+
+    @override_settings(ARGON2_TIME_COST=3)
+    def test_rehashed_when_cost_changes(self):
+        self.login()
+
+        self.user.refresh_from_db()
+        self.assertIn("t=3", self.user.password)
+
+    def test_wrong_password_not_rehashed(self):
+        self.user.password = make_password(
+            "testpass123", hasher="pbkdf2_sha256"
+        )
+        self.user.save()
+
+        res = self.login("wrongpass")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith("pbkdf2_sha256$"))
+
+    @override_settings(
+        PASSWORD_HASHERS=["core.hashers.BCryptSHA256PasswordHasher"],
+        BCRYPT_ROUNDS=4,
+    )
+    def test_bcrypt_with_tuned_rounds(self):
+        self.assertTrue(
+            make_password("pw").startswith("bcrypt_sha256$$2b$04$")
+        )
+
+    @override_settings(PASSWORD_CHECK_OFFLOAD=True)
+    def test_offloaded_login(self):
+        checks = password_pool.snapshot()["checks"]
+
+        res = self.login()
+        self.login("wrongpass")
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn("token", res.data)
+        self.assertEqual(password_pool.snapshot()["checks"], checks + 2)
+
+    @override_settings(PASSWORD_CHECK_OFFLOAD=True)
+    def test_offload_busy(self):
+        with patch.object(password_pool, "run", side_effect=PasswordCheckBusy):
+            res = self.login()
+
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(res["Retry-After"], "1")
+
+    @override_settings(PASSWORD_CHECK_OFFLOAD=True)
+    def test_offload_busy_admin_login(self):
+        with patch.object(password_pool, "run", side_effect=PasswordCheckBusy):
+            res = self.client.post(
+                reverse("admin:login"),
+                {"username": "user@example.com", "password": "testpass123"},
+            )
+
+        # the login form again, not a server error
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertFalse(res.wsgi_request.user.is_authenticated)
+
+
+class PasswordCheckPoolTests(SimpleTestCase):
+    """Test the bounded pool"""
+
+    def test_runs_in_pool_thread(self):
+        pool = PasswordCheckPool(workers=1, queue=0)
+
+        name = pool.run(lambda: threading.current_thread().name)
+
+        self.assertTrue(name.startswith("password-check"))
+        self.assertEqual(pool.snapshot()["checks"], 1)
+        self.assertEqual(pool.snapshot()["in_flight"], 0)
+
+    def test_refuses_when_full(self):
+        pool = PasswordCheckPool(workers=1, queue=0)
+        started, release = threading.Event(), threading.Event()
+
+        def slow():
+            started.set()
+            release.wait(5)
+
+        thread = threading.Thread(target=pool.run, args=(slow,))
+        thread.start()
+        started.wait(5)
+        try:
+            with self.assertRaises(PasswordCheckBusy), self.assertLogs(
+                "core.hashers", "WARNING"
+            ):
+                pool.run(lambda: None)
+        finally:
+            release.set()
+            thread.join()
+
+        self.assertEqual(pool.snapshot()["rejected"], 1)
+        # the slot is free again
+        self.assertIsNone(pool.run(lambda: None))
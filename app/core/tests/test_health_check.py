@@ -1,11 +1,21 @@
-"""Tests for the health check API """
+"""Tests for the health check API"""
 
-from django.test import TestCase
+import tempfile
+import time
+from unittest import skipUnless
+from unittest.mock import patch
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.test import RequestFactory, TestCase, override_settings
 from django.urls import reverse
 
 from rest_framework import status
 from rest_framework.test import APIClient
 
+from core import views
+from core.health import readiness
+
 
 class HealthCheckTests(TestCase):
     """Test the health check API"""
@@ -16,3 +26,136 @@ class HealthCheckTests(TestCase):
         res = client.get(url)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_health_check_get_only(self):
+        url = reverse("health-check")
+        res = APIClient().post(url)
+
+        self.assertEqual(res.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    def test_async_health_check(self):
+        request = RequestFactory()
+        check = async_to_sync(views._async_health_check)
+
+        res = check(request.get("/"))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        res = check(request.delete("/"))
+        self.assertEqual(res.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+
+class ReadinessTests(TestCase):
+    """Test the readiness checks"""
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.settings_override = override_settings(
+            MEDIA_ROOT=media.name,
+            HEALTH_CHECK_TIMEOUT=0.5,
+            HEALTH_CHECK_MEDIA_MIN_FREE_MB=0,
+        )
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        readiness.clear()
+        self.addCleanup(readiness.clear)
+        self.url = reverse("readiness")
+
+    @override_settings(METRICS_TOKEN="secret")
+    def test_ready(self):
+        res = APIClient().get(self.url, HTTP_AUTHORIZATION="Bearer secret")
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        checks = res.json()["checks"]
+        self.assertLessEqual(
+            {"database:default", "cache", "media"}, set(checks)
+        )
+        self.assertTrue(all(check["ok"] for check in checks.values()))
+        self.assertIn("seconds", checks["database:default"])
+        self.assertIn("free_mb", checks["media"])
+
+    @override_settings(HEALTH_CHECK_MEDIA_MIN_FREE_MB=10**12)
+    def test_media_full(self):
+        with self.assertLogs("core.health", "WARNING"):
+            res = APIClient().get(self.url)
+
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertFalse(res.json()["checks"]["media"]["ok"])
+
+    def test_cache_failure_only_reported(self):
+        with patch(
+            "core.health.check_cache", side_effect=RuntimeError("Down")
+        ), self.assertLogs("core.health", "WARNING"):
+            res = APIClient().get(self.url)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertFalse(res.json()["checks"]["cache"]["ok"])
+
+    @override_settings(METRICS_TOKEN="secret")
+    def test_slow_check_times_out(self):
+        with patch(
+            "core.health.check_database", lambda alias: time.sleep(2)
+        ), self.assertLogs("core.health", "WARNING"):
+            started = time.monotonic()
+            res = APIClient().get(
+                self.url, HTTP_AUTHORIZATION="Bearer secret"
+            )
+
+        self.assertLess(time.monotonic() - started, 1.5)
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        check = res.json()["checks"]["database:default"]
+        self.assertEqual(check["error"], "Timed out")
+
+    @override_settings(METRICS_TOKEN="secret")
+    def test_details_need_token(self):
+        error = RuntimeError("Can't reach db.internal:5432")
+        with patch(
+            "core.health.check_database", side_effect=error
+        ), self.assertLogs("core.health", "WARNING") as logs:
+            res = APIClient().get(self.url)
+
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        checks = res.json()["checks"]
+        self.assertEqual(
+            checks["database:default"],
+            {"ok": False, "critical": True, "error": "failed"},
+        )
+        self.assertEqual(checks["media"], {"ok": True, "critical": True})
+        # the details go to the log
+        self.assertIn("db.internal:5432", "\n".join(logs.output))
+
+    @skipUnless(
+        settings.DATABASE_REPLICAS, "no replicas configured (DB_REPLICA_HOSTS)"
+    )
+    def test_replica_failure_only_reported(self):
+        def check_database(alias):
+            if alias != "default":
+                raise RuntimeError("Down")
+
+        with patch(
+            "core.health.check_database", check_database
+        ), self.assertLogs("core.health", "WARNING"):
+            res = APIClient().get(self.url)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        replica = settings.DATABASE_REPLICAS[0]
+        check = res.json()["checks"][f"database:{replica}"]
+        self.assertEqual(check["ok"], False)
+        self.assertEqual(check["critical"], False)
+
+    def test_result_reused(self):
+        with patch("core.health.check_cache") as check_cache:
+            APIClient().get(self.url)
+            res = APIClient().get(self.url)
+
+        self.assertEqual(check_cache.call_count, 1)
+        self.assertLess(res.json()["age"], 5)
+
+
+class LazyViewTests(TestCase):
+    """Test the API docs views still work when loaded lazily"""
+
+    def test_schema(self):
+        res = APIClient().get(reverse("api-schema"))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn(b"/api/recipe/recipes/", res.content)
@@ -0,0 +1,203 @@
+"""Tests for Idempotency-Key handling"""
+
+import tempfile
+import threading
+from datetime import timedelta
+from io import StringIO
+from types import SimpleNamespace
+
+from PIL import Image
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.idempotency import _claim, fingerprint
+from core.models import IdempotencyKey, Recipe
+
+RECIPES_URL = reverse("recipe:recipe-list")
+PAYLOAD = {"title": "Soup", "time_minutes": 20, "price": "4.50"}
+
+
+def image_upload_url(recipe_id):
+    return reverse("recipe:recipe-upload-image", args=[recipe_id])
+
+
+class IdempotencyTests(TestCase):
+    """Test replaying responses to retried requests"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "user@example.com", "pw123"
+        )
+        self.client.force_authenticate(self.user)
+
+    def create(self, payload=PAYLOAD, key="abc"):
+        return self.client.post(
+            RECIPES_URL, payload, format="json", HTTP_IDEMPOTENCY_KEY=key
+        )
+
+    def test_retry_replayed(self):
+        first = self.create()
+        second = self.create()
+
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second["Idempotent-Replayed"], "true")
+        self.assertEqual(Recipe.objects.count(), 1)
+
+    def test_without_key(self):
+        self.client.post(RECIPES_URL, PAYLOAD, format="json")
+        self.client.post(RECIPES_URL, PAYLOAD, format="json")
+
+        self.assertEqual(Recipe.objects.count(), 2)
+
+    def test_keys_are_per_user(self):
+        self.create()
+        other = get_user_model().objects.create_user(
+            "other@example.com", "pw123"
+        )
+        self.client.force_authenticate(other)
+
+        res = self.create()
+
+        self.assertNotIn("Idempotent-Replayed", res)
+        self.assertEqual(Recipe.objects.count(), 2)
+
+    def test_same_key_different_request(self):
+        self.create()
+
+        res = self.create({**PAYLOAD, "title": "Stew"})
+
+        self.assertEqual(res.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(Recipe.objects.count(), 1)
+
+    def test_error_not_stored(self):
+        res = self.create({"title": "Soup"})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self.create()
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Recipe.objects.count(), 1)
+
+    def test_expired_key_runs_again(self):
+        self.create()
+        IdempotencyKey.objects.update(
+            expires=timezone.now() - timedelta(seconds=1)
+        )
+
+        res = self.create()
+
+        self.assertNotIn("Idempotent-Replayed", res)
+        self.assertEqual(Recipe.objects.count(), 2)
+
+    def test_image_upload_replayed(self):
+        recipe = Recipe.objects.create(
+            user=self.user, title="Soup", time_minutes=20, price="4.50"
+        )
+        url = image_upload_url(recipe.id)
+        with tempfile.NamedTemporaryFile(suffix=".jpg") as image_file:
+            Image.new("RGB", (10, 10)).save(image_file, format="JPEG")
+            responses = []
+            for _ in range(2):
+                image_file.seek(0)
+                responses.append(
+                    self.client.post(
+                        url,
+                        {"image": image_file},
+                        format="multipart",
+                        HTTP_IDEMPOTENCY_KEY="img",
+                    )
+                )
+
+        recipe.refresh_from_db()
+        self.addCleanup(recipe.image.delete)
+        self.assertEqual(responses[1].data, responses[0].data)
+        self.assertEqual(responses[1]["Idempotent-Replayed"], "true")
+        # stored once
+        self.assertTrue(responses[0].data["image"].endswith(recipe.image.name))
+
+    def test_cleanup(self):
+        self.create()
+        IdempotencyKey.objects.update(
+            expires=timezone.now() - timedelta(seconds=1)
+        )
+        out = StringIO()
+
+        call_command("cleanup_idempotency_keys", stdout=out)
+
+        self.assertIn("Deleted 1 expired idempotency keys", out.getvalue())
+
+
+class ConcurrentIdempotencyTests(TransactionTestCase):
+    """Test a retry arriving while the first request is still running"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "user@example.com", "pw123"
+        )
+        self.client.force_authenticate(self.user)
+        self.claimed = threading.Event()
+        self.release = threading.Event()
+
+    def first_request(self, digest):
+        # stands in for the first request, holding the key in its transaction
+        try:
+            with transaction.atomic():
+                _claim(self.user.pk, "abc", digest)
+                self.claimed.set()
+                self.release.wait(5)
+                IdempotencyKey.objects.filter(key="abc").update(
+                    status_code=201, data={"id": 0}
+                )
+        finally:
+            connection.close()
+
+    def start_first_request(self):
+        # same fingerprint as the retry below
+        request = SimpleNamespace(
+            method="POST", path=RECIPES_URL, data=PAYLOAD
+        )
+        thread = threading.Thread(
+            target=self.first_request, args=(fingerprint(request),)
+        )
+        thread.start()
+        self.claimed.wait(5)
+        return thread
+
+    def retry(self):
+        return self.client.post(
+            RECIPES_URL, PAYLOAD, format="json", HTTP_IDEMPOTENCY_KEY="abc"
+        )
+
+    @override_settings(IDEMPOTENCY_LOCK_TIMEOUT=0.1)
+    def test_retry_times_out(self):
+        thread = self.start_first_request()
+        try:
+            res = self.retry()
+        finally:
+            self.release.set()
+            thread.join()
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_retry_waits_for_first(self):
+        thread = self.start_first_request()
+        threading.Timer(0.2, self.release.set).start()
+        res = self.retry()
+        thread.join()
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data, {"id": 0})
+        self.assertFalse(Recipe.objects.exists())
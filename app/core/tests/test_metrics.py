@@ -0,0 +1,249 @@
+"""Tests for the metrics registry and endpoint"""
+
+import os
+import tempfile
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core import metrics
+from core.models import Recipe
+from recipe.views import RecipeViewSet
+
+METRICS_URL = reverse("metrics")
+
+
+class RegistryTests(SimpleTestCase):
+    """Test counters and histograms in their own registry"""
+
+    def setUp(self):
+        self.registry = metrics.Registry()
+
+    def test_counter(self):
+        counter = metrics.Counter(
+            "things_total", "Things", registry=self.registry
+        )
+
+        counter.inc(kind="a")
+        counter.inc(2, kind="a")
+        counter.inc(kind='b"')
+
+        text = self.registry.render()
+        self.assertIn("# TYPE things_total counter", text)
+        self.assertIn('things_total{kind="a"} 3', text)
+        self.assertIn('things_total{kind="b\\""} 1', text)
+
+    def test_histogram_cumulative(self):
+        histogram = metrics.Histogram(
+            "took_seconds", "Took", buckets=(1, 5), registry=self.registry
+        )
+
+        for value in (0.5, 3, 3, 10):
+            histogram.observe(value)
+
+        lines = self.registry.render().splitlines()
+        self.assertIn('took_seconds_bucket{le="1"} 1', lines)
+        self.assertIn('took_seconds_bucket{le="5"} 3', lines)
+        self.assertIn('took_seconds_bucket{le="+Inf"} 4', lines)
+        self.assertIn("took_seconds_sum 16.5", lines)
+        self.assertIn("took_seconds_count 4", lines)
+
+    def test_added_up_over_processes(self):
+        counter = metrics.Counter(
+            "forks_total", "Forks", registry=self.registry
+        )
+
+        with tempfile.TemporaryDirectory() as metrics_dir:
+            with override_settings(METRICS_DIR=metrics_dir):
+                counter.inc()
+                pid = os.fork()
+                if pid == 0:
+                    # a new file for the child, the parent's value isn't copied
+                    counter.inc(5)
+                    os._exit(0)
+                os.waitpid(pid, 0)
+
+                self.assertEqual(len(os.listdir(metrics_dir)), 2)
+                self.assertEqual(
+                    self.registry.get_sample_value("forks_total"), 6
+                )
+
+    def test_dead_processes_merged(self):
+        counter = metrics.Counter(
+            "forks_total", "Forks", registry=self.registry
+        )
+
+        with tempfile.TemporaryDirectory() as metrics_dir:
+            with override_settings(METRICS_DIR=metrics_dir):
+                counter.inc()
+                for _ in range(3):
+                    pid = os.fork()
+                    if pid == 0:
+                        counter.inc(5)
+                        os._exit(0)
+                    os.waitpid(pid, 0)
+
+                self.assertEqual(
+                    self.registry.get_sample_value("forks_total"), 16
+                )
+                self.assertEqual(
+                    sorted(os.listdir(metrics_dir)),
+                    [f"{os.getpid()}.db", metrics.ARCHIVE_FILE],
+                )
+                # merged once, not again on the next scrape
+                self.assertEqual(
+                    self.registry.get_sample_value("forks_total"), 16
+                )
+
+    def test_file_grows(self):
+        counter = metrics.Counter("many_total", "Many", registry=self.registry)
+
+        with tempfile.TemporaryDirectory() as metrics_dir:
+            with override_settings(METRICS_DIR=metrics_dir):
+                for i in range(3000):
+                    counter.inc(label=f"value-{i}")
+
+                self.assertEqual(
+                    self.registry.get_sample_value(
+                        "many_total", label="value-2999"
+                    ),
+                    1,
+                )
+                self.assertEqual(len(self.registry.collect()), 3000)
+
+
+class MetricsApiTests(TestCase):
+    """Test the request metrics and the metrics endpoint"""
+
+    def setUp(self):
+        self.client = APIClient()
+        user = get_user_model().objects.create_user(
+            "user@example.com", "pw123"
+        )
+        self.client.force_authenticate(user)
+
+    def test_request_counted_by_view(self):
+        labels = {"view": "RecipeViewSet.list", "method": "GET", "status": 200}
+        before = metrics.registry.get_sample_value(
+            "http_requests_total", **labels
+        )
+        queries = metrics.registry.get_sample_value(
+            "http_request_db_queries_sum", view="RecipeViewSet.list"
+        )
+
+        self.client.get(reverse("recipe:recipe-list"))
+
+        after = metrics.registry.get_sample_value(
+            "http_requests_total", **labels
+        )
+        self.assertEqual(after, before + 1)
+        self.assertGreater(
+            metrics.registry.get_sample_value(
+                "http_request_db_queries_sum", view="RecipeViewSet.list"
+            ),
+            queries,
+        )
+
+    @override_settings(STREAMING_LIST_THRESHOLD=1, STREAMING_CHUNK_SIZE=1)
+    def test_streamed_list_counted_when_sent(self):
+        user = get_user_model().objects.get()
+        for i in range(3):
+            Recipe.objects.create(
+                user=user, title=f"Recipe {i}", time_minutes=5, price=5
+            )
+        labels = {"view": "RecipeViewSet.list", "method": "GET"}
+        before = metrics.registry.get_sample_value(
+            "http_requests_total", status=200, **labels
+        )
+
+        res = self.client.get(reverse("recipe:recipe-list"))
+
+        self.assertTrue(res.streaming)
+        self.assertEqual(
+            metrics.registry.get_sample_value(
+                "http_requests_total", status=200, **labels
+            ),
+            before,
+        )
+        b"".join(res.streaming_content)
+        self.assertEqual(
+            metrics.registry.get_sample_value(
+                "http_requests_total", status=200, **labels
+            ),
+            before + 1,
+        )
+
+    @override_settings(STREAMING_LIST_THRESHOLD=1, STREAMING_CHUNK_SIZE=1)
+    def test_streamed_list_failure_counted(self):
+        user = get_user_model().objects.get()
+        for i in range(3):
+            Recipe.objects.create(
+                user=user, title=f"Recipe {i}", time_minutes=5, price=5
+            )
+        labels = {"view": "RecipeViewSet.list", "method": "GET", "status": 500}
+        before = metrics.registry.get_sample_value(
+            "http_requests_total", **labels
+        )
+
+        def fail(self, rows):
+            yield from ()
+            raise ValueError("boom")
+
+        with patch.object(RecipeViewSet, "_serialize_chunks", fail):
+            res = self.client.get(reverse("recipe:recipe-list"))
+            with self.assertRaises(ValueError):
+                b"".join(res.streaming_content)
+
+        self.assertEqual(
+            metrics.registry.get_sample_value("http_requests_total", **labels),
+            before + 1,
+        )
+
+    def test_unknown_method_counted_as_other(self):
+        labels = {"view": "RecipeViewSet.other", "status": 405}
+        before = metrics.registry.get_sample_value(
+            "http_requests_total", method="other", **labels
+        )
+
+        self.client.generic("BREW", reverse("recipe:recipe-list"))
+
+        after = metrics.registry.get_sample_value(
+            "http_requests_total", method="other", **labels
+        )
+        self.assertEqual(after, before + 1)
+        self.assertEqual(
+            metrics.registry.get_sample_value(
+                "http_requests_total", method="BREW", **labels
+            ),
+            0,
+        )
+
+    @override_settings(DEBUG=True)
+    def test_render(self):
+        self.client.get(reverse("recipe:recipe-list"))
+
+        res = self.client.get(METRICS_URL)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(
+            res["Content-Type"].startswith("text/plain; version=0.0.4")
+        )
+        text = res.content.decode()
+        self.assertIn('http_requests_total{method="GET"', text)
+        self.assertIn("# TYPE tasks gauge", text)
+
+    def test_no_token_not_served(self):
+        res = self.client.get(METRICS_URL)
+        self.assertEqual(res.status_code, 404)
+
+    @override_settings(METRICS_TOKEN="secret")
+    def test_token_required(self):
+        res = self.client.get(METRICS_URL)
+        self.assertEqual(res.status_code, 401)
+
+        res = self.client.get(METRICS_URL, HTTP_AUTHORIZATION="Bearer secret")
+        self.assertEqual(res.status_code, 200)
@@ -0,0 +1,161 @@
+"""Tests for the project middleware"""
+
+import gzip
+import os
+import pstats
+import tempfile
+
+import brotli
+
+from django.contrib.auth import get_user_model
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import (
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    override_settings,
+)
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core.authentication import issue_token
+from core.middleware import CompressionMiddleware, negotiate_encoding
+from core.models import Recipe
+
+BODY = b'{"title": "Sample recipe title"}' * 100
+
+
+def compressed_response(body=BODY, accept="gzip, br", streaming=False):
+    """Run a response through the compression middleware"""
+    if streaming:
+        response = StreamingHttpResponse(
+            iter([body[:100], body[100:]]), content_type="application/json"
+        )
+    else:
+        response = HttpResponse(body, content_type="application/json")
+    request = RequestFactory().get("/", HTTP_ACCEPT_ENCODING=accept)
+    return CompressionMiddleware(lambda request: response)(request)
+
+
+@override_settings(COMPRESSION_MIN_SIZE=1024)
+class CompressionMiddlewareTests(SimpleTestCase):
+    """Test negotiated response compression"""
+
+    def test_negotiate_encoding(self):
+        self.assertEqual(negotiate_encoding("gzip, deflate, br"), "br")
+        self.assertEqual(negotiate_encoding("gzip, br;q=0"), "gzip")
+        self.assertEqual(negotiate_encoding("identity"), None)
+        self.assertEqual(negotiate_encoding(""), None)
+
+    def test_brotli_preferred(self):
+        res = compressed_response()
+
+        self.assertEqual(res["Content-Encoding"], "br")
+        self.assertEqual(brotli.decompress(res.content), BODY)
+        self.assertIn("Accept-Encoding", res["Vary"])
+
+    def test_gzip(self):
+        res = compressed_response(accept="gzip")
+
+        self.assertEqual(res["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(res.content), BODY)
+        self.assertEqual(res["Content-Length"], str(len(res.content)))
+
+    def test_small_response_not_compressed(self):
+        res = compressed_response(body=b'{"healthy": true}')
+
+        self.assertFalse(res.has_header("Content-Encoding"))
+
+    def test_not_accepted(self):
+        res = compressed_response(accept="identity")
+
+        self.assertFalse(res.has_header("Content-Encoding"))
+        self.assertEqual(res.content, BODY)
+
+    def test_streaming_response(self):
+        for accept, decompress in (
+            ("br", brotli.decompress),
+            ("gzip", gzip.decompress),
+        ):
+            res = compressed_response(accept=accept, streaming=True)
+
+            self.assertEqual(res["Content-Encoding"], accept)
+            self.assertEqual(decompress(b"".join(res.streaming_content)), BODY)
+
+
+class ProfilerMiddlewareTests(TestCase):
+    """Test profiling requests"""
+
+    def setUp(self):
+        profile_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(profile_dir.cleanup)
+        self.profile_dir = profile_dir.name
+        self.settings_override = override_settings(
+            PROFILE_DIR=self.profile_dir, SERVER_MODE="uwsgi"
+        )
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        self.url = reverse("recipe:tag-list")
+
+    def get(self, staff, **extra):
+        user = get_user_model().objects.create_user(
+            f"user{get_user_model().objects.count()}@example.com", "pw123"
+        )
+        user.is_staff = staff
+        user.save()
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Token {issue_token(user).key}")
+        return client.get(self.url, **extra)
+
+    def test_staff_profile(self):
+        res = self.get(staff=True, HTTP_X_PROFILE="1")
+
+        name = res["X-Profile-File"]
+        self.assertIn("TagViewSet.list-GET", name)
+        stats = pstats.Stats(os.path.join(self.profile_dir, name))
+        self.assertTrue(any("serializers" in func[0] for func in stats.stats))
+
+    @override_settings(STREAMING_LIST_THRESHOLD=1, STREAMING_CHUNK_SIZE=1)
+    def test_streamed_profile(self):
+        """Test a streamed response is profiled until its body is sent"""
+        user = get_user_model().objects.create_user(
+            "staff@example.com", "pw123", is_staff=True
+        )
+        for i in range(3):
+            Recipe.objects.create(
+                user=user, title=f"Recipe {i}", time_minutes=5, price=5
+            )
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Token {issue_token(user).key}")
+
+        res = client.get(reverse("recipe:recipe-list"), HTTP_X_PROFILE="1")
+
+        name = res["X-Profile-File"]
+        self.assertIn("RecipeViewSet.list-GET-streamed", name)
+        self.assertEqual(os.listdir(self.profile_dir), [])
+        b"".join(res.streaming_content)
+        stats = pstats.Stats(os.path.join(self.profile_dir, name))
+        self.assertTrue(
+            any(func[2] == "_serialize_chunks" for func in stats.stats)
+        )
+
+    def test_not_for_others(self):
+        res = self.get(staff=False, HTTP_X_PROFILE="1")
+
+        self.assertNotIn("X-Profile-File", res)
+        self.assertEqual(os.listdir(self.profile_dir), [])
+
+    @override_settings(PROFILE_SAMPLE_RATE=1.0, PROFILE_KEEP=2)
+    def test_sampled_and_pruned(self):
+        for _ in range(4):
+            res = self.get(staff=False)
+
+        self.assertNotIn("X-Profile-File", res)
+        self.assertEqual(len(os.listdir(self.profile_dir)), 2)
+
+    @override_settings(PROFILE_DIR="")
+    def test_off(self):
+        res = self.get(staff=True, HTTP_X_PROFILE="1")
+
+        self.assertNotIn("X-Profile-File", res)
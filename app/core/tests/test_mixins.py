@@ -0,0 +1,66 @@
+"""Tests for the view mixins"""
+
+import asyncio
+import threading
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.http import HttpResponse
+from django.test import TransactionTestCase, SimpleTestCase, override_settings
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from core.mixins import async_safe_reads
+from recipe.views import TagViewSet
+
+
+def record_thread(request):
+    """View recording the thread it ran on"""
+    return HttpResponse(str(threading.get_ident()))
+
+
+class AsyncSafeReadsTests(SimpleTestCase):
+    """Test which thread the wrapped views run on"""
+
+    def test_wrapped_view_is_async(self):
+        self.assertTrue(
+            asyncio.iscoroutinefunction(async_safe_reads(record_thread))
+        )
+
+    def test_reads_run_in_thread_pool(self):
+        request = APIRequestFactory().get("/")
+
+        res = async_to_sync(async_safe_reads(record_thread))(request)
+
+        self.assertNotEqual(int(res.content), threading.get_ident())
+
+    def test_writes_run_on_thread_sensitive_thread(self):
+        request = APIRequestFactory().post("/")
+
+        res = async_to_sync(async_safe_reads(record_thread))(request)
+
+        self.assertEqual(int(res.content), threading.get_ident())
+
+
+class AsyncReadMixinTests(TransactionTestCase):
+    """Test the viewsets in ASGI mode"""
+
+    def test_viewset_sync_by_default(self):
+        view = TagViewSet.as_view({"get": "list"})
+
+        self.assertFalse(asyncio.iscoroutinefunction(view))
+
+    @override_settings(ASYNC_READ_VIEWS=True)
+    def test_viewset_list_async(self):
+        """Test the list runs (and renders) from the thread pool"""
+        user = get_user_model().objects.create_user(
+            "user@example.com", "test123"
+        )
+        view = TagViewSet.as_view({"get": "list"})
+        request = APIRequestFactory().get("/")
+        force_authenticate(request, user=user)
+
+        res = async_to_sync(view)(request)
+
+        self.assertTrue(asyncio.iscoroutinefunction(view))
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.content, b"[]")
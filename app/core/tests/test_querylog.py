@@ -0,0 +1,96 @@
+"""Tests for the slow query log and query fingerprints"""
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core import metrics, querylog
+from core.models import Tag
+
+
+class FingerprintTests(SimpleTestCase):
+    """Test normalizing queries"""
+
+    def test_values_replaced(self):
+        self.assertEqual(
+            querylog.fingerprint(
+                "SELECT * FROM t WHERE name = 'x''y' AND id = %s\n  LIMIT 21"
+            ),
+            "SELECT * FROM t WHERE name = ? AND id = ? LIMIT ?",
+        )
+
+    def test_lists_collapsed(self):
+        self.assertEqual(
+            querylog.fingerprint("SELECT 1 FROM t WHERE id IN (%s, %s, %s)"),
+            querylog.fingerprint("SELECT 1 FROM t WHERE id IN (%s)"),
+        )
+        self.assertEqual(
+            querylog.fingerprint(
+                "INSERT INTO t_2 (a, b) VALUES (%s, %s), (%s, %s)"
+            ),
+            "INSERT INTO t_2 (a, b) VALUES (...)",
+        )
+
+
+@override_settings(SLOW_QUERY_MS=0, QUERY_EXPLAIN_RATE=1)
+class SlowQueryTests(TestCase):
+    """Test logging slow queries and their plans"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            "user@example.com", "pw123"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def logged(self):
+        # with a threshold of 0 every query is slow
+        return connection.execute_wrapper(querylog.record_query)
+
+    def test_logged_with_view_and_plan(self):
+        with self.assertLogs("core.querylog", "WARNING") as logs:
+            with self.logged():
+                self.client.get(reverse("recipe:tag-list"))
+
+        output = "\n".join(logs.output)
+        self.assertIn("in TagViewSet.list: SELECT", output)
+        self.assertIn("Execution Time", output)
+
+    def test_writes_not_explained(self):
+        with self.assertLogs("core.querylog", "WARNING") as logs:
+            with self.logged():
+                Tag.objects.create(user=self.user, name="Vegan")
+
+        output = "\n".join(logs.output)
+        self.assertIn('INSERT INTO "core_tag"', output)
+        self.assertNotIn("Execution Time", output)
+
+    def test_failed_explain_keeps_transaction(self):
+        with transaction.atomic():
+            with self.assertLogs("core.querylog", "ERROR"):
+                plan = querylog.explain(connection, "SELECT nope", [])
+            self.assertIsNone(plan)
+
+            # still usable
+            self.assertEqual(Tag.objects.count(), 0)
+
+    @override_settings(SLOW_QUERY_MS=10**6)
+    def test_fingerprint_stats(self):
+        tags = Tag.objects.values_list("id")
+        query = querylog.fingerprint(str(tags.filter(id__in=[1, 2]).query))
+        before = metrics.registry.get_sample_value(
+            "db_query_fingerprint_total", query=query
+        )
+
+        with self.logged():
+            list(tags.filter(id__in=[1, 2, 3]))
+
+        # str(query) inlines the values, the executed sql has placeholders -
+        # both come out the same
+        after = metrics.registry.get_sample_value(
+            "db_query_fingerprint_total", query=query
+        )
+        self.assertEqual(after, before + 1)
@@ -0,0 +1,101 @@
+"""Tests for the orjson renderer and parser"""
+
+import contextvars
+import io
+import json
+from datetime import datetime, timezone
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.serializer_helpers import ReturnDict
+
+from core.parsers import ORJSONParser
+from core.renderers import ORJSONRenderer, iter_in_context
+
+
+class ORJSONRendererTests(SimpleTestCase):
+    """Test the orjson renderer"""
+
+    def test_render_matches_stdlib_renderer(self):
+        """Test the orjson output decodes to the same data as DRF's renderer"""
+        data = ReturnDict(
+            {
+                "id": 1,
+                "price": Decimal("5.25"),
+                "image": "http://example.com/media/uploads/recipe/a.jpg",
+                "created": datetime(2024, 1, 1, 12, 0, tzinfo=timezone.utc),
+                "detail": gettext_lazy("Not found."),
+                "tags": [{"id": 1, "name": "Vegan"}],
+            },
+            serializer=None,
+        )
+
+        res = ORJSONRenderer().render(data)
+
+        self.assertEqual(
+            json.loads(res), json.loads(JSONRenderer().render(data))
+        )
+        self.assertEqual(json.loads(res)["price"], 5.25)
+        self.assertEqual(json.loads(res)["created"], "2024-01-01T12:00:00Z")
+
+    def test_render_none_is_empty(self):
+        self.assertEqual(ORJSONRenderer().render(None), b"")
+
+    def test_render_escapes_line_separators(self):
+        res = ORJSONRenderer().render({"title": "a\u2028b\u2029c"})
+
+        self.assertEqual(res, b'{"title":"a\\u2028b\\u2029c"}')
+
+    def test_render_indent(self):
+        res = ORJSONRenderer().render({"id": 1}, "application/json; indent=2")
+
+        self.assertEqual(res, b'{\n  "id": 1\n}')
+
+    @patch("core.renderers.orjson", None)
+    def test_render_falls_back_without_orjson(self):
+        res = ORJSONRenderer().render({"price": Decimal("1.50")})
+
+        self.assertEqual(res, b'{"price":1.5}')
+
+
+class IterInContextTests(SimpleTestCase):
+    """Test iterating in the context of the caller"""
+
+    def test_context_kept(self):
+        var = contextvars.ContextVar("var", default="unset")
+
+        def values():
+            for _ in range(2):
+                yield var.get()
+
+        token = var.set("view")
+        items = iter_in_context(values())
+        var.reset(token)
+
+        self.assertEqual(list(items), ["view", "view"])
+        self.assertEqual(var.get(), "unset")
+
+
+class ORJSONParserTests(SimpleTestCase):
+    """Test the orjson parser"""
+
+    def test_parse(self):
+        res = ORJSONParser().parse(
+            io.BytesIO(b'{"title": "Soup", "tags": []}')
+        )
+
+        self.assertEqual(res, {"title": "Soup", "tags": []})
+
+    def test_parse_error(self):
+        with self.assertRaises(ParseError):
+            ORJSONParser().parse(io.BytesIO(b'{"title": '))
+
+    @patch("core.parsers.orjson", None)
+    def test_parse_falls_back_without_orjson(self):
+        res = ORJSONParser().parse(io.BytesIO(b'{"id": 1}'))
+
+        self.assertEqual(res, {"id": 1})
@@ -0,0 +1,83 @@
+"""Tests for the cached OpenAPI schema"""
+
+import os
+import tempfile
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.schema import CachedSpectacularAPIView, clear_schema_cache
+
+SCHEMA_URL = reverse("api-schema")
+
+
+@override_settings(SCHEMA_CACHE=True, SCHEMA_CACHE_DIR=None)
+class CachedSchemaTests(TestCase):
+    """Test the schema is generated once and served with an ETag"""
+
+    def setUp(self):
+        self.client = APIClient()
+        clear_schema_cache()
+
+    def tearDown(self):
+        clear_schema_cache()
+
+    def test_schema_generated_once(self):
+        with patch.object(
+            CachedSpectacularAPIView,
+            "_get_schema_response",
+            wraps=CachedSpectacularAPIView()._get_schema_response,
+        ) as patched_generate:
+            res1 = self.client.get(SCHEMA_URL)
+            res2 = self.client.get(SCHEMA_URL)
+
+        self.assertEqual(res1.status_code, status.HTTP_200_OK)
+        self.assertEqual(res1.content, res2.content)
+        self.assertEqual(res1["ETag"], res2["ETag"])
+        self.assertEqual(patched_generate.call_count, 1)
+
+    def test_formats_cached_separately(self):
+        yaml = self.client.get(SCHEMA_URL)
+        json = self.client.get(SCHEMA_URL, HTTP_ACCEPT="application/json")
+
+        self.assertTrue(json["Content-Type"].startswith("application/json"))
+        self.assertTrue(json.content.startswith(b"{"))
+        self.assertNotEqual(yaml["ETag"], json["ETag"])
+
+    def test_not_modified(self):
+        etag = self.client.get(SCHEMA_URL)["ETag"]
+
+        res = self.client.get(SCHEMA_URL, HTTP_IF_NONE_MATCH=f"W/{etag}")
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res.content, b"")
+
+    def test_unknown_lang_not_cached(self):
+        res = self.client.get(SCHEMA_URL, {"lang": "../../etc"})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertFalse(res.has_header("ETag"))
+
+    def test_prerender_schema(self):
+        """Test the command writes every format, the view serves them"""
+        with tempfile.TemporaryDirectory() as cache_dir:
+            with override_settings(SCHEMA_CACHE_DIR=cache_dir):
+                call_command("prerender_schema", stdout=StringIO())
+                clear_schema_cache()
+
+                with patch.object(
+                    CachedSpectacularAPIView, "_get_schema_response"
+                ) as patched_generate:
+                    res = self.client.get(SCHEMA_URL)
+
+            self.assertEqual(len(os.listdir(cache_dir)), 4)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn(b"/api/recipe/recipes/", res.content)
+        patched_generate.assert_not_called()
@@ -0,0 +1,207 @@
+"""Tests for the background task queue"""
+
+import os
+import tempfile
+from datetime import timedelta
+from io import StringIO
+
+from PIL import Image
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework.test import APIClient
+
+from core import tasks
+from core.models import Recipe, Task
+
+calls = []
+
+
+@tasks.task
+def record(value):
+    calls.append(value)
+
+
+@tasks.task(max_attempts=2)
+def explode():
+    raise ValueError("boom")
+
+
+class TaskQueueTests(TestCase):
+    """Test queueing, claiming and running tasks"""
+
+    def setUp(self):
+        calls.clear()
+
+    def test_delay_and_run(self):
+        record.delay(value=1)
+        record.delay(value=2)
+
+        outcomes = tasks.run_pending("worker")
+
+        self.assertEqual(outcomes, ["done", "done"])
+        self.assertEqual(calls, [1, 2])
+        self.assertFalse(Task.objects.exists())
+
+    def test_not_due_yet(self):
+        tasks.enqueue(f"{__name__}.record", {"value": 1}, delay=60)
+
+        self.assertEqual(tasks.run_pending("worker"), [])
+
+    def test_delay_put_off(self):
+        record.delay(delay=60, value=1)
+
+        self.assertEqual(tasks.run_pending("worker"), [])
+        self.assertEqual(Task.objects.get().kwargs, {"value": 1})
+
+    def test_claimed_tasks_hidden_until_timeout(self):
+        record.delay(value=1)
+
+        claimed = tasks.claim("worker-1", visibility_timeout=60)
+
+        self.assertEqual(claimed[0].status, Task.RUNNING)
+        self.assertEqual(claimed[0].attempts, 1)
+        self.assertEqual(tasks.claim("worker-2"), [])
+        # the worker died, it's due again once the timeout passes
+        Task.objects.update(run_at=timezone.now())
+        self.assertEqual(len(tasks.claim("worker-2")), 1)
+
+    def test_retry_with_backoff(self):
+        explode.delay()
+
+        with self.assertLogs("core.tasks", "ERROR"):
+            outcomes = tasks.run_pending("worker")
+
+        task_obj = Task.objects.get()
+        self.assertEqual(outcomes, ["retry"])
+        self.assertEqual(task_obj.status, Task.QUEUED)
+        self.assertIn("boom", task_obj.last_error)
+        self.assertGreater(
+            task_obj.run_at, timezone.now() + timedelta(seconds=5)
+        )
+
+    def test_fails_after_max_attempts(self):
+        explode.delay()
+
+        with self.assertLogs("core.tasks", "ERROR"):
+            tasks.run_pending("worker")
+            Task.objects.update(run_at=timezone.now())
+            outcomes = tasks.run_pending("worker")
+
+        self.assertEqual(outcomes, ["failed"])
+        self.assertEqual(Task.objects.get().status, Task.FAILED)
+        self.assertEqual(tasks.queue_stats()["failed"], 1)
+
+    def test_finished_by_other_worker_after_timeout(self):
+        record.delay(value=1)
+        task_obj = tasks.claim("worker-1")[0]
+        Task.objects.update(locked_by="worker-2")
+
+        tasks.run(task_obj, "worker-1")
+
+        # worker-2 owns it now, worker-1 doesn't get to remove it
+        self.assertTrue(Task.objects.exists())
+
+    def test_queue_stats(self):
+        record.delay(value=1)
+        record.delay(value=2)
+        tasks.claim("worker", limit=1)
+
+        stats = tasks.queue_stats()
+
+        self.assertEqual(stats["due"], 1)
+        self.assertEqual(stats["running"], 1)
+
+    def test_command_once(self):
+        record.delay(value=1)
+        out = StringIO()
+
+        call_command("run_tasks", "--once", stdout=out)
+
+        self.assertEqual(calls, [1])
+        self.assertIn("1 done", out.getvalue())
+
+
+class ImageTaskTests(TestCase):
+    """Test deleting replaced recipe images in the background"""
+
+    def setUp(self):
+        self.client = APIClient()
+        user = get_user_model().objects.create_user(
+            "user@example.com", "pw123"
+        )
+        self.client.force_authenticate(user)
+        self.recipe = Recipe.objects.create(
+            user=user, title="Soup", time_minutes=5, price="1.00"
+        )
+
+    def upload(self):
+        url = reverse("recipe:recipe-upload-image", args=[self.recipe.id])
+        with tempfile.NamedTemporaryFile(suffix=".jpg") as image_file:
+            Image.new("RGB", (10, 10)).save(image_file, format="JPEG")
+            image_file.seek(0)
+            self.client.post(url, {"image": image_file}, format="multipart")
+        self.recipe.refresh_from_db()
+        return self.recipe.image.path
+
+    def test_replaced_image_deleted(self):
+        old = self.upload()
+        new = self.upload()
+        self.addCleanup(self.recipe.image.delete)
+
+        self.assertTrue(os.path.exists(old))
+        tasks.run_pending("worker")
+
+        self.assertFalse(os.path.exists(old))
+        self.assertTrue(os.path.exists(new))
+
+    def test_shared_image_kept(self):
+        old = self.upload()
+        # another recipe still points at the file
+        Recipe.objects.filter(id=self.recipe.id).update(image=None)
+        self.recipe.id = None
+        self.recipe.save()
+        self.addCleanup(os.remove, old)
+
+        tasks.enqueue(
+            "recipe.tasks.delete_images", {"names": [self.recipe.image.name]}
+        )
+        tasks.run_pending("worker")
+
+        self.assertTrue(os.path.exists(old))
+
+    def test_deleted_recipe_image_deleted(self):
+        path = self.upload()
+
+        self.recipe.delete()
+        tasks.run_pending("worker")
+
+        self.assertFalse(os.path.exists(path))
+
+    def test_bulk_deleted_images_one_task(self):
+        user = self.recipe.user
+        recipes = [self.recipe] + [
+            Recipe.objects.create(
+                user=user, title="Soup", time_minutes=5, price="1.00"
+            )
+            for _ in range(2)
+        ]
+        for i, recipe in enumerate(recipes):
+            recipe.image = f"uploads/recipe/{i}.jpg"
+            recipe.save()
+
+        self.client.delete(
+            reverse("recipe:recipe-bulk"),
+            {"ids": [recipe.id for recipe in recipes]},
+            format="json",
+        )
+
+        task_obj = Task.objects.get()
+        self.assertEqual(
+            task_obj.kwargs,
+            {"names": [f"uploads/recipe/{i}.jpg" for i in range(3)]},
+        )
@@ -0,0 +1,137 @@
+"""Tests for the sliding window throttles"""
+
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework.request import Request
+
+from core.throttling import ScopedSlidingWindowThrottle
+
+TOKEN_URL = reverse("user:token")
+RECIPES_URL = reverse("recipe:recipe-list")
+
+
+def rates(**overrides):
+    """REST_FRAMEWORK settings with some of the throttle rates replaced"""
+    rest_framework = dict(settings.REST_FRAMEWORK)
+    rest_framework["DEFAULT_THROTTLE_RATES"] = dict(
+        rest_framework["DEFAULT_THROTTLE_RATES"], **overrides
+    )
+    return override_settings(REST_FRAMEWORK=rest_framework)
+
+
+class FakeView:
+    throttle_scope = "test"
+
+
+class SlidingWindowTests(SimpleTestCase):
+    """Test the sliding window counting, with a fake clock"""
+
+    def setUp(self):
+        caches["default"].clear()
+        caches["local"].clear()
+        self.now = 1000 * 60.0
+        self.request = Request(APIRequestFactory().get("/"))
+
+    def allow(self):
+        throttle = ScopedSlidingWindowThrottle()
+        throttle.timer = lambda: self.now
+        return throttle.allow_request(self.request, FakeView()), throttle
+
+    @rates(test="3/min")
+    def test_limit_within_window(self):
+        results = [self.allow()[0] for _ in range(4)]
+
+        self.assertEqual(results, [True, True, True, False])
+
+    @rates(test="4/min")
+    def test_previous_window_slides_out(self):
+        for _ in range(4):
+            self.allow()
+        # a quarter into the next window, 3 of the previous 4 still count
+        self.now += 75
+        allowed, _ = self.allow()
+        self.assertTrue(allowed)
+        allowed, throttle = self.allow()
+        self.assertFalse(allowed)
+        # 4 * 0.75 + 1 = 4 - needs to drop below 4 again
+        self.assertAlmostEqual(throttle.wait(), 15, places=3)
+
+        self.now += 16
+        self.assertTrue(self.allow()[0])
+
+    @rates(test="2/min")
+    def test_rejected_requests_not_counted(self):
+        for _ in range(10):
+            self.allow()
+
+        self.now += 60
+        # the previous window only has the 2 allowed requests
+        allowed, throttle = self.allow()
+        self.assertFalse(allowed)
+        self.assertEqual(throttle.previous, 2)
+
+    @rates(test=None)
+    def test_no_rate(self):
+        self.assertTrue(all(self.allow()[0] for _ in range(10)))
+
+    @rates(test="2/min")
+    def test_falls_back_to_local_cache(self):
+        with patch.object(
+            caches["default"], "get_many", side_effect=ConnectionError
+        ), self.assertLogs("core.throttling", "WARNING"):
+            results = [self.allow()[0] for _ in range(3)]
+
+        self.assertEqual(results, [True, True, False])
+
+
+class ThrottleApiTests(TestCase):
+    """Test the throttles on the API"""
+
+    def setUp(self):
+        caches["default"].clear()
+        caches["local"].clear()
+        self.client = APIClient()
+
+    @rates(token="2/min")
+    def test_token_issuance_throttled_per_ip(self):
+        payload = {"email": "test@example.com", "password": "wrong"}
+        for _ in range(2):
+            res = self.client.post(TOKEN_URL, payload)
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self.client.post(TOKEN_URL, payload)
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn("Retry-After", res)
+
+        res = self.client.post(TOKEN_URL, payload, REMOTE_ADDR="10.0.0.2")
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @rates(list="1/min")
+    def test_scopes_per_user(self):
+        user = get_user_model().objects.create_user(
+            "user@example.com", "pw123"
+        )
+        other = get_user_model().objects.create_user(
+            "other@example.com", "pw123"
+        )
+        self.client.force_authenticate(user)
+        self.client.get(RECIPES_URL)
+
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        # writes have their own budget
+        payload = {"title": "Soup", "time_minutes": 5, "price": "1.00"}
+        res = self.client.post(RECIPES_URL, payload)
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+        self.client.force_authenticate(other)
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
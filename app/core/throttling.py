@@ -0,0 +1,166 @@
+"""Request throttles sharing their counters through the cache"""
+
+import logging
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.settings import api_settings
+from rest_framework.throttling import SimpleRateThrottle
+
+from core import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class SlidingWindowThrottle(SimpleRateThrottle):
+    """Sliding window rate limit with two counters per client
+
+    DRF's throttles keep a list with the timestamp of every request in the
+    window, so a "1000/hour" rate stores up to 1000 floats per client and
+    rewrites all of them on every request. Here there's only a counter for the
+    current and the previous window, and the previous one is weighted by how
+    much of it still overlaps the sliding window:
+
+        estimate = previous * (1 - elapsed / duration) + current
+
+    The counters live in the THROTTLE_CACHE cache (memcached in production, so
+    all workers share them) and are bumped with an atomic incr. If that cache
+    is unreachable the process falls back to counting locally rather than
+    failing the request.
+    """
+
+    def __init__(self):
+        # the scope depends on the view, so the rate's parsed in allow_request
+        pass
+
+    def get_rate(self):
+        # read every time (not at import like DRF), for override_settings
+        return api_settings.DEFAULT_THROTTLE_RATES.get(self.scope)
+
+    def _counts(self, cache, keys):
+        counts = cache.get_many(keys)
+        result = "hit" if counts else "miss"
+        metrics.CACHE_REQUESTS.inc(cache="throttle", result=result)
+        return [counts.get(key, 0) for key in keys]
+
+    def _incr(self, cache, key, timeout):
+        try:
+            return cache.incr(key)
+        except ValueError:
+            # first request in this window, or the key expired in the meantime
+            if cache.add(key, 1, timeout):
+                return 1
+            return cache.incr(key)
+
+    def _hit(self, keys):
+        """Return the (previous, current) counts and count this request"""
+        timeout = int(self.duration * 2) + 1
+        for alias in (
+            settings.THROTTLE_CACHE,
+            settings.THROTTLE_FALLBACK_CACHE,
+        ):
+            cache = caches[alias]
+            try:
+                previous, current = self._counts(cache, keys)
+                if self._estimate(previous, current) < self.num_requests:
+                    current = self._incr(cache, keys[1], timeout) - 1
+                return previous, current
+            except Exception:  # connection errors differ per cache backend
+                if alias == settings.THROTTLE_FALLBACK_CACHE:
+                    raise
+                logger.warning("Throttle cache unavailable, counting locally")
+        return 0, 0  # pragma: no cover
+
+    def _estimate(self, previous, current):
+        return previous * (1 - self.elapsed) + current
+
+    def allow_request(self, request, view):
+        self.scope = self.get_scope(request, view)
+        if self.scope is None:
+            return True
+        self.rate = self.get_rate()
+        if self.rate is None:
+            return True
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+
+        ident = self.get_cache_key(request, view)
+        if ident is None:
+            return True
+
+        self.now = self.timer()
+        window, offset = divmod(self.now, self.duration)
+        self.elapsed = offset / self.duration
+        keys = [f"{ident}:{int(window) - 1}", f"{ident}:{int(window)}"]
+        self.previous, self.current = self._hit(keys)
+        if self._estimate(self.previous, self.current) < self.num_requests:
+            return True
+        return self.throttle_failure()
+
+    def wait(self):
+        """Seconds until the estimate drops below the limit again"""
+        remaining = (1 - self.elapsed) * self.duration
+        excess = (
+            self._estimate(self.previous, self.current) - self.num_requests + 1
+        )
+        if self.previous and excess <= self.previous * (1 - self.elapsed):
+            # the previous window slides out far enough before this one ends
+            return excess / self.previous * self.duration
+        # next window: this window's count becomes the sliding "previous"
+        if self.current < self.num_requests:
+            return remaining
+        return (
+            remaining
+            + (1 - (self.num_requests - 1) / self.current) * self.duration
+        )
+
+    def get_scope(self, request, view):
+        return self.scope
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            ident = f"user-{request.user.pk}"
+        else:
+            ident = f"ip-{self.get_ident(request)}"
+        return f"throttle:{self.scope}:{ident}"
+
+
+class AnonSlidingWindowThrottle(SlidingWindowThrottle):
+    """Overall rate for anonymous requests, per IP"""
+
+    scope = "anon"
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return None
+        return super().get_cache_key(request, view)
+
+
+class UserSlidingWindowThrottle(SlidingWindowThrottle):
+    """Overall rate for authenticated requests, per user"""
+
+    scope = "user"
+
+    def get_cache_key(self, request, view):
+        if not (request.user and request.user.is_authenticated):
+            return None
+        return super().get_cache_key(request, view)
+
+
+class ScopedSlidingWindowThrottle(SlidingWindowThrottle):
+    """Rate for a specific kind of request, per user (or per IP if anonymous)
+
+    The scope is the view's `throttle_scope`, or `throttle_scopes[view.action]`
+    for viewsets. Other unsafe requests fall under the "write" scope.
+    """
+
+    scope = None
+
+    def get_scope(self, request, view):
+        scope = getattr(view, "throttle_scope", None)
+        if scope is None:
+            scopes = getattr(view, "throttle_scopes", {})
+            scope = scopes.get(getattr(view, "action", None))
+        if scope is None and request.method not in SAFE_METHODS:
+            scope = "write"
+        return scope
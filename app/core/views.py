@@ -1,10 +1,78 @@
 """core views for app"""
 
-from rest_framework.decorators import api_view
-from rest_framework.response import Response
+from django.conf import settings
+from django.http import Http404, HttpResponse, JsonResponse
+from django.utils.crypto import constant_time_compare
+from django.utils.module_loading import import_string
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_safe
 
+from core.health import readiness, without_details
+from core.metrics import registry
 
-@api_view(["GET"])
-def health_check(request):
+
+@require_safe
+def _health_check(request):
     """returns successful response"""
-    return Response({"healthy": True})
+    # liveness - the process answers. No DRF and no db
+    return JsonResponse({"healthy": True})
+
+
+async def _async_health_check(request):
+    # nothing in there blocks, so under ASGI it never waits for a thread
+    return _health_check(request)
+
+
+# uWSGI would have to start an event loop for an async view on every request
+health_check = (
+    _async_health_check if settings.SERVER_MODE == "asgi" else _health_check
+)
+
+
+def _has_metrics_token(request):
+    token = settings.METRICS_TOKEN
+    authorization = request.headers.get("Authorization", "")
+    return bool(token) and constant_time_compare(
+        authorization, f"Bearer {token}"
+    )
+
+
+def ready(request):
+    """Whether this process can serve requests: database, cache and media"""
+    result = readiness.check()
+    status = 200 if result["ready"] else 503
+    if not _has_metrics_token(request):
+        result = without_details(result)
+    return JsonResponse(result, status=status)
+
+
+def metrics(request):
+    """Metrics of all the worker processes, in the Prometheus text format"""
+    token = settings.METRICS_TOKEN
+    if not token and not settings.DEBUG:
+        # never public in production, the query fingerprints are in there too
+        raise Http404
+    if token and not _has_metrics_token(request):
+        return HttpResponse(status=401)
+    return HttpResponse(
+        registry.render(),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+
+def lazy_view(dotted_path, **initkwargs):
+    """Return a view that imports its class-based view on the first request
+
+    For views we rarely hit but that drag in a lot of imports (the API docs),
+    so a fresh worker doesn't pay for them before it can serve anything.
+    """
+    view = None
+
+    @csrf_exempt
+    def wrapper(request, *args, **kwargs):
+        nonlocal view
+        if view is None:
+            view = import_string(dotted_path).as_view(**initkwargs)
+        return view(request, *args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,143 @@
+"""Per-user change log the sync endpoint reads from"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import connection, transaction
+
+from core.models import ChangeCounter, SyncChange
+
+# kind of the M2M link rows, by Recipe field
+LINK_KINDS = {"tags": "recipe_tag", "ingredients": "recipe_ingredient"}
+
+# {(user id, kind, object id, related id): deleted} during `collect()`
+_pending = ContextVar("pending_changes", default=None)
+# {user id: on_commit marker of the delete} - their change log goes with them
+_deleting_users = ContextVar("deleting_users", default=None)
+
+
+def record(user_id, kind, object_ids, deleted=False):
+    """Log that recipes/tags/ingredients were created, changed or deleted"""
+    _add({(user_id, kind, pk, 0): deleted for pk in object_ids})
+
+
+def record_links(user_id, field, pairs, deleted=False):
+    """Log (recipe id, tag/ingredient id) links that were added (or removed)"""
+    kind = LINK_KINDS[field]
+    _add({(user_id, kind, recipe_id, pk): deleted for recipe_id, pk in pairs})
+
+
+def deleting_user(user_id, deleting=True):
+    """Stop logging the user's changes while the deletion cascades"""
+    users = _users_being_deleted()
+    if deleting:
+        # django drops it if the delete's transaction (or savepoint) rolls back
+        users[user_id] = marker = lambda: None
+        transaction.on_commit(marker)
+    else:
+        users.pop(user_id, None)
+    _deleting_users.set(users)
+
+
+def _users_being_deleted():
+    """Users whose delete is still running
+
+    A delete that failed has lost its on_commit marker, so the user's changes
+    are logged again without anything having to clean up after it.
+    """
+    users = _deleting_users.get() or {}
+    markers = {id(func) for _, func in connection.run_on_commit}
+    return {
+        user_id: marker
+        for user_id, marker in users.items()
+        if id(marker) in markers
+    }
+
+
+def _add(changes):
+    if _deleting_users.get():
+        deleting = _users_being_deleted()
+        changes = {
+            key: deleted
+            for key, deleted in changes.items()
+            if key[0] not in deleting
+        }
+    if not changes:
+        return
+    pending = _pending.get()
+    if pending is not None:
+        # only the last change of an object matters
+        pending.update(changes)
+        return
+    _write(changes)
+
+
+def _write(changes):
+    """Give the changes the user's next sequence numbers and store them"""
+    by_user = {}
+    for (user_id, kind, object_id, related_id), deleted in changes.items():
+        by_user.setdefault(user_id, []).append(
+            (kind, object_id, related_id, deleted)
+        )
+
+    counter_table = connection.ops.quote_name(ChangeCounter._meta.db_table)
+    change_table = connection.ops.quote_name(SyncChange._meta.db_table)
+    with transaction.atomic(), connection.cursor() as cursor:
+        # in user id order, so two transactions can't deadlock on the counters
+        for user_id, rows in sorted(by_user.items()):
+            # locks the counter row until commit - see ChangeCounter
+            cursor.execute(
+                f"INSERT INTO {counter_table} AS c (user_id, seq) "
+                "VALUES (%s, %s) ON CONFLICT (user_id) "
+                "DO UPDATE SET seq = c.seq + EXCLUDED.seq RETURNING seq",
+                [user_id, len(rows)],
+            )
+            last = cursor.fetchone()[0]
+            kinds, object_ids, related_ids, deleted = zip(*rows)
+            cursor.execute(
+                f"INSERT INTO {change_table} "
+                "(user_id, kind, object_id, related_id, seq, deleted) "
+                "SELECT %s, * FROM unnest("
+                "%s::text[], %s::bigint[], %s::bigint[], %s::bigint[], "
+                "%s::boolean[]"
+                ") ON CONFLICT (user_id, kind, object_id, related_id) "
+                "DO UPDATE SET seq = EXCLUDED.seq, deleted = EXCLUDED.deleted",
+                [
+                    user_id,
+                    list(kinds),
+                    list(object_ids),
+                    list(related_ids),
+                    list(range(last - len(rows) + 1, last + 1)),
+                    list(deleted),
+                ],
+            )
+
+
+@contextmanager
+def collect():
+    """Buffer the changes of the block and write them in one go at the end
+
+    Used by summaries.batch(), so it has to run inside a transaction.
+    """
+    if _pending.get() is not None:
+        yield
+        return
+
+    pending = {}
+    token = _pending.set(pending)
+    try:
+        yield
+    finally:
+        _pending.reset(token)
+    if pending:
+        _write(pending)
+
+
+def changes_since(user, cursor, limit):
+    """Return (changes, has_more) of the user after the cursor, oldest first"""
+    changes = list(
+        SyncChange.objects.filter(user=user, seq__gt=cursor).order_by("seq")[
+            : limit + 1
+        ]
+    )
+    return changes[:limit], len(changes) > limit
@@ -0,0 +1,45 @@
+"""Copying recipes server-side with set-based SQL"""
+
+from django.db import connection
+
+from core.models import Recipe
+
+
+def copy_recipes(user_id, recipe_ids, share_image=True):
+    """Copy the user's recipes in one statement, returning {original id: copy id}
+
+    The copies point at the same image file when `share_image` is on (files
+    are only deleted once no recipe uses them), otherwise they have none.
+    Tags/ingredients are copied separately, see links.copy_links().
+    """
+    if not recipe_ids:
+        return {}
+    quote = connection.ops.quote_name
+    meta = Recipe._meta
+    table = quote(meta.db_table)
+    columns = [f.column for f in meta.concrete_fields if not f.primary_key]
+    image = meta.get_field("image").column
+    values = [
+        f"CASE WHEN %s THEN {quote(c)} END" if c == image else quote(c)
+        for c in columns
+    ]
+    with connection.cursor() as cursor:
+        # the new ids are taken from the sequence up front, so we know which
+        # copy belongs to which original
+        cursor.execute(
+            f"WITH src AS (SELECT *, nextval(pg_get_serial_sequence(%s, %s)) "
+            f"AS new_id FROM {table} WHERE user_id = %s AND id = ANY(%s) "
+            "ORDER BY id), "
+            f"copied AS (INSERT INTO {table} "
+            f"(id, {', '.join(map(quote, columns))}) "
+            f"SELECT new_id, {', '.join(values)} FROM src) "
+            "SELECT id, new_id FROM src",
+            [
+                meta.db_table,
+                meta.pk.column,
+                user_id,
+                list(recipe_ids),
+                share_image,
+            ],
+        )
+        return dict(cursor.fetchall())
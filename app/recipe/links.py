@@ -0,0 +1,88 @@
+"""Set-based operations on the recipe <-> tag/ingredient M2M tables"""
+
+from django.db import connection
+
+from core.models import Recipe
+
+
+def _through(field):
+    """Return (through model, quoted table, recipe column, attr column)"""
+    through = getattr(Recipe, field).through
+    quote = connection.ops.quote_name
+    attr = through._meta.get_field(field[:-1])  # "tags" -> "tag"
+    return (
+        through,
+        quote(through._meta.db_table),
+        quote(through._meta.get_field("recipe").column),
+        quote(attr.column),
+    )
+
+
+# they all return the (recipe id, tag/ingredient id) pairs they changed, for
+# the change log
+
+
+def link(field, recipe_ids, attr_ids):
+    """Attach every tag/ingredient to every recipe, return the pairs added"""
+    if not recipe_ids or not attr_ids:
+        return []
+    _, table, recipe_col, attr_col = _through(field)
+    with connection.cursor() as cursor:
+        # pairs that already exist are skipped (unique together)
+        cursor.execute(
+            f"INSERT INTO {table} ({recipe_col}, {attr_col}) "
+            "SELECT r, a FROM unnest(%s::bigint[]) r "
+            "CROSS JOIN unnest(%s::bigint[]) a "
+            f"ON CONFLICT DO NOTHING RETURNING {recipe_col}, {attr_col}",
+            [list(recipe_ids), list(attr_ids)],
+        )
+        return cursor.fetchall()
+
+
+def unlink(field, recipe_ids, attr_ids):
+    """Detach the tags/ingredients from the recipes, return the pairs"""
+    if not recipe_ids or not attr_ids:
+        return []
+    _, table, recipe_col, attr_col = _through(field)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {table} "
+            f"WHERE {recipe_col} = ANY(%s) AND {attr_col} = ANY(%s) "
+            f"RETURNING {recipe_col}, {attr_col}",
+            [list(recipe_ids), list(attr_ids)],
+        )
+        return cursor.fetchall()
+
+
+def repoint(field, attr_ids, into):
+    """Attach `into` to every recipe with any of `attr_ids`, in one query"""
+    _, table, recipe_col, attr_col = _through(field)
+    with connection.cursor() as cursor:
+        # recipes that already have `into` keep their row (unique together)
+        cursor.execute(
+            f"INSERT INTO {table} ({recipe_col}, {attr_col}) "
+            f"SELECT DISTINCT {recipe_col}, %s FROM {table} "
+            f"WHERE {attr_col} = ANY(%s) "
+            f"ON CONFLICT DO NOTHING RETURNING {recipe_col}, {attr_col}",
+            [into, list(attr_ids)],
+        )
+        return cursor.fetchall()
+
+
+def copy_links(field, copies):
+    """Give each copy the tags/ingredients of its original, returning the pairs
+
+    `copies` maps original recipe ids to the ids of their copies.
+    """
+    if not copies:
+        return []
+    _, table, recipe_col, attr_col = _through(field)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} ({recipe_col}, {attr_col}) "
+            f"SELECT c.new_id, t.{attr_col} FROM {table} t "
+            "JOIN unnest(%s::bigint[], %s::bigint[]) AS c(old_id, new_id) "
+            f"ON t.{recipe_col} = c.old_id RETURNING {recipe_col}, {attr_col}",
+            [list(copies), list(copies.values())],
+        )
+        return cursor.fetchall()
@@ -0,0 +1,159 @@
+"""Django command to time the similar recipes and recommend endpoints"""
+
+import random
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from core.models import Ingredient, Recipe, RecipeSummary, Tag
+from recipe import recommendations
+from recipe.views import RecipeViewSet
+
+
+class Command(BaseCommand):
+    """Django command filling a throwaway user with recipes and timing requests
+
+    Everything runs in a transaction that's rolled back at the end, so it can
+    be pointed at any database.
+    """
+
+    help = "Time the similar/recommend endpoints for a user with many recipes"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--recipes", type=int, default=50000)
+        parser.add_argument("--ingredients", type=int, default=500)
+        parser.add_argument("--tags", type=int, default=50)
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def _fill(self, user, options):
+        """Recipes with 3-12 ingredients and 0-3 tags, some much more common"""
+        rng = random.Random(options["seed"])
+        ingredients = Ingredient.objects.bulk_create(
+            Ingredient(user=user, name=f"Ingredient {i}")
+            for i in range(options["ingredients"])
+        )
+        tags = Tag.objects.bulk_create(
+            Tag(user=user, name=f"Tag {i}") for i in range(options["tags"])
+        )
+        ingredient_weights = [1 / (i + 1) for i in range(len(ingredients))]
+        tag_weights = [1 / (i + 1) for i in range(len(tags))]
+
+        # the summaries are built right here, the recipes only need to exist
+        table = Recipe._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} (user_id, title, time_minutes, price, "
+                "link, description, image) "
+                "SELECT %s, 'Recipe ' || n, 30, 5, '', '', '' "
+                "FROM generate_series(1, %s) AS n RETURNING id",
+                [user.id, options["recipes"]],
+            )
+            recipe_ids = sorted(row[0] for row in cursor.fetchall())
+
+        summaries = []
+        for slot, recipe_id in enumerate(recipe_ids):
+            used = sorted(
+                {
+                    i.id
+                    for i in rng.choices(ingredients, ingredient_weights, k=8)
+                }
+            )[: rng.randint(3, 12)]
+            tagged = sorted(
+                {t.id for t in rng.choices(tags, tag_weights, k=3)}
+            )[: rng.randint(0, 3)]
+            summaries.append(
+                RecipeSummary(
+                    recipe_id=recipe_id,
+                    user=user,
+                    title=f"Recipe {slot}",
+                    time_minutes=30,
+                    price=5,
+                    ingredient_ids=used,
+                    tag_ids=tagged,
+                    ingredients=[
+                        {"id": pk, "name": "Ingredient"} for pk in used
+                    ],
+                    tags=[{"id": pk, "name": "Tag"} for pk in tagged],
+                    slot=slot,
+                )
+            )
+        RecipeSummary.objects.bulk_create(summaries, batch_size=5000)
+        recommendations.rebuild(user.id)
+        with connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE {RecipeSummary._meta.db_table}")
+        return recipe_ids, [i.id for i in ingredients], rng
+
+    def _time(self, view, requests):
+        timings = []
+        for request, kwargs in requests:
+            started = time.perf_counter()
+            response = view(request, **kwargs)
+            response.render()
+            timings.append((time.perf_counter() - started) * 1000)
+        return timings
+
+    def _report(self, name, timings):
+        timings.sort()
+        p95 = timings[int(len(timings) * 0.95) - 1]
+        self.stdout.write(
+            f"{name:>10} {statistics.median(timings):>8.1f} {p95:>8.1f} "
+            f"{timings[-1]:>8.1f}"
+        )
+
+    def handle(self, *args, **options):
+        factory = APIRequestFactory()
+        with transaction.atomic():
+            user = get_user_model().objects.create_user(
+                "benchmark@example.com", None
+            )
+            started = time.perf_counter()
+            recipe_ids, ingredient_ids, rng = self._fill(user, options)
+            self.stdout.write(
+                f"{options['recipes']} recipes set up in "
+                f"{time.perf_counter() - started:.1f}s"
+            )
+
+            def get(path, **params):
+                request = factory.get(path, params)
+                force_authenticate(request, user)
+                return request
+
+            similar = [
+                (get("/similar/"), {"pk": str(pk)})
+                for pk in rng.sample(recipe_ids, options["requests"])
+            ]
+            recommend = [
+                (
+                    get(
+                        "/recommend/",
+                        ingredients=".".join(
+                            map(
+                                str,
+                                rng.sample(ingredient_ids, rng.randint(3, 15)),
+                            )
+                        ),
+                    ),
+                    {},
+                )
+                for _ in range(options["requests"])
+            ]
+
+            self.stdout.write(
+                f"{'endpoint':>10} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}"
+            )
+            self._report(
+                "similar",
+                self._time(RecipeViewSet.as_view({"get": "similar"}), similar),
+            )
+            self._report(
+                "recommend",
+                self._time(
+                    RecipeViewSet.as_view({"get": "recommend"}), recommend
+                ),
+            )
+            transaction.set_rollback(True)
@@ -0,0 +1,160 @@
+"""Django command to check the recipe summaries match the recipes"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from django.db import transaction
+
+from core.models import IngredientIndex, Recipe, RecipeStats, RecipeSummary
+from recipe import recommendations
+from recipe.stats import apply_summary, lock_stats
+from recipe.summaries import build_summaries, refresh_recipe_summaries
+
+COMPARED_FIELDS = [
+    "user_id",
+    "title",
+    "time_minutes",
+    "price",
+    "link",
+    "tags",
+    "ingredients",
+    "tag_ids",
+    "ingredient_ids",
+]
+
+
+STATS_FIELDS = [
+    "recipe_count",
+    "total_time_minutes",
+    "total_price",
+    "price_buckets",
+    "tag_counts",
+    "ingredient_counts",
+]
+
+
+def _values(summary):
+    return [getattr(summary, field) for field in COMPARED_FIELDS]
+
+
+def _computed_stats(user_id):
+    stats = RecipeStats(user_id=user_id)
+    for summary in RecipeSummary.objects.filter(user_id=user_id).iterator():
+        apply_summary(stats, summary, 1)
+    return stats
+
+
+class Command(BaseCommand):
+    """Django command comparing every summary with one rebuilt from scratch"""
+
+    help = "Find (and with --fix, repair) missing or stale recipe summaries"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--fix",
+            action="store_true",
+            help="Rebuild the summaries that are off",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        ids = list(Recipe.objects.order_by("id").values_list("id", flat=True))
+        missing = stale = 0
+        batch_size = options["batch_size"]
+
+        for start in range(0, len(ids), batch_size):
+            end = start + batch_size
+            batch = ids[start:end]
+            stored = {
+                summary.recipe_id: summary
+                for summary in RecipeSummary.objects.filter(
+                    recipe_id__in=batch
+                )
+            }
+            broken = []
+            for expected in build_summaries(batch):
+                summary = stored.get(expected.recipe_id)
+                if summary is None:
+                    missing += 1
+                elif _values(summary) != _values(expected):
+                    stale += 1
+                else:
+                    continue
+                broken.append(expected.recipe_id)
+                self.stdout.write(
+                    f"recipe {expected.recipe_id}: summary out of date"
+                )
+
+            if broken and options["fix"]:
+                refresh_recipe_summaries(broken)
+
+        self.stdout.write(
+            f"Checked {len(ids)} recipes: {missing} missing, "
+            f"{stale} stale summaries"
+        )
+        bad_stats = self.check_stats(options["fix"])
+        bad_index = self.check_index(options["fix"])
+
+        if missing or stale or bad_stats or bad_index:
+            if not options["fix"]:
+                raise CommandError(
+                    "Recipe summaries are out of date, run with --fix"
+                )
+            self.stdout.write(self.style.SUCCESS("Fixed"))
+
+    def check_stats(self, fix):
+        """Compare each user's running stats with ones computed from scratch"""
+        user_ids = set(RecipeSummary.objects.values_list("user_id", flat=True))
+        user_ids.update(RecipeStats.objects.values_list("user_id", flat=True))
+        bad = 0
+        for user_id in sorted(user_ids):
+            with transaction.atomic():
+                stats = lock_stats([user_id])[user_id]
+                expected = _computed_stats(user_id)
+                if all(
+                    getattr(stats, field) == getattr(expected, field)
+                    for field in STATS_FIELDS
+                ):
+                    continue
+                bad += 1
+                self.stdout.write(f"user {user_id}: stats out of date")
+                if fix:
+                    expected.save()
+
+        self.stdout.write(
+            f"Checked the stats of {len(user_ids)} users: {bad} wrong"
+        )
+        return bad
+
+    def check_index(self, fix):
+        """Compare each user's bitmaps with ones built from scratch"""
+        user_ids = set(RecipeSummary.objects.values_list("user_id", flat=True))
+        user_ids.update(
+            IngredientIndex.objects.values_list("user_id", flat=True)
+        )
+        bad = 0
+        for user_id in sorted(user_ids):
+            with transaction.atomic():
+                lock_stats([user_id])
+                summaries = list(RecipeSummary.objects.filter(user_id=user_id))
+                slots = {summary.slot for summary in summaries}
+                expected = recommendations.build_bitmaps(summaries)
+                if len(slots) == len(summaries) and expected == (
+                    recommendations.stored_bitmaps(user_id)
+                ):
+                    # right, but maybe much longer than it needs to be
+                    if fix and recommendations.is_sparse(slots):
+                        self.stdout.write(f"user {user_id}: slots renumbered")
+                        recommendations.rebuild(user_id)
+                    continue
+                bad += 1
+                self.stdout.write(
+                    f"user {user_id}: ingredient index out of date"
+                )
+                if fix:
+                    recommendations.rebuild(user_id)
+
+        self.stdout.write(
+            f"Checked the ingredient index of {len(user_ids)} users: "
+            f"{bad} wrong"
+        )
+        return bad
@@ -1,7 +1,8 @@
 """ Serializers for recipe APIs """
 
+from django.conf import settings
 from rest_framework import serializers
-from core.models import Recipe, Tag, Ingredient
+from core.models import Recipe, RecipeSummary, Tag, Ingredient
 
 
 class IngredientSerializer(serializers.ModelSerializer):
@@ -22,6 +23,37 @@ class TagSerializer(serializers.ModelSerializer):
         read_only_fields = ["id"]
 
 
+class BulkIdsSerializer(serializers.Serializer):
+    """Serializer for bulk deleting tags/ingredients"""
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(), allow_empty=False, max_length=1000
+    )
+
+
+class BulkRenameItemSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    name = serializers.CharField(max_length=255)
+
+
+class BulkRenameSerializer(serializers.Serializer):
+    """Serializer for renaming many tags/ingredients at once"""
+
+    items = BulkRenameItemSerializer(many=True, allow_empty=False)
+
+    def validate_items(self, items):
+        if len(items) > 1000:
+            raise serializers.ValidationError("At most 1000 items at once.")
+        return items
+
+
+class MergeSerializer(BulkIdsSerializer):
+    """Serializer for merging tags/ingredients into one"""
+
+    # the one that's kept, the others are removed from recipes and deleted
+    into = serializers.IntegerField()
+
+
 class RecipeSerializer(serializers.ModelSerializer):
     """Serializer for recipes"""
 
@@ -89,6 +121,44 @@ class RecipeSerializer(serializers.ModelSerializer):
         return instance
 
 
+class RecipeSummarySerializer(serializers.ModelSerializer):
+    """Read-only recipe list serializer, same output as RecipeSerializer"""
+
+    id = serializers.IntegerField(source="recipe_id", read_only=True)
+
+    class Meta:
+        model = RecipeSummary
+        fields = RecipeSerializer.Meta.fields
+        read_only_fields = fields
+
+
+class RecipeRecommendationSerializer(RecipeSummarySerializer):
+    """A recipe in the recommendations, with how much of it is covered"""
+
+    matched = serializers.IntegerField(read_only=True)
+    missing = serializers.IntegerField(read_only=True)
+    coverage = serializers.FloatField(read_only=True)
+
+    class Meta(RecipeSummarySerializer.Meta):
+        fields = RecipeSummarySerializer.Meta.fields + [
+            "matched",
+            "missing",
+            "coverage",
+        ]
+        read_only_fields = fields
+
+
+class SimilarRecipeSerializer(RecipeSummarySerializer):
+    """A similar recipe, with how many tags/ingredients it shares"""
+
+    shared = serializers.IntegerField(read_only=True)
+    similarity = serializers.FloatField(read_only=True)
+
+    class Meta(RecipeSummarySerializer.Meta):
+        fields = RecipeSummarySerializer.Meta.fields + ["shared", "similarity"]
+        read_only_fields = fields
+
+
 class RecipeDetailSerializer(RecipeSerializer):
     """Serializer for recipe detail view"""
 
@@ -98,6 +168,171 @@ class RecipeDetailSerializer(RecipeSerializer):
         fields = RecipeSerializer.Meta.fields + ["description", "image"]
 
 
+class SyncRecipeSerializer(serializers.ModelSerializer):
+    """Recipe fields for the sync endpoint - the links are synced separately"""
+
+    class Meta:
+        model = Recipe
+        fields = [
+            "id",
+            "title",
+            "time_minutes",
+            "price",
+            "link",
+            "description",
+            "image",
+        ]
+        read_only_fields = fields
+
+
+class SyncDeletedSerializer(serializers.Serializer):
+    """Ids of deleted objects, and removed (recipe, tag/ingredient) links"""
+
+    recipes = serializers.ListField(child=serializers.IntegerField())
+    tags = serializers.ListField(child=serializers.IntegerField())
+    ingredients = serializers.ListField(child=serializers.IntegerField())
+    recipe_tags = serializers.ListField(
+        child=serializers.ListField(child=serializers.IntegerField())
+    )
+    recipe_ingredients = serializers.ListField(
+        child=serializers.ListField(child=serializers.IntegerField())
+    )
+
+
+class SyncSerializer(serializers.Serializer):
+    """A page of the user's changes since a cursor"""
+
+    # pass it back as ?cursor= to get the next page / the next changes
+    cursor = serializers.IntegerField()
+    has_more = serializers.BooleanField()
+    recipes = SyncRecipeSerializer(many=True)
+    tags = TagSerializer(many=True)
+    ingredients = IngredientSerializer(many=True)
+    recipe_tags = serializers.ListField(
+        child=serializers.ListField(child=serializers.IntegerField())
+    )
+    recipe_ingredients = serializers.ListField(
+        child=serializers.ListField(child=serializers.IntegerField())
+    )
+    deleted = SyncDeletedSerializer()
+
+
+class RecipeStatsItemSerializer(serializers.Serializer):
+    """A tag/ingredient with the number of recipes using it"""
+
+    id = serializers.IntegerField()
+    name = serializers.CharField()
+    recipe_count = serializers.IntegerField()
+
+
+class RecipeStatsSerializer(serializers.Serializer):
+    """Serializer for the stats of the user's recipes"""
+
+    recipe_count = serializers.IntegerField()
+    average_time_minutes = serializers.FloatField(allow_null=True)
+    average_price = serializers.DecimalField(
+        max_digits=14, decimal_places=2, allow_null=True
+    )
+    # {"0-5": 3, "5-10": 1, ...}
+    price_distribution = serializers.DictField(
+        child=serializers.IntegerField()
+    )
+    top_tags = RecipeStatsItemSerializer(many=True)
+    top_ingredients = RecipeStatsItemSerializer(many=True)
+
+
+class BulkRecipeFilterSerializer(serializers.Serializer):
+    """Same filters as the list endpoint - recipes with any of the ids"""
+
+    tags = serializers.ListField(
+        child=serializers.IntegerField(), required=False
+    )
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(), required=False
+    )
+
+
+class BulkRecipeSerializer(serializers.Serializer):
+    """Serializer for picking the recipes of a bulk update/delete"""
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(), required=False
+    )
+    filter = BulkRecipeFilterSerializer(required=False)
+
+    def validate(self, attrs):
+        # an empty selection would otherwise mean "all of them"
+        selection = attrs.get("filter", {})
+        if not (
+            attrs.get("ids")
+            or selection.get("tags")
+            or selection.get("ingredients")
+        ):
+            raise serializers.ValidationError(
+                "Pick the recipes with ids or a tags/ingredients filter."
+            )
+        return attrs
+
+
+class CopyRecipesSerializer(serializers.Serializer):
+    """Serializer for copying recipes"""
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(), allow_empty=False
+    )
+    # point the copies at the same image file, or leave them without one
+    share_image = serializers.BooleanField(default=True)
+
+    def validate_ids(self, ids):
+        limit = settings.BULK_RECIPE_LIMIT
+        if len(set(ids)) > limit:
+            raise serializers.ValidationError(
+                f"At most {limit} recipes at once."
+            )
+        return ids
+
+
+class BulkRecipeChangesSerializer(serializers.ModelSerializer):
+    """The fields a bulk update can set"""
+
+    class Meta:
+        model = Recipe
+        fields = ["title", "time_minutes", "price", "link", "description"]
+        extra_kwargs = {field: {"required": False} for field in fields}
+
+
+class BulkRecipeUpdateSerializer(BulkRecipeSerializer):
+    """Serializer for bulk updating recipes"""
+
+    CHANGES = [
+        "set",
+        "add_tags",
+        "remove_tags",
+        "add_ingredients",
+        "remove_ingredients",
+    ]
+
+    set = BulkRecipeChangesSerializer(required=False)
+    add_tags = serializers.ListField(
+        child=serializers.IntegerField(), required=False
+    )
+    remove_tags = serializers.ListField(
+        child=serializers.IntegerField(), required=False
+    )
+    add_ingredients = serializers.ListField(
+        child=serializers.IntegerField(), required=False
+    )
+    remove_ingredients = serializers.ListField(
+        child=serializers.IntegerField(), required=False
+    )
+
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+        if not any(attrs.get(field) for field in self.CHANGES):
+            raise serializers.ValidationError("Nothing to change.")
+        return attrs
+
+
 # We're creating a separate API because an API should accept only one type of data
 class RecipeImageSerializer(serializers.ModelSerializer):
     """for uploading imgs to recipes"""
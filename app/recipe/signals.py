@@ -0,0 +1,139 @@
+"""Signal handlers keeping the recipe summaries and change log up to date"""
+
+from django.contrib.auth import get_user_model
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+)
+from django.dispatch import receiver
+
+from core.models import Recipe, Tag, Ingredient
+from recipe import changelog
+from recipe.summaries import (
+    delete_images,
+    discard_recipe_summaries,
+    recipe_ids_using,
+    refresh_recipe_summaries,
+    refresh_recipes_using,
+)
+
+KINDS = {Recipe: "recipe", Tag: "tag", Ingredient: "ingredient"}
+LINK_FIELDS = {
+    Recipe.tags.through: "tags",
+    Recipe.ingredients.through: "ingredients",
+}
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, **kwargs):
+    refresh_recipe_summaries([instance.pk])
+
+
+@receiver(pre_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    # runs in the same transaction as the delete
+    discard_recipe_summaries([instance.pk])
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_image_deleted(sender, instance, **kwargs):
+    if instance.image:
+        delete_images([instance.image.name])
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def recipe_links_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Tags/ingredients added to or removed from recipes, from either side"""
+    field = LINK_FIELDS[sender]
+    if not reverse:
+        if action == "pre_clear":
+            instance._cleared_link_ids = list(
+                getattr(instance, field).values_list("id", flat=True)
+            )
+        elif action == "post_clear":
+            cleared = instance.__dict__.pop("_cleared_link_ids", [])
+            changelog.record_links(
+                instance.user_id,
+                field,
+                [(instance.pk, pk) for pk in cleared],
+                True,
+            )
+        elif action in ("post_add", "post_remove"):
+            changelog.record_links(
+                instance.user_id,
+                field,
+                [(instance.pk, pk) for pk in pk_set],
+                deleted=action == "post_remove",
+            )
+        if action in ("post_add", "post_remove", "post_clear"):
+            refresh_recipe_summaries([instance.pk])
+    elif action == "pre_clear":
+        # after the clear we can't tell which recipes it was attached to
+        instance._cleared_recipe_ids = list(
+            recipe_ids_using(type(instance), [instance.pk])
+        )
+    elif action == "post_clear":
+        cleared = instance.__dict__.pop("_cleared_recipe_ids", [])
+        changelog.record_links(
+            instance.user_id,
+            field,
+            [(pk, instance.pk) for pk in cleared],
+            True,
+        )
+        refresh_recipe_summaries(cleared)
+    elif action in ("post_add", "post_remove"):
+        # reverse - `instance` is the tag/ingredient, `pk_set` the recipes
+        changelog.record_links(
+            instance.user_id,
+            field,
+            [(pk, instance.pk) for pk in pk_set],
+            deleted=action == "post_remove",
+        )
+        refresh_recipe_summaries(pk_set)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+def recipe_attr_saved(sender, instance, created, **kwargs):
+    """Renamed tag/ingredient - new ones aren't attached to anything yet"""
+    if not created:
+        refresh_recipes_using(sender, [instance.pk])
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def recipe_attr_deleted(sender, instance, **kwargs):
+    # the M2M rows are gone already, but the summaries still list it
+    refresh_recipes_using(sender, [instance.pk])
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+def log_saved(sender, instance, **kwargs):
+    changelog.record(instance.user_id, KINDS[sender], [instance.pk])
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def log_deleted(sender, instance, **kwargs):
+    # the links go with it, clients drop them without separate tombstones
+    changelog.record(
+        instance.user_id, KINDS[sender], [instance.pk], deleted=True
+    )
+
+
+# deleting a user deletes their recipes/tags/ingredients first, which would log
+# tombstones for a user that's about to be gone
+@receiver(pre_delete, sender=get_user_model())
+def user_deleting(sender, instance, **kwargs):
+    changelog.deleting_user(instance.pk)
+
+
+@receiver(post_delete, sender=get_user_model())
+def user_deleted(sender, instance, **kwargs):
+    changelog.deleting_user(instance.pk, deleting=False)
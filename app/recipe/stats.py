@@ -0,0 +1,113 @@
+"""Per-user recipe statistics, maintained incrementally from the summaries"""
+
+from decimal import Decimal
+
+from core.models import RecipeStats, Tag, Ingredient
+
+# upper bounds of the price distribution buckets, the last bucket is open ended
+PRICE_BUCKETS = [5, 10, 20, 50]
+
+
+def price_bucket(price):
+    """Return the label of the bucket a price falls into, e.g. "5-10" """
+    lower = 0
+    for upper in PRICE_BUCKETS:
+        if price < upper:
+            return f"{lower}-{upper}"
+        lower = upper
+    return f"{lower}+"
+
+
+def _bump(counts, key, sign):
+    key = str(key)
+    counts[key] = counts.get(key, 0) + sign
+    # keep the dicts small - drop what isn't used anymore
+    if counts[key] <= 0:
+        del counts[key]
+
+
+def apply_summary(stats, summary, sign):
+    """Add (sign=1) or remove (sign=-1) one recipe summary to/from the stats"""
+    stats.recipe_count += sign
+    stats.total_time_minutes += sign * summary.time_minutes
+    stats.total_price += sign * summary.price
+    _bump(stats.price_buckets, price_bucket(summary.price), sign)
+    for tag_id in summary.tag_ids:
+        _bump(stats.tag_counts, tag_id, sign)
+    for ingredient_id in summary.ingredient_ids:
+        _bump(stats.ingredient_counts, ingredient_id, sign)
+
+
+def lock_stats(user_ids):
+    """Return {user id: stats} with the rows locked until the transaction ends
+
+    Must be called in a transaction. Locks are taken in user id order, so two
+    transactions touching the same users can't deadlock.
+    """
+    user_ids = sorted(set(user_ids))
+    existing = set(
+        RecipeStats.objects.filter(user_id__in=user_ids).values_list(
+            "user_id", flat=True
+        )
+    )
+    for user_id in user_ids:
+        if user_id not in existing:
+            RecipeStats.objects.get_or_create(user_id=user_id)
+    return {
+        stats.user_id: stats
+        for stats in RecipeStats.objects.select_for_update()
+        .filter(user_id__in=user_ids)
+        .order_by("user_id")
+    }
+
+
+def apply_changes(stats_by_user, old_summaries, new_summaries):
+    """Swap the old summaries for the new ones in the (locked) stats, save"""
+    for summary in old_summaries:
+        apply_summary(stats_by_user[summary.user_id], summary, -1)
+    for summary in new_summaries:
+        apply_summary(stats_by_user[summary.user_id], summary, 1)
+    for stats in stats_by_user.values():
+        stats.save()
+
+
+def _top(model, counts, limit):
+    top = sorted(counts.items(), key=lambda item: (-item[1], int(item[0])))[
+        :limit
+    ]
+    names = dict(
+        model.objects.filter(id__in=[int(pk) for pk, _ in top]).values_list(
+            "id", "name"
+        )
+    )
+    return [
+        {"id": int(pk), "name": names[int(pk)], "recipe_count": count}
+        for pk, count in top
+        if int(pk) in names
+    ]
+
+
+def user_stats(user, top=5):
+    """Return a user's stats in the shape of the stats endpoint"""
+    stats = RecipeStats.objects.filter(user=user).first() or RecipeStats(
+        user=user
+    )
+    count = stats.recipe_count
+    distribution = {price_bucket(0): 0}
+    for bound in PRICE_BUCKETS:
+        distribution[price_bucket(bound)] = 0
+    distribution.update(stats.price_buckets)
+    return {
+        "recipe_count": count,
+        "average_time_minutes": (
+            stats.total_time_minutes / count if count else None
+        ),
+        "average_price": (
+            (Decimal(stats.total_price) / count).quantize(Decimal("0.01"))
+            if count
+            else None
+        ),
+        "price_distribution": distribution,
+        "top_tags": _top(Tag, stats.tag_counts, top),
+        "top_ingredients": _top(Ingredient, stats.ingredient_counts, top),
+    }
@@ -0,0 +1,184 @@
+"""Keeping the denormalized RecipeSummary rows in sync with the recipes"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import transaction
+from django.db.models import Prefetch
+
+from core.models import Recipe, RecipeSummary, Tag, Ingredient
+from recipe import changelog, recommendations, stats, tasks
+
+# recipe ids waiting for a refresh while a `batch()` block is running
+_pending = ContextVar("pending_summary_refresh", default=None)
+
+
+def build_summaries(recipe_ids):
+    """Return fresh (unsaved) summaries for the given recipes"""
+    recipes = Recipe.objects.filter(id__in=recipe_ids).prefetch_related(
+        Prefetch("tags", queryset=Tag.objects.order_by("id")),
+        Prefetch("ingredients", queryset=Ingredient.objects.order_by("id")),
+    )
+    summaries = []
+    for recipe in recipes:
+        tags = recipe.tags.all()
+        ingredients = recipe.ingredients.all()
+        summaries.append(
+            RecipeSummary(
+                recipe_id=recipe.id,
+                user_id=recipe.user_id,
+                title=recipe.title,
+                time_minutes=recipe.time_minutes,
+                price=recipe.price,
+                link=recipe.link,
+                tags=[{"id": tag.id, "name": tag.name} for tag in tags],
+                ingredients=[
+                    {"id": ing.id, "name": ing.name} for ing in ingredients
+                ],
+                tag_ids=[tag.id for tag in tags],
+                ingredient_ids=[ing.id for ing in ingredients],
+            )
+        )
+    return summaries
+
+
+def _refresh(recipe_ids):
+    """Rewrite the summaries of the recipes, in a constant number of queries
+
+    The users' stats are updated from the difference between the old and the
+    new summaries in the same transaction.
+    """
+    with transaction.atomic():
+        summaries = build_summaries(recipe_ids)
+        old = RecipeSummary.objects.filter(recipe_id__in=recipe_ids)
+        user_ids = {summary.user_id for summary in summaries}
+        user_ids.update(old.values_list("user_id", flat=True))
+        # the stats row lock also serializes refreshes of the user's summaries,
+        # so the old summaries have to be read after taking it
+        stats_by_user = stats.lock_stats(user_ids)
+        old_summaries = list(old)
+        recommendations.assign_slots(old_summaries, summaries)
+        # also takes care of summaries whose recipe is gone
+        old.delete()
+        RecipeSummary.objects.bulk_create(summaries)
+        stats.apply_changes(stats_by_user, old_summaries, summaries)
+        recommendations.apply_changes(old_summaries, summaries)
+
+
+def discard_recipe_summaries(recipe_ids):
+    """Drop the summaries of recipes about to be deleted, and their stats
+
+    Called right away even inside `batch()` - the cascade would otherwise
+    delete the summaries behind our back. Inside a batch, recipes that were
+    already discarded (e.g. up front for a bulk delete) are skipped.
+    """
+    pending = _pending.get()
+    if pending is not None:
+        recipe_ids = set(recipe_ids) - pending.discarded
+        if not recipe_ids:
+            return
+        pending.discarded.update(recipe_ids)
+    with transaction.atomic():
+        old = RecipeSummary.objects.filter(recipe_id__in=recipe_ids)
+        stats_by_user = stats.lock_stats(old.values_list("user_id", flat=True))
+        old_summaries = list(old)
+        old.delete()
+        stats.apply_changes(stats_by_user, old_summaries, [])
+        recommendations.apply_changes(old_summaries, [])
+
+
+def refresh_recipe_summaries(recipe_ids):
+    """Bring the summaries of the given recipes up to date
+
+    Inside a `batch()` block the ids are only collected, and refreshed once
+    when the block ends.
+    """
+    recipe_ids = set(recipe_ids)
+    if not recipe_ids:
+        return
+    pending = _pending.get()
+    if pending is not None:
+        pending.recipe_ids.update(recipe_ids)
+        return
+    _refresh(recipe_ids)
+
+
+def recipe_ids_using(model, ids):
+    """Return the ids of the recipes using any of the tags or ingredients"""
+    field = "tag_ids" if model is Tag else "ingredient_ids"
+    return RecipeSummary.objects.filter(
+        **{f"{field}__overlap": list(ids)}
+    ).values_list("recipe_id", flat=True)
+
+
+def refresh_recipes_using(model, ids):
+    """Refresh the summaries of the recipes using the given tags/ingredients
+
+    Inside a `batch()` the lookup is done once at the end for all of them,
+    instead of once per tag/ingredient.
+    """
+    ids = set(ids)
+    if not ids:
+        return
+    pending = _pending.get()
+    if pending is not None:
+        pending.used[model].update(ids)
+        return
+    refresh_recipe_summaries(recipe_ids_using(model, ids))
+
+
+def delete_images(names):
+    """Queue the image files for deletion, in one task per `batch()` block"""
+    pending = _pending.get()
+    if pending is not None:
+        pending.image_names.update(names)
+        return
+    tasks.delete_images.delay(names=list(names))
+
+
+class _Pending:
+    """What a `batch()` block has touched so far"""
+
+    def __init__(self):
+        self.recipe_ids = set()
+        self.used = {Tag: set(), Ingredient: set()}
+        self.discarded = set()
+        self.image_names = set()
+
+    def all_recipe_ids(self):
+        recipe_ids = set(self.recipe_ids)
+        for model, ids in self.used.items():
+            if ids:
+                # the summaries still list the tags even if they're deleted now
+                recipe_ids.update(recipe_ids_using(model, ids))
+        return recipe_ids
+
+
+@contextmanager
+def batch():
+    """Run the block in a transaction and refresh each touched summary only once
+
+    Creating a recipe with 5 tags would otherwise rebuild its summary 6 times
+    (once for the recipe and once per tag added). The change log entries and
+    the image deletes are buffered the same way.
+    """
+    if _pending.get() is not None:
+        # already batching - the outer block does the refresh
+        yield
+        return
+
+    pending = _Pending()
+    token = _pending.set(pending)
+    try:
+        with transaction.atomic(), changelog.collect():
+            yield
+            _pending.reset(token)
+            token = None
+            recipe_ids = pending.all_recipe_ids()
+            if recipe_ids:
+                _refresh(recipe_ids)
+            if pending.image_names:
+                tasks.delete_images.delay(names=sorted(pending.image_names))
+    finally:
+        if token is not None:
+            _pending.reset(token)
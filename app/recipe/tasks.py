@@ -0,0 +1,15 @@
+"""Background tasks of the recipe app"""
+
+from core.models import Recipe
+from core.tasks import task
+
+
+@task
+def delete_images(names):
+    """Delete recipe image files that no recipe uses anymore"""
+    in_use = set(
+        Recipe.objects.filter(image__in=names).values_list("image", flat=True)
+    )
+    storage = Recipe._meta.get_field("image").storage
+    for name in set(names) - in_use:
+        storage.delete(name)
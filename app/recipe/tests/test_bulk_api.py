@@ -0,0 +1,297 @@
+"""Tests for the bulk tag/ingredient actions"""
+
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, RecipeStats, RecipeSummary, Tag, Ingredient
+
+TAG_BULK_DELETE_URL = reverse("recipe:tag-bulk-delete")
+TAG_BULK_RENAME_URL = reverse("recipe:tag-bulk-rename")
+TAG_MERGE_URL = reverse("recipe:tag-merge")
+INGREDIENT_MERGE_URL = reverse("recipe:ingredient-merge")
+RECIPE_BULK_URL = reverse("recipe:recipe-bulk")
+
+
+def create_recipe(user, **params):
+    defaults = {
+        "title": "Sample recipe",
+        "time_minutes": 10,
+        "price": Decimal("5"),
+    }
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class BulkApiTests(TestCase):
+    """Test bulk deleting, renaming and merging"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "user@example.com", "pw123"
+        )
+        self.client.force_authenticate(self.user)
+        self.recipe = create_recipe(self.user)
+
+    def create_tags(self, count, recipe=None):
+        tags = [
+            Tag.objects.create(user=self.user, name=f"Tag {i}")
+            for i in range(count)
+        ]
+        if recipe:
+            recipe.tags.add(*tags)
+        return tags
+
+    def test_bulk_delete(self):
+        tags = self.create_tags(3, self.recipe)
+
+        res = self.client.post(
+            TAG_BULK_DELETE_URL,
+            {"ids": [tags[0].id, tags[1].id]},
+            format="json",
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(list(Tag.objects.all()), [tags[2]])
+        self.assertEqual(list(self.recipe.tags.all()), [tags[2]])
+        summary = RecipeSummary.objects.get(recipe=self.recipe)
+        self.assertEqual(summary.tag_ids, [tags[2].id])
+
+    def test_bulk_delete_other_users_tag(self):
+        other = get_user_model().objects.create_user(
+            "other@example.com", "pw123"
+        )
+        tag = Tag.objects.create(user=other, name="Theirs")
+        mine = Tag.objects.create(user=self.user, name="Mine")
+
+        res = self.client.post(
+            TAG_BULK_DELETE_URL, {"ids": [tag.id, mine.id]}, format="json"
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Tag.objects.count(), 2)
+
+    def test_bulk_rename(self):
+        tags = self.create_tags(2, self.recipe)
+        payload = {
+            "items": [
+                {"id": tags[0].id, "name": "Vegan"},
+                {"id": tags[1].id, "name": "Quick"},
+            ]
+        }
+
+        res = self.client.post(TAG_BULK_RENAME_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([t["name"] for t in res.data], ["Vegan", "Quick"])
+        tags[0].refresh_from_db()
+        self.assertEqual(tags[0].name, "Vegan")
+        summary = RecipeSummary.objects.get(recipe=self.recipe)
+        self.assertEqual([t["name"] for t in summary.tags], ["Vegan", "Quick"])
+
+    def test_merge(self):
+        keep, dupe1, dupe2 = self.create_tags(3)
+        # has both the kept one and a duplicate
+        self.recipe.tags.add(keep, dupe1)
+        other_recipe = create_recipe(self.user)
+        other_recipe.tags.add(dupe2)
+        payload = {"ids": [dupe1.id, dupe2.id], "into": keep.id}
+
+        res = self.client.post(TAG_MERGE_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["id"], keep.id)
+        self.assertEqual(list(Tag.objects.all()), [keep])
+        self.assertEqual(list(self.recipe.tags.all()), [keep])
+        self.assertEqual(list(other_recipe.tags.all()), [keep])
+        summary = RecipeSummary.objects.get(recipe=other_recipe)
+        self.assertEqual(summary.tag_ids, [keep.id])
+        stats = RecipeStats.objects.get(user=self.user)
+        self.assertEqual(stats.tag_counts, {str(keep.id): 2})
+
+    def test_merge_ingredients(self):
+        keep = Ingredient.objects.create(user=self.user, name="Salt")
+        dupe = Ingredient.objects.create(user=self.user, name="salt")
+        self.recipe.ingredients.add(dupe)
+
+        res = self.client.post(
+            INGREDIENT_MERGE_URL,
+            {"ids": [dupe.id], "into": keep.id},
+            format="json",
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(self.recipe.ingredients.all()), [keep])
+
+    def test_constant_query_count(self):
+        """Test the bulk actions don't do more queries for more objects"""
+
+        def count_queries(url, payload):
+            with CaptureQueriesContext(connection) as queries:
+                res = self.client.post(url, payload, format="json")
+            self.assertLess(res.status_code, 300)
+            return len(queries)
+
+        counts = []
+        for size in (2, 20):
+            recipe = create_recipe(self.user)
+            tags = self.create_tags(size, recipe)
+            ids = [tag.id for tag in tags]
+            rename = {"items": [{"id": i, "name": f"New {i}"} for i in ids]}
+            counts.append(
+                [
+                    count_queries(TAG_BULK_RENAME_URL, rename),
+                    count_queries(
+                        TAG_MERGE_URL, {"ids": ids[1:], "into": ids[0]}
+                    ),
+                ]
+            )
+            to_delete = [tag.id for tag in self.create_tags(size, recipe)]
+            counts[-1].append(
+                count_queries(TAG_BULK_DELETE_URL, {"ids": to_delete})
+            )
+
+        self.assertEqual(counts[0], counts[1])
+
+
+class RecipeBulkApiTests(TestCase):
+    """Test bulk updating and deleting recipes"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "user@example.com", "pw123"
+        )
+        self.client.force_authenticate(self.user)
+        self.recipes = [
+            create_recipe(self.user, title=f"R{i}") for i in range(3)
+        ]
+        self.tag = Tag.objects.create(user=self.user, name="Vegan")
+
+    def test_selection_required(self):
+        res = self.client.patch(
+            RECIPE_BULK_URL, {"set": {"time_minutes": 5}}, format="json"
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_update_fields_by_ids(self):
+        ids = [self.recipes[0].id, self.recipes[1].id]
+        payload = {"ids": ids, "set": {"time_minutes": 45, "price": "9.99"}}
+
+        res = self.client.patch(RECIPE_BULK_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["matched"], 2)
+        self.assertEqual(res.data["updated"], 2)
+        self.assertEqual(
+            sorted(Recipe.objects.values_list("time_minutes", flat=True)),
+            [10, 45, 45],
+        )
+        summary = RecipeSummary.objects.get(recipe=self.recipes[0])
+        self.assertEqual(summary.price, Decimal("9.99"))
+
+    def test_add_and_remove_tags_by_filter(self):
+        other_tag = Tag.objects.create(user=self.user, name="Quick")
+        self.recipes[0].tags.add(self.tag)
+        self.recipes[1].tags.add(self.tag, other_tag)
+        payload = {
+            "filter": {"tags": [self.tag.id]},
+            "add_tags": [other_tag.id],
+            "remove_tags": [self.tag.id],
+        }
+
+        res = self.client.patch(RECIPE_BULK_URL, payload, format="json")
+
+        self.assertEqual(res.data["matched"], 2)
+        self.assertEqual(res.data["tags_added"], 1)
+        self.assertEqual(res.data["tags_removed"], 2)
+        for recipe in self.recipes[:2]:
+            self.assertEqual(list(recipe.tags.all()), [other_tag])
+            summary = RecipeSummary.objects.get(recipe=recipe)
+            self.assertEqual(summary.tag_ids, [other_tag.id])
+        self.assertEqual(self.recipes[2].tags.count(), 0)
+
+    def test_add_other_users_tag(self):
+        other = get_user_model().objects.create_user(
+            "other@example.com", "pw123"
+        )
+        tag = Tag.objects.create(user=other, name="Theirs")
+        payload = {"ids": [self.recipes[0].id], "add_tags": [tag.id]}
+
+        res = self.client.patch(RECIPE_BULK_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.recipes[0].tags.count(), 0)
+
+    def test_other_users_recipes_untouched(self):
+        other = get_user_model().objects.create_user(
+            "other@example.com", "pw123"
+        )
+        theirs = create_recipe(other)
+        payload = {"ids": [theirs.id], "set": {"title": "Mine now"}}
+
+        res = self.client.patch(RECIPE_BULK_URL, payload, format="json")
+
+        self.assertEqual(res.data["matched"], 0)
+        theirs.refresh_from_db()
+        self.assertEqual(theirs.title, "Sample recipe")
+
+    @override_settings(BULK_RECIPE_LIMIT=2)
+    def test_limit(self):
+        ids = [recipe.id for recipe in self.recipes]
+        payload = {"ids": ids, "set": {"title": "x"}}
+
+        res = self.client.patch(RECIPE_BULK_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Recipe.objects.filter(title="x").exists())
+
+    def test_delete(self):
+        self.recipes[0].tags.add(self.tag)
+        self.recipes[1].tags.add(self.tag)
+
+        res = self.client.delete(
+            RECIPE_BULK_URL, {"filter": {"tags": [self.tag.id]}}, format="json"
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, {"matched": 2, "deleted": 2})
+        self.assertEqual(list(Recipe.objects.all()), [self.recipes[2]])
+        self.assertEqual(RecipeSummary.objects.count(), 1)
+        self.assertEqual(
+            RecipeStats.objects.get(user=self.user).recipe_count, 1
+        )
+
+    def test_constant_query_count(self):
+        def count_queries(method, payload):
+            with CaptureQueriesContext(connection) as queries:
+                res = method(RECIPE_BULK_URL, payload, format="json")
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            return len(queries)
+
+        counts = []
+        for size in (2, 20):
+            recipes = [create_recipe(self.user) for _ in range(size)]
+            ids = [recipe.id for recipe in recipes]
+            update = {
+                "ids": ids,
+                "set": {"time_minutes": 1},
+                "add_tags": [self.tag.id],
+            }
+            counts.append(
+                [
+                    count_queries(self.client.patch, update),
+                    count_queries(self.client.delete, {"ids": ids}),
+                ]
+            )
+
+        self.assertEqual(counts[0], counts[1])
@@ -0,0 +1,110 @@
+"""Tests for copying recipes"""
+
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Recipe, RecipeStats, RecipeSummary, Tag
+
+COPY_URL = reverse("recipe:recipe-copy")
+
+
+def create_recipe(user, **params):
+    defaults = {
+        "title": "Sample recipe",
+        "time_minutes": 10,
+        "price": Decimal("5"),
+    }
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class RecipeCopyApiTests(TestCase):
+    """Test the copy action"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "user@example.com", "pw123"
+        )
+        self.client.force_authenticate(self.user)
+        self.tag = Tag.objects.create(user=self.user, name="Vegan")
+        self.ingredient = Ingredient.objects.create(
+            user=self.user, name="Kale"
+        )
+        self.recipe = create_recipe(
+            self.user,
+            title="Salad",
+            description="Green",
+            image="uploads/a.jpg",
+        )
+        self.recipe.tags.add(self.tag)
+        self.recipe.ingredients.add(self.ingredient)
+
+    def copy(self, **payload):
+        return self.client.post(COPY_URL, payload, format="json")
+
+    def test_copy(self):
+        res = self.copy(ids=[self.recipe.id])
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        copy = Recipe.objects.get(id=res.data[0]["id"])
+        self.assertNotEqual(copy.id, self.recipe.id)
+        self.assertEqual(copy.title, "Salad")
+        self.assertEqual(copy.description, "Green")
+        self.assertEqual(copy.user, self.user)
+        # same file
+        self.assertEqual(copy.image.name, "uploads/a.jpg")
+        self.assertEqual(list(copy.tags.all()), [self.tag])
+        self.assertEqual(list(copy.ingredients.all()), [self.ingredient])
+        self.assertEqual(
+            res.data[0]["tags"], [{"id": self.tag.id, "name": "Vegan"}]
+        )
+        # the copy is listed and counted
+        self.assertTrue(RecipeSummary.objects.filter(recipe=copy).exists())
+        self.assertEqual(
+            RecipeStats.objects.get(user=self.user).recipe_count, 2
+        )
+
+    def test_copy_without_image(self):
+        res = self.copy(ids=[self.recipe.id], share_image=False)
+
+        self.assertFalse(Recipe.objects.get(id=res.data[0]["id"]).image)
+
+    def test_copy_many_in_request_order(self):
+        other = create_recipe(self.user, title="Soup")
+
+        res = self.copy(ids=[other.id, self.recipe.id])
+
+        self.assertEqual([r["title"] for r in res.data], ["Soup", "Salad"])
+        self.assertEqual(Recipe.objects.count(), 4)
+
+    def test_copy_other_users_recipe(self):
+        other = get_user_model().objects.create_user(
+            "other@example.com", "pw123"
+        )
+        recipe = create_recipe(other)
+
+        res = self.copy(ids=[recipe.id])
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Recipe.objects.count(), 2)
+
+    def test_constant_query_count(self):
+        def queries(count):
+            ids = [create_recipe(self.user).id for _ in range(count)]
+            for pk in ids:
+                Recipe.objects.get(id=pk).tags.add(self.tag)
+            with CaptureQueriesContext(connection) as ctx:
+                res = self.copy(ids=ids)
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+            return len(ctx)
+
+        self.assertEqual(queries(1), queries(20))
@@ -1,13 +1,14 @@
 """Test for recipe APIs"""
 
 from decimal import Decimal
+import json
 import tempfile
 import os
 
 from PIL import Image
 
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.urls import reverse
 
 from rest_framework import status
@@ -117,6 +118,32 @@ class PrivateRecipeAPITests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(res.data, serializer.data)
 
+    @override_settings(STREAMING_LIST_THRESHOLD=1, STREAMING_CHUNK_SIZE=2)
+    def test_retrieve_recipes_streamed(self):
+        """Test a list bigger than the threshold is streamed in chunks"""
+        tag = Tag.objects.create(user=self.user, name="Vegan")
+        for _ in range(5):
+            create_recipe(user=self.user).tags.add(tag)
+
+        res = self.client.get(RECIPES_URL)
+
+        recipes = Recipe.objects.all().order_by("-id")
+        serializer = RecipeSerializer(recipes, many=True)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.streaming)
+        content = b"".join(res.streaming_content)
+        self.assertEqual(
+            json.loads(content), json.loads(json.dumps(serializer.data))
+        )
+
+    @override_settings(STREAMING_LIST_THRESHOLD=1)
+    def test_retrieve_recipes_empty_not_streamed(self):
+        """Test small results are returned the usual way"""
+        res = self.client.get(RECIPES_URL)
+
+        self.assertFalse(res.streaming)
+        self.assertEqual(res.data, [])
+
     def test_recipe_list_limited_to_user(self):
         """Test if list of recipes is limited to authenticated user"""
         other_user = create_user(
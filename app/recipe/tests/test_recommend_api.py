@@ -0,0 +1,216 @@
+"""Tests for the recipe recommendations and similar recipes"""
+
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, IngredientIndex, Recipe, RecipeSummary, Tag
+from recipe import summaries
+
+RECOMMEND_URL = reverse("recipe:recipe-recommend")
+
+
+class RecommendApiTests(TestCase):
+    """Test ranking recipes by the ingredients we have"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "user@example.com", "pw123"
+        )
+        self.client.force_authenticate(self.user)
+        self.ingredients = {
+            name: Ingredient.objects.create(user=self.user, name=name)
+            for name in ("egg", "flour", "milk", "salt", "kale")
+        }
+
+    def create_recipe(self, title, *names):
+        with summaries.batch():
+            recipe = Recipe.objects.create(
+                user=self.user, title=title, time_minutes=5, price=Decimal("1")
+            )
+            recipe.ingredients.set([self.ingredients[name] for name in names])
+        return recipe
+
+    def recommend(self, *names, **params):
+        ids = ".".join(str(self.ingredients[name].id) for name in names)
+        return self.client.get(RECOMMEND_URL, {"ingredients": ids, **params})
+
+    def test_ranked_by_coverage(self):
+        self.create_recipe("Pancakes", "egg", "flour", "milk")
+        self.create_recipe("Omelette", "egg", "salt")
+        self.create_recipe("Crepes", "egg", "flour", "milk", "salt")
+        self.create_recipe("Kale chips", "kale", "salt")
+
+        res = self.recommend("egg", "flour", "milk")
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(r["title"], r["matched"], r["missing"]) for r in res.data],
+            [("Pancakes", 3, 0), ("Crepes", 3, 1), ("Omelette", 1, 1)],
+        )
+        self.assertEqual(res.data[1]["coverage"], 0.75)
+        self.assertEqual(res.data[0]["ingredients"][0]["name"], "egg")
+
+    def test_max_missing_and_limit(self):
+        self.create_recipe("Pancakes", "egg", "flour", "milk")
+        self.create_recipe("Omelette", "egg", "salt")
+        self.create_recipe("Boiled egg", "egg")
+
+        res = self.recommend("egg", max_missing=1, limit=1)
+
+        self.assertEqual([r["title"] for r in res.data], ["Boiled egg"])
+
+    def test_other_users_recipes_left_out(self):
+        other = get_user_model().objects.create_user(
+            "other@example.com", "pw123"
+        )
+        recipe = Recipe.objects.create(
+            user=other, title="Theirs", time_minutes=5, price=Decimal("1")
+        )
+        recipe.ingredients.add(self.ingredients["egg"])
+
+        res = self.recommend("egg")
+
+        self.assertEqual(res.data, [])
+
+    def test_index_follows_changes(self):
+        pancakes = self.create_recipe("Pancakes", "egg", "flour", "milk")
+        omelette = self.create_recipe("Omelette", "egg", "salt")
+
+        pancakes.ingredients.remove(self.ingredients["milk"])
+        omelette.delete()
+        self.ingredients["flour"].delete()
+
+        res = self.recommend("egg", "salt")
+        self.assertEqual(
+            [(r["title"], r["matched"], r["missing"]) for r in res.data],
+            [("Pancakes", 1, 0)],
+        )
+        # bitmaps nobody uses anymore are dropped
+        self.assertEqual(
+            set(IngredientIndex.objects.values_list("key", flat=True)),
+            {
+                f"ingredient:{self.ingredients['egg'].id}",
+                "size:1",
+                "features:1",
+                "slots",
+            },
+        )
+
+    def test_slots_kept_and_reused(self):
+        first = self.create_recipe("First", "egg")
+        second = self.create_recipe("Second", "egg")
+        first.title = "Renamed"
+        first.save()
+
+        self.assertEqual(RecipeSummary.objects.get(recipe=first).slot, 0)
+        second.delete()
+        third = self.create_recipe("Third", "egg")
+        self.assertEqual(RecipeSummary.objects.get(recipe=third).slot, 1)
+        self.assertEqual(
+            [r["title"] for r in self.recommend("egg").data][0], "Third"
+        )
+
+    def test_free_slots_reused(self):
+        """Deleting and creating recipes again and again doesn't grow slots"""
+        recipes = [self.create_recipe(f"Recipe {i}", "egg") for i in range(5)]
+        for i in range(20):
+            # from the middle, not the top
+            recipes.pop(2).delete()
+            recipes.append(
+                self.create_recipe(f"Recipe {i + 5}", "egg", "salt")
+            )
+
+        slots = set(RecipeSummary.objects.values_list("slot", flat=True))
+        self.assertEqual(slots, set(range(5)))
+        res = self.recommend("egg", "salt")
+        self.assertEqual(len(res.data), 5)
+        self.assertEqual(
+            {r["title"] for r in res.data if r["matched"] == 2},
+            {"Recipe 22", "Recipe 23", "Recipe 24"},
+        )
+
+    def test_bad_ids(self):
+        res = self.client.get(RECOMMEND_URL, {"ingredients": "egg"})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class SimilarApiTests(TestCase):
+    """Test finding similar recipes"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "user@example.com", "pw123"
+        )
+        self.client.force_authenticate(self.user)
+
+    def create_recipe(self, title, tags=(), ingredients=()):
+        with summaries.batch():
+            recipe = Recipe.objects.create(
+                user=self.user, title=title, time_minutes=5, price=Decimal("1")
+            )
+            recipe.tags.set(
+                [
+                    Tag.objects.get_or_create(user=self.user, name=n)[0]
+                    for n in tags
+                ]
+            )
+            recipe.ingredients.set(
+                [
+                    Ingredient.objects.get_or_create(user=self.user, name=n)[0]
+                    for n in ingredients
+                ]
+            )
+        return recipe
+
+    def similar(self, recipe, **params):
+        url = reverse("recipe:recipe-similar", args=[recipe.id])
+        return self.client.get(url, params)
+
+    def test_ranked_by_jaccard(self):
+        curry = self.create_recipe(
+            "Curry", ["Vegan"], ["rice", "lentils", "onion"]
+        )
+        self.create_recipe("Dal", ["Vegan"], ["lentils", "onion"])
+        self.create_recipe("Pilaf", [], ["rice", "onion", "peas", "carrot"])
+        self.create_recipe("Cake", ["Sweet"], ["flour"])
+
+        res = self.similar(curry)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(r["title"], r["shared"]) for r in res.data],
+            [("Dal", 3), ("Pilaf", 2)],
+        )
+        self.assertEqual(res.data[0]["similarity"], 0.75)
+        self.assertAlmostEqual(res.data[1]["similarity"], 2 / 6)
+
+    def test_limit(self):
+        soup = self.create_recipe("Soup", ingredients=["leek"])
+        for i in range(3):
+            self.create_recipe(f"Soup {i}", ingredients=["leek"])
+
+        res = self.similar(soup, limit=2)
+
+        # all equally similar - the newest first
+        self.assertEqual([r["title"] for r in res.data], ["Soup 2", "Soup 1"])
+
+    def test_other_users_recipe(self):
+        other = get_user_model().objects.create_user(
+            "other@example.com", "pw123"
+        )
+        recipe = Recipe.objects.create(
+            user=other, title="Theirs", time_minutes=5, price=Decimal("1")
+        )
+
+        res = self.similar(recipe)
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,154 @@
+"""Tests for the recipe stats API"""
+
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, RecipeStats, Tag, Ingredient
+from recipe.stats import price_bucket
+
+STATS_URL = reverse("recipe:recipe-stats")
+RECIPES_URL = reverse("recipe:recipe-list")
+
+
+def create_recipe(user, **params):
+    defaults = {
+        "title": "Sample recipe title",
+        "time_minutes": 20,
+        "price": Decimal("4.00"),
+    }
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class PriceBucketTests(TestCase):
+    def test_price_bucket(self):
+        self.assertEqual(price_bucket(Decimal("0.50")), "0-5")
+        self.assertEqual(price_bucket(Decimal("5.00")), "5-10")
+        self.assertEqual(price_bucket(Decimal("49.99")), "20-50")
+        self.assertEqual(price_bucket(Decimal("120")), "50+")
+
+
+class RecipeStatsApiTests(TestCase):
+    """Test the stats endpoint"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "user@example.com", "pw123"
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_auth_required(self):
+        res = APIClient().get(STATS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_no_recipes(self):
+        res = self.client.get(STATS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["recipe_count"], 0)
+        self.assertIsNone(res.data["average_price"])
+        self.assertEqual(sum(res.data["price_distribution"].values()), 0)
+        self.assertEqual(res.data["top_tags"], [])
+
+    def test_stats(self):
+        vegan = Tag.objects.create(user=self.user, name="Vegan")
+        quick = Tag.objects.create(user=self.user, name="Quick")
+        salt = Ingredient.objects.create(user=self.user, name="Salt")
+        r1 = create_recipe(self.user, time_minutes=10, price=Decimal("3.00"))
+        r2 = create_recipe(self.user, time_minutes=30, price=Decimal("12.00"))
+        r1.tags.add(vegan, quick)
+        r2.tags.add(vegan)
+        r2.ingredients.add(salt)
+        other = get_user_model().objects.create_user(
+            "other@example.com", "pw123"
+        )
+        create_recipe(other, time_minutes=100)
+
+        res = self.client.get(STATS_URL)
+
+        self.assertEqual(res.data["recipe_count"], 2)
+        self.assertEqual(res.data["average_time_minutes"], 20)
+        self.assertEqual(res.data["average_price"], "7.50")
+        self.assertEqual(res.data["price_distribution"]["0-5"], 1)
+        self.assertEqual(res.data["price_distribution"]["10-20"], 1)
+        self.assertEqual(res.data["price_distribution"]["50+"], 0)
+        self.assertEqual(
+            res.data["top_tags"],
+            [
+                {"id": vegan.id, "name": "Vegan", "recipe_count": 2},
+                {"id": quick.id, "name": "Quick", "recipe_count": 1},
+            ],
+        )
+        self.assertEqual(res.data["top_ingredients"][0]["name"], "Salt")
+
+    def test_top_limit(self):
+        recipe = create_recipe(self.user)
+        for i in range(3):
+            recipe.tags.add(
+                Tag.objects.create(user=self.user, name=f"Tag {i}")
+            )
+
+        res = self.client.get(STATS_URL, {"top": 2})
+
+        self.assertEqual(len(res.data["top_tags"]), 2)
+
+    def test_stats_follow_writes(self):
+        """Test updates and deletes through the API show in the stats"""
+        payload = {
+            "title": "Curry",
+            "time_minutes": 30,
+            "price": "5.50",
+            "tags": [{"name": "Indian"}],
+        }
+        res = self.client.post(RECIPES_URL, payload, format="json")
+        recipe_id = res.data["id"]
+        detail_url = reverse("recipe:recipe-detail", args=[recipe_id])
+        self.client.patch(
+            detail_url,
+            {"price": "60.00", "tags": [{"name": "Spicy"}]},
+            format="json",
+        )
+
+        res = self.client.get(STATS_URL)
+        self.assertEqual(res.data["average_price"], "60.00")
+        self.assertEqual(res.data["price_distribution"]["50+"], 1)
+        self.assertEqual([t["name"] for t in res.data["top_tags"]], ["Spicy"])
+
+        self.client.delete(detail_url)
+
+        stats = RecipeStats.objects.get(user=self.user)
+        self.assertEqual(stats.recipe_count, 0)
+        self.assertEqual(stats.total_time_minutes, 0)
+        self.assertEqual(stats.tag_counts, {})
+        self.assertEqual(stats.price_buckets, {})
+
+    def test_tag_deleted(self):
+        recipe = create_recipe(self.user)
+        tag = Tag.objects.create(user=self.user, name="Vegan")
+        recipe.tags.add(tag)
+
+        tag.delete()
+
+        self.assertEqual(
+            RecipeStats.objects.get(user=self.user).tag_counts, {}
+        )
+
+    def test_constant_queries(self):
+        """Test reading the stats doesn't depend on the number of recipes"""
+        for i in range(10):
+            recipe = create_recipe(self.user)
+            recipe.tags.add(
+                Tag.objects.create(user=self.user, name=f"Tag {i}")
+            )
+
+        # stats row and tag names (no ingredients, so no query for their names)
+        with self.assertNumQueries(2):
+            self.client.get(STATS_URL)
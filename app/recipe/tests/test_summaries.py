@@ -0,0 +1,272 @@
+"""Tests for the denormalized recipe summaries"""
+
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command, CommandError
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import (
+    IngredientIndex,
+    Recipe,
+    RecipeStats,
+    RecipeSummary,
+    Tag,
+    Ingredient,
+)
+from recipe import recommendations, summaries
+
+RECIPES_URL = reverse("recipe:recipe-list")
+
+
+def create_recipe(user, **params):
+    defaults = {
+        "title": "Sample recipe title",
+        "time_minutes": 22,
+        "price": Decimal("5.25"),
+    }
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class RecipeSummaryTests(TestCase):
+    """Test the summaries follow changes to recipes, tags and ingredients"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            "user@example.com", "pw123"
+        )
+
+    def test_summary_created_and_updated(self):
+        recipe = create_recipe(self.user)
+        recipe.title = "Soup"
+        recipe.save()
+
+        summary = RecipeSummary.objects.get(recipe=recipe)
+        self.assertEqual(summary.title, "Soup")
+        self.assertEqual(summary.user, self.user)
+        self.assertEqual(summary.price, Decimal("5.25"))
+
+    def test_tags_and_ingredients_added_and_removed(self):
+        recipe = create_recipe(self.user)
+        tag1 = Tag.objects.create(user=self.user, name="Vegan")
+        tag2 = Tag.objects.create(user=self.user, name="Quick")
+        ingredient = Ingredient.objects.create(user=self.user, name="Salt")
+
+        recipe.tags.add(tag1, tag2)
+        recipe.ingredients.add(ingredient)
+        recipe.tags.remove(tag1)
+
+        summary = RecipeSummary.objects.get(recipe=recipe)
+        self.assertEqual(summary.tags, [{"id": tag2.id, "name": "Quick"}])
+        self.assertEqual(summary.tag_ids, [tag2.id])
+        self.assertEqual(summary.ingredient_ids, [ingredient.id])
+
+    def test_reverse_add_and_clear(self):
+        """Test changes made from the tag's side of the relation"""
+        recipe1 = create_recipe(self.user)
+        recipe2 = create_recipe(self.user)
+        tag = Tag.objects.create(user=self.user, name="Vegan")
+
+        tag.recipe_set.add(recipe1, recipe2)
+        self.assertEqual(
+            RecipeSummary.objects.get(recipe=recipe2).tag_ids, [tag.id]
+        )
+
+        tag.recipe_set.clear()
+        self.assertFalse(
+            RecipeSummary.objects.filter(tag_ids__len__gt=0).exists()
+        )
+
+    def test_rename_and_delete_tag(self):
+        recipe = create_recipe(self.user)
+        tag = Tag.objects.create(user=self.user, name="Vegan")
+        recipe.tags.add(tag)
+
+        tag.name = "Plant based"
+        tag.save()
+        summary = RecipeSummary.objects.get(recipe=recipe)
+        self.assertEqual(summary.tags, [{"id": tag.id, "name": "Plant based"}])
+
+        tag.delete()
+        summary = RecipeSummary.objects.get(recipe=recipe)
+        self.assertEqual(summary.tags, [])
+        self.assertEqual(summary.tag_ids, [])
+
+    def test_recipe_deleted(self):
+        recipe = create_recipe(self.user)
+
+        recipe.delete()
+
+        self.assertFalse(RecipeSummary.objects.exists())
+
+    def test_batch_refreshes_once(self):
+        """Test a batch rebuilds the summary once, at the end"""
+        tags = [
+            Tag.objects.create(user=self.user, name=f"Tag {i}")
+            for i in range(5)
+        ]
+
+        with CaptureQueriesContext(connection) as queries:
+            with summaries.batch():
+                recipe = create_recipe(self.user)
+                for tag in tags:
+                    recipe.tags.add(tag)
+                self.assertFalse(
+                    RecipeSummary.objects.filter(recipe=recipe).exists()
+                )
+
+        summary_inserts = [
+            q
+            for q in queries
+            if q["sql"].startswith('INSERT INTO "core_recipesummary"')
+        ]
+        self.assertEqual(len(summary_inserts), 1)
+        self.assertEqual(
+            len(RecipeSummary.objects.get(recipe=recipe).tag_ids), 5
+        )
+
+
+class RecipeSummaryApiTests(TestCase):
+    """Test the list endpoint reads the summaries"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "user@example.com", "pw123"
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_create_via_api(self):
+        payload = {
+            "title": "Curry",
+            "time_minutes": 30,
+            "price": "5.50",
+            "tags": [{"name": "Indian"}, {"name": "Dinner"}],
+            "ingredients": [{"name": "Rice"}],
+        }
+        res = self.client.post(RECIPES_URL, payload, format="json")
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(len(res.data), 1)
+        self.assertEqual(res.data[0]["price"], "5.50")
+        self.assertEqual(
+            sorted(tag["name"] for tag in res.data[0]["tags"]),
+            ["Dinner", "Indian"],
+        )
+        self.assertEqual(res.data[0]["ingredients"][0]["name"], "Rice")
+
+    def test_filter_by_tags_and_ingredients(self):
+        r1 = create_recipe(self.user, title="Curry")
+        r2 = create_recipe(self.user, title="Soup")
+        create_recipe(self.user, title="Fish")
+        tag = Tag.objects.create(user=self.user, name="Vegan")
+        ingredient = Ingredient.objects.create(user=self.user, name="Salt")
+        r1.tags.add(tag)
+        r2.ingredients.add(ingredient)
+
+        res_tags = self.client.get(RECIPES_URL, {"tags": str(tag.id)})
+        res_ingredients = self.client.get(
+            RECIPES_URL, {"ingredients": str(ingredient.id)}
+        )
+
+        self.assertEqual([r["title"] for r in res_tags.data], ["Curry"])
+        self.assertEqual([r["title"] for r in res_ingredients.data], ["Soup"])
+
+    def test_list_is_single_query(self):
+        for i in range(3):
+            recipe = create_recipe(self.user)
+            recipe.tags.add(
+                Tag.objects.create(user=self.user, name=f"Tag {i}")
+            )
+
+        with self.assertNumQueries(1):
+            res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(len(res.data), 3)
+
+
+class CheckRecipeSummariesTests(TestCase):
+    """Test the consistency check command"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            "user@example.com", "pw123"
+        )
+        self.recipe = create_recipe(self.user)
+
+    def test_consistent(self):
+        out = StringIO()
+        call_command("check_recipe_summaries", stdout=out)
+
+        self.assertIn("0 missing, 0 stale", out.getvalue())
+
+    def test_stale_and_missing(self):
+        other = create_recipe(self.user)
+        RecipeSummary.objects.filter(recipe=self.recipe).update(title="Wrong")
+        RecipeSummary.objects.filter(recipe=other).delete()
+
+        with self.assertRaises(CommandError):
+            call_command("check_recipe_summaries", stdout=StringIO())
+
+        out = StringIO()
+        call_command("check_recipe_summaries", fix=True, stdout=out)
+        self.assertIn("1 missing, 1 stale", out.getvalue())
+        self.assertEqual(
+            RecipeSummary.objects.get(recipe=self.recipe).title,
+            self.recipe.title,
+        )
+        self.assertTrue(RecipeSummary.objects.filter(recipe=other).exists())
+
+    def test_wrong_stats_fixed(self):
+        RecipeStats.objects.filter(user=self.user).update(recipe_count=10)
+
+        with self.assertRaises(CommandError):
+            call_command("check_recipe_summaries", stdout=StringIO())
+
+        call_command("check_recipe_summaries", fix=True, stdout=StringIO())
+        self.assertEqual(
+            RecipeStats.objects.get(user=self.user).recipe_count, 1
+        )
+
+    def test_wrong_ingredient_index_fixed(self):
+        ingredient = Ingredient.objects.create(user=self.user, name="Salt")
+        self.recipe.ingredients.add(ingredient)
+        IngredientIndex.objects.filter(user=self.user).delete()
+
+        with self.assertRaises(CommandError):
+            call_command("check_recipe_summaries", stdout=StringIO())
+
+        call_command("check_recipe_summaries", fix=True, stdout=StringIO())
+        self.assertEqual(
+            set(IngredientIndex.objects.values_list("key", flat=True)),
+            {f"ingredient:{ingredient.id}", "size:1", "features:1", "slots"},
+        )
+
+    def test_sparse_slots_renumbered(self):
+        other = create_recipe(self.user)
+        old = RecipeSummary.objects.get(recipe=other)
+        moved = RecipeSummary.objects.get(recipe=other)
+        moved.slot = 5000
+        moved.save()
+        recommendations.apply_changes([old], [moved])
+
+        # nothing wrong, so the check passes, --fix packs them again
+        call_command("check_recipe_summaries", stdout=StringIO())
+        out = StringIO()
+        call_command("check_recipe_summaries", fix=True, stdout=out)
+
+        self.assertIn("slots renumbered", out.getvalue())
+        self.assertEqual(
+            sorted(RecipeSummary.objects.values_list("slot", flat=True)),
+            [0, 1],
+        )
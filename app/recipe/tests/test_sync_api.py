@@ -0,0 +1,189 @@
+"""Tests for the change log and the sync endpoint"""
+
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import ChangeCounter, Recipe, Tag
+
+SYNC_URL = reverse("recipe:sync")
+RECIPES_URL = reverse("recipe:recipe-list")
+RECIPE_BULK_URL = reverse("recipe:recipe-bulk")
+
+
+def detail_url(recipe_id):
+    return reverse("recipe:recipe-detail", args=[recipe_id])
+
+
+class SyncApiTests(TestCase):
+    """Test syncing changes since a cursor"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "user@example.com", "pw123"
+        )
+        self.client.force_authenticate(self.user)
+
+    def create_recipe(self, **params):
+        payload = {
+            "title": "Curry",
+            "time_minutes": 30,
+            "price": "5.00",
+            "tags": [{"name": "Indian"}, {"name": "Dinner"}],
+            "ingredients": [{"name": "Rice"}],
+        }
+        payload.update(params)
+        res = self.client.post(RECIPES_URL, payload, format="json")
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        return Recipe.objects.get(id=res.data["id"])
+
+    def sync(self, cursor=0, **params):
+        res = self.client.get(SYNC_URL, {"cursor": cursor, **params})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res.data
+
+    def test_full_sync(self):
+        recipe = self.create_recipe()
+        indian = Tag.objects.get(name="Indian")
+
+        data = self.sync()
+
+        self.assertFalse(data["has_more"])
+        self.assertEqual([r["id"] for r in data["recipes"]], [recipe.id])
+        self.assertEqual(
+            {t["name"] for t in data["tags"]}, {"Indian", "Dinner"}
+        )
+        self.assertEqual([i["name"] for i in data["ingredients"]], ["Rice"])
+        self.assertIn([recipe.id, indian.id], data["recipe_tags"])
+        self.assertEqual(len(data["recipe_ingredients"]), 1)
+        # recipe, 2 tags, 1 ingredient and 3 links - one write, one bump
+        self.assertEqual(data["cursor"], 7)
+        self.assertEqual(ChangeCounter.objects.get(user=self.user).seq, 7)
+
+    def test_incremental_sync(self):
+        recipe = self.create_recipe()
+        cursor = self.sync()["cursor"]
+
+        self.client.patch(
+            detail_url(recipe.id),
+            {"title": "Green curry", "tags": [{"name": "Thai"}]},
+            format="json",
+        )
+        Tag.objects.get(name="Dinner").delete()
+        data = self.sync(cursor)
+
+        self.assertEqual(
+            [r["title"] for r in data["recipes"]], ["Green curry"]
+        )
+        self.assertEqual([t["name"] for t in data["tags"]], ["Thai"])
+        thai = Tag.objects.get(name="Thai")
+        indian = Tag.objects.get(name="Indian")
+        self.assertEqual(data["recipe_tags"], [[recipe.id, thai.id]])
+        self.assertIn([recipe.id, indian.id], data["deleted"]["recipe_tags"])
+        self.assertEqual(len(data["deleted"]["tags"]), 1)
+        self.assertEqual(data["ingredients"], [])
+        # nothing since then
+        self.assertEqual(self.sync(data["cursor"])["recipes"], [])
+
+    def test_deleted_recipe(self):
+        recipe = self.create_recipe()
+        cursor = self.sync()["cursor"]
+
+        self.client.delete(detail_url(recipe.id))
+        data = self.sync(cursor)
+
+        self.assertEqual(data["deleted"]["recipes"], [recipe.id])
+        self.assertEqual(data["recipes"], [])
+
+    def test_links_of_deleted_left_out(self):
+        recipe = self.create_recipe()
+        self.create_recipe(title="Dal", tags=[{"name": "Indian"}])
+        Tag.objects.get(name="Indian").delete()
+        self.client.delete(detail_url(recipe.id))
+
+        data = self.sync()
+
+        self.assertEqual(data["recipe_tags"], [])
+        self.assertEqual(len(data["recipe_ingredients"]), 1)
+        self.assertEqual(data["deleted"]["recipes"], [recipe.id])
+
+    def test_paging(self):
+        self.create_recipe()
+
+        first = self.sync(limit=5)
+        second = self.sync(first["cursor"], limit=5)
+
+        self.assertTrue(first["has_more"])
+        self.assertFalse(second["has_more"])
+        self.assertEqual(second["cursor"], 7)
+
+    def test_bulk_update_logged(self):
+        recipe = self.create_recipe()
+        tag = Tag.objects.create(user=self.user, name="Quick")
+        cursor = self.sync()["cursor"]
+
+        self.client.patch(
+            RECIPE_BULK_URL,
+            {
+                "ids": [recipe.id],
+                "set": {"time_minutes": 5},
+                "add_tags": [tag.id],
+            },
+            format="json",
+        )
+        data = self.sync(cursor)
+
+        self.assertEqual([r["time_minutes"] for r in data["recipes"]], [5])
+        self.assertEqual(data["recipe_tags"], [[recipe.id, tag.id]])
+
+    def test_other_users_changes_hidden(self):
+        other = get_user_model().objects.create_user(
+            "other@example.com", "pw123"
+        )
+        Recipe.objects.create(
+            user=other, title="Other", time_minutes=1, price=Decimal("1")
+        )
+
+        data = self.sync()
+
+        self.assertEqual(data["recipes"], [])
+        self.assertEqual(data["cursor"], 0)
+
+    def test_bad_cursor(self):
+        res = self.client.get(SYNC_URL, {"cursor": "abc"})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_delete_user(self):
+        self.create_recipe()
+
+        # the cascade doesn't try to log tombstones for the deleted user
+        self.user.delete()
+
+        self.assertFalse(ChangeCounter.objects.exists())
+
+    def test_failed_user_delete(self):
+        """Test the user's changes are logged again after a failed delete"""
+        recipe = self.create_recipe()
+        cursor = self.sync()["cursor"]
+
+        def fail(**kwargs):
+            raise ValueError("boom")
+
+        post_delete.connect(fail, sender=Recipe)
+        self.addCleanup(post_delete.disconnect, fail, sender=Recipe)
+        with self.assertRaises(ValueError), transaction.atomic():
+            self.user.delete()
+        post_delete.disconnect(fail, sender=Recipe)
+        self.client.patch(detail_url(recipe.id), {"title": "Soup"})
+
+        data = self.sync(cursor)
+        self.assertEqual([r["title"] for r in data["recipes"]], ["Soup"])
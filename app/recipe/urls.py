@@ -18,4 +18,7 @@ router.register("ingredients", views.IngredientViewSet)
 
 app_name = "recipe"
 
-urlpatterns = [path("", include(router.urls))]
+urlpatterns = [
+    path("sync/", views.SyncView.as_view(), name="sync"),
+    path("", include(router.urls)),
+]
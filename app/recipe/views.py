@@ -1,5 +1,10 @@
 """ Views for the recpi APIs """
 
+from itertools import chain, islice
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+
 from drf_spectacular.utils import (
     extend_schema_view,
     extend_schema,
@@ -7,18 +12,42 @@ from drf_spectacular.utils import (
     OpenApiTypes,
 )
 
-from rest_framework import viewsets, mixins, status
+from rest_framework import generics, viewsets, mixins, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import JSONRenderer
+
+from core import metrics
+from core.authentication import ExpiringTokenAuthentication
+from core.models import Recipe, RecipeSummary, Tag, Ingredient
+from core.db_routers import ReplicaReadMixin
+from core.idempotency import idempotent
+from core.mixins import AsyncReadMixin
+from core.renderers import iter_in_context, iter_json_array
+from recipe import (
+    changelog,
+    copies,
+    links,
+    recommendations,
+    serializers,
+    stats,
+    summaries,
+    tasks,
+)
 
-from core.models import Recipe, Tag, Ingredient
-from recipe import serializers
+IDEMPOTENCY_KEY_PARAMETER = OpenApiParameter(
+    "Idempotency-Key",
+    OpenApiTypes.STR,
+    OpenApiParameter.HEADER,
+    description="Retries with the same key get the first response back",
+)
 
 
 @extend_schema_view(
     list=extend_schema(
+        responses=serializers.RecipeSerializer(many=True),
         parameters=[
             OpenApiParameter(
                 "tags",
@@ -30,10 +59,60 @@ from recipe import serializers
                 OpenApiTypes.STR,
                 description="Comma-separated list of ingredient IDs to filter",
             ),
+        ],
+    ),
+    create=extend_schema(parameters=[IDEMPOTENCY_KEY_PARAMETER]),
+    upload_image=extend_schema(parameters=[IDEMPOTENCY_KEY_PARAMETER]),
+    recommend=extend_schema(
+        parameters=[
+            OpenApiParameter(
+                "ingredients",
+                OpenApiTypes.STR,
+                required=True,
+                description=(
+                    "Ingredient IDs you have, separated by dots (1.2.3)"
+                ),
+            ),
+            OpenApiParameter(
+                "limit",
+                OpenApiTypes.INT,
+                description=(
+                    "Number of recipes to return (default 20, max 100)"
+                ),
+            ),
+            OpenApiParameter(
+                "max_missing",
+                OpenApiTypes.INT,
+                description=(
+                    "Leave out recipes missing more ingredients than this"
+                ),
+            ),
         ]
-    )
+    ),
+    similar=extend_schema(
+        parameters=[
+            OpenApiParameter(
+                "limit",
+                OpenApiTypes.INT,
+                description=(
+                    "Number of recipes to return (default 10, max 100)"
+                ),
+            ),
+        ]
+    ),
+    stats=extend_schema(
+        parameters=[
+            OpenApiParameter(
+                "top",
+                OpenApiTypes.INT,
+                description=(
+                    "Number of top tags/ingredients to return (max 50)"
+                ),
+            )
+        ]
+    ),
 )
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(AsyncReadMixin, ReplicaReadMixin, viewsets.ModelViewSet):
     """View for managing recipe APIs"""
 
     # we're going to be mostly using recipe detail endpoint - delete, update etc
@@ -41,8 +120,10 @@ class RecipeViewSet(viewsets.ModelViewSet):
     # here we're specifying with which model the Viewset is going to work
     queryset = Recipe.objects.all()
     # in order to use(make requests to) any of these viewsets, users need to use those two
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [ExpiringTokenAuthentication]
     permission_classes = [IsAuthenticated]
+    # see core.throttling - other writes are throttled under "write"
+    throttle_scopes = {"list": "list", "upload_image": "image_upload"}
 
     def _params_to_ints(self, qs):
         """Convert a list of strings to integers"""
@@ -53,6 +134,19 @@ class RecipeViewSet(viewsets.ModelViewSet):
         """Retrieve recipes for authenticated user"""
         tags = self.request.query_params.get("tags")
         ingredients = self.request.query_params.get("ingredients")
+        # the list comes from the denormalized summaries - no joins
+        if self.action == "list":
+            queryset = RecipeSummary.objects.filter(user=self.request.user)
+            if tags:
+                queryset = queryset.filter(
+                    tag_ids__overlap=self._params_to_ints(tags)
+                )
+            if ingredients:
+                queryset = queryset.filter(
+                    ingredient_ids__overlap=self._params_to_ints(ingredients)
+                )
+            return queryset.order_by("-recipe_id")
+
         queryset = self.queryset
         # if there are any tags/ingredients
         if tags:
@@ -68,32 +162,262 @@ class RecipeViewSet(viewsets.ModelViewSet):
         """Return the serializer class for request"""
         # if we're calling the list endpoint (root of the API), it's going to come up as a general endpoint with all the recipes
         if self.action == "list":
-            return serializers.RecipeSerializer
+            return serializers.RecipeSummarySerializer
         elif self.action == "upload_image":
             return serializers.RecipeImageSerializer
+        elif self.action == "stats":
+            return serializers.RecipeStatsSerializer
+        elif self.action == "bulk":
+            return serializers.BulkRecipeUpdateSerializer
+        elif self.action == "bulk_delete":
+            return serializers.BulkRecipeSerializer
+        elif self.action == "copy":
+            return serializers.CopyRecipesSerializer
+        elif self.action == "recommend":
+            return serializers.RecipeRecommendationSerializer
+        elif self.action == "similar":
+            return serializers.SimilarRecipeSerializer
 
         # otherwise it returns a detail endpoint
         return self.serializer_class
 
+    def list(self, request, *args, **kwargs):
+        """List recipes, streaming the response when there are a lot of them"""
+        renderer = request.accepted_renderer
+        # the browsable API and pretty printed JSON go the usual way. So does
+        # ASGI, since django 3.2 iterates streaming content inside the event
+        # loop where the ORM isn't allowed
+        if (
+            settings.ASYNC_READ_VIEWS
+            or not isinstance(renderer, JSONRenderer)
+            or renderer.get_indent(request.accepted_media_type, {}) is not None
+        ):
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        rows = queryset.iterator(chunk_size=settings.STREAMING_CHUNK_SIZE)
+        head = list(islice(rows, settings.STREAMING_LIST_THRESHOLD + 1))
+        serializer = self.get_serializer(head, many=True)
+        if len(head) <= settings.STREAMING_LIST_THRESHOLD:
+            return Response(serializer.data)
+
+        # the first rows are serialized before the response goes out, so if
+        # that fails it's still a 500. Later failures can only cut it short
+        chunks = chain([serializer.data], self._serialize_chunks(rows))
+        return StreamingHttpResponse(
+            iter_json_array(renderer, iter_in_context(chunks)),
+            content_type=renderer.media_type,
+        )
+
+    def _serialize_chunks(self, rows):
+        """Serialize the rest of `rows` in chunks"""
+        while True:
+            chunk = list(islice(rows, settings.STREAMING_CHUNK_SIZE))
+            if not chunk:
+                return
+            yield self.get_serializer(chunk, many=True).data
+
+    @idempotent
+    def create(self, request, *args, **kwargs):
+        # retries with the same Idempotency-Key don't create it again
+        return super().create(request, *args, **kwargs)
+
     def perform_create(self, serializer):
         """Create a new recipe"""
-        serializer.save(user=self.request.user)
+        with summaries.batch():
+            serializer.save(user=self.request.user)
+
+    def perform_update(self, serializer):
+        """Update a recipe, rebuilding its summary once"""
+        with summaries.batch():
+            serializer.save()
 
     # creating a custom action. "detail=True" signifies that we're working with the "detail" endpoint, not the list of all recipes
     @action(methods=["POST"], detail=True, url_path="upload-image")
+    @idempotent
     def upload_image(self, request, pk=None):
         """Upload image to recipe"""
         recipe = self.get_object()
+        old_image = recipe.image.name
         serializer = self.get_serializer(recipe, data=request.data)
 
         if serializer.is_valid():
+            metrics.IMAGE_UPLOAD_BYTES.observe(
+                serializer.validated_data["image"].size
+            )
             # save the image to the db
             serializer.save()
+            if old_image and old_image != recipe.image.name:
+                # a worker deletes the replaced file, not the request
+                tasks.delete_images.delay(names=[old_image])
             return Response(serializer.data, status=status.HTTP_200_OK)
 
         # if we get here, we assume the serializer was not valid - thus showing the error
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    def _bulk_ids(self, data):
+        """Return the ids of the recipes a bulk request picks, up to limit"""
+        queryset = Recipe.objects.filter(user=self.request.user)
+        if data.get("ids"):
+            queryset = queryset.filter(id__in=data["ids"])
+        selection = data.get("filter", {})
+        if selection.get("tags"):
+            queryset = queryset.filter(tags__id__in=selection["tags"])
+        if selection.get("ingredients"):
+            queryset = queryset.filter(
+                ingredients__id__in=selection["ingredients"]
+            )
+
+        limit = settings.BULK_RECIPE_LIMIT
+        ids = list(
+            queryset.order_by("id")
+            .values_list("id", flat=True)
+            .distinct()[: limit + 1]
+        )
+        if len(ids) > limit:
+            raise ValidationError(
+                f"More than {limit} recipes match, pick fewer at a time."
+            )
+        return ids
+
+    def _check_owned(self, model, field, ids):
+        if not ids:
+            return
+        found = set(
+            model.objects.filter(
+                user=self.request.user, id__in=ids
+            ).values_list("id", flat=True)
+        )
+        missing = set(ids) - found
+        if missing:
+            raise ValidationError({field: [f"Not found: {sorted(missing)}"]})
+
+    @action(methods=["PATCH"], detail=False)
+    def bulk(self, request):
+        """Set fields and add/remove tags or ingredients on many recipes"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        self._check_owned(Tag, "add_tags", data.get("add_tags"))
+        self._check_owned(
+            Ingredient, "add_ingredients", data.get("add_ingredients")
+        )
+
+        # a handful of set-based statements whatever the number of recipes,
+        # with one summary refresh at the end
+        with summaries.batch():
+            ids = self._bulk_ids(data)
+            result = {"matched": len(ids), "updated": 0}
+            if data.get("set") and ids:
+                result["updated"] = Recipe.objects.filter(id__in=ids).update(
+                    **data["set"]
+                )
+                changelog.record(request.user.id, "recipe", ids)
+            for field in ("tags", "ingredients"):
+                added = links.link(field, ids, data.get(f"add_{field}"))
+                removed = links.unlink(field, ids, data.get(f"remove_{field}"))
+                changelog.record_links(request.user.id, field, added)
+                changelog.record_links(
+                    request.user.id, field, removed, deleted=True
+                )
+                result[f"{field}_added"] = len(added)
+                result[f"{field}_removed"] = len(removed)
+            # none of the above sends signals
+            summaries.refresh_recipe_summaries(ids)
+        return Response(result)
+
+    @bulk.mapping.delete
+    def bulk_delete(self, request):
+        """Delete many recipes at once"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        with summaries.batch():
+            ids = self._bulk_ids(serializer.validated_data)
+            # all at once, so the per-recipe pre_delete handlers have no work
+            summaries.discard_recipe_summaries(ids)
+            _, rows = Recipe.objects.filter(id__in=ids).delete()
+        return Response(
+            {"matched": len(ids), "deleted": rows.get("core.Recipe", 0)}
+        )
+
+    @action(methods=["POST"], detail=False)
+    @idempotent
+    def copy(self, request):
+        """Copy recipes with their tags and ingredients"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        ids = list(dict.fromkeys(data["ids"]))
+        self._check_owned(Recipe, "ids", ids)
+
+        # the same few statements for 1 or 500 recipes, instead of a
+        # get_or_create per tag/ingredient of each one
+        with summaries.batch():
+            copied = copies.copy_recipes(
+                request.user.id, ids, data["share_image"]
+            )
+            changelog.record(request.user.id, "recipe", copied.values())
+            for field in ("tags", "ingredients"):
+                added = links.copy_links(field, copied)
+                changelog.record_links(request.user.id, field, added)
+            summaries.refresh_recipe_summaries(copied.values())
+
+        new = RecipeSummary.objects.in_bulk([copied[pk] for pk in ids])
+        serializer = serializers.RecipeSummarySerializer(
+            [new[copied[pk]] for pk in ids], many=True
+        )
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @action(methods=["GET"], detail=False)
+    def stats(self, request):
+        """Stats of the user's recipes, read from the running totals"""
+        try:
+            top = min(max(int(request.query_params.get("top", 5)), 0), 50)
+        except ValueError:
+            top = 5
+        serializer = self.get_serializer(
+            stats.user_stats(request.user, top=top)
+        )
+        return Response(serializer.data)
+
+    @action(methods=["GET"], detail=False)
+    def recommend(self, request):
+        """Recipes you can make with what you have, by ingredient coverage"""
+        params = request.query_params
+        try:
+            ingredient_ids = self._params_to_ints(
+                params.get("ingredients", "")
+            )
+        except ValueError:
+            raise ValidationError({"ingredients": "Expected ids like 1.2.3"})
+        try:
+            limit = min(max(int(params.get("limit", 20)), 1), 100)
+        except ValueError:
+            limit = 20
+        try:
+            max_missing = int(params["max_missing"])
+        except (KeyError, ValueError):
+            max_missing = None
+        ranked = recommendations.rank_by_ingredients(
+            request.user, ingredient_ids, limit, max_missing
+        )
+        return Response(self.get_serializer(ranked, many=True).data)
+
+    @action(methods=["GET"], detail=True)
+    def similar(self, request, pk=None):
+        """The recipes sharing the most tags and ingredients with this one"""
+        summary = generics.get_object_or_404(
+            RecipeSummary, user=request.user, recipe_id=pk
+        )
+        try:
+            limit = min(
+                max(int(request.query_params.get("limit", 10)), 1), 100
+            )
+        except ValueError:
+            limit = 10
+        similar = recommendations.similar_recipes(summary, limit)
+        return Response(self.get_serializer(similar, many=True).data)
+
 
 # we're not gonna directly use this viewset, we're gonna inherit from it in our "actual" viewsets - tags and ingredients
 @extend_schema_view(
@@ -106,9 +430,14 @@ class RecipeViewSet(viewsets.ModelViewSet):
                 description="Filter by items assigned to recipes",
             )
         ]
-    )
+    ),
+    bulk_delete=extend_schema(responses={204: None}),
+    bulk_rename=extend_schema(responses=serializers.TagSerializer(many=True)),
+    merge=extend_schema(responses=serializers.TagSerializer),
 )
 class BaseRecipeAttrViewSet(
+    AsyncReadMixin,
+    ReplicaReadMixin,
     mixins.DestroyModelMixin,
     mixins.UpdateModelMixin,
     # this mixin allows us "listing functionality"
@@ -118,9 +447,10 @@ class BaseRecipeAttrViewSet(
     """for "attributes of a recipe" - in this context - ingredients and tags"""
 
     # users can only authenticate by token
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [ExpiringTokenAuthentication]
     # only authenticated users can make requests to this API endpoint
     permission_classes = [IsAuthenticated]
+    throttle_scopes = {"list": "list"}
 
     # get_queryset method exists already, but it returns ALL the tags from all users. We want to return the tags for the currently authenticated user, so we're overriding it
     def get_queryset(self):
@@ -133,12 +463,78 @@ class BaseRecipeAttrViewSet(
 
         return queryset.filter(user=self.request.user).order_by("-name").distinct()
 
+    def get_serializer_class(self):
+        if self.action == "bulk_delete":
+            return serializers.BulkIdsSerializer
+        elif self.action == "bulk_rename":
+            return serializers.BulkRenameSerializer
+        elif self.action == "merge":
+            return serializers.MergeSerializer
+        return self.serializer_class
+
+    def _owned(self, ids):
+        """Return the user's objects with the given ids - all of them or 400"""
+        queryset = self.queryset.filter(user=self.request.user, id__in=ids)
+        found = set(queryset.values_list("id", flat=True))
+        missing = set(ids) - found
+        if missing:
+            raise ValidationError({"ids": [f"Not found: {sorted(missing)}"]})
+        return queryset
+
+    # the bulk actions take the same number of queries for 1 or 1000 objects.
+    # summaries.batch() defers the summary refreshes of every tag/ingredient to
+    # a single one at the end, in the same transaction
+    @action(methods=["POST"], detail=False, url_path="bulk-delete")
+    def bulk_delete(self, request):
+        """Delete many tags/ingredients at once"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        with summaries.batch():
+            self._owned(serializer.validated_data["ids"]).delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(methods=["POST"], detail=False, url_path="bulk-rename")
+    def bulk_rename(self, request):
+        """Rename many tags/ingredients at once"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        names = {
+            item["id"]: item["name"]
+            for item in serializer.validated_data["items"]
+        }
+        with summaries.batch():
+            objs = list(self._owned(names).order_by("id"))
+            for obj in objs:
+                obj.name = names[obj.id]
+            # one UPDATE ... CASE, and no post_save signals - refresh ourselves
+            self.queryset.model.objects.bulk_update(objs, ["name"])
+            summaries.refresh_recipes_using(self.queryset.model, names)
+            changelog.record(request.user.id, self.change_kind, names)
+        return Response(self.serializer_class(objs, many=True).data)
+
+    @action(methods=["POST"], detail=False)
+    def merge(self, request):
+        """Merge tags/ingredients into one, moving them over on every recipe"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        into = serializer.validated_data["into"]
+        ids = set(serializer.validated_data["ids"]) - {into}
+        with summaries.batch():
+            target = self._owned(ids | {into}).select_for_update().get(id=into)
+            added = links.repoint(self.recipe_field, ids, into)
+            changelog.record_links(request.user.id, self.recipe_field, added)
+            # their (now duplicate) M2M rows go with them
+            self.queryset.filter(id__in=ids).delete()
+        return Response(self.serializer_class(target).data)
+
 
 class TagViewSet(BaseRecipeAttrViewSet):
     """Manage tags in the database."""
 
     serializer_class = serializers.TagSerializer
     queryset = Tag.objects.all()
+    recipe_field = "tags"
+    change_kind = "tag"
 
 
 class IngredientViewSet(BaseRecipeAttrViewSet):
@@ -146,3 +542,106 @@ class IngredientViewSet(BaseRecipeAttrViewSet):
 
     serializer_class = serializers.IngredientSerializer
     queryset = Ingredient.objects.all()
+    recipe_field = "ingredients"
+    change_kind = "ingredient"
+
+
+@extend_schema_view(
+    get=extend_schema(
+        parameters=[
+            OpenApiParameter(
+                "cursor",
+                OpenApiTypes.INT,
+                description=(
+                    "Cursor returned by the previous sync, 0 for everything"
+                ),
+            ),
+            OpenApiParameter(
+                "limit",
+                OpenApiTypes.INT,
+                description=(
+                    "Most changes to return (capped at SYNC_PAGE_SIZE)"
+                ),
+            ),
+        ]
+    )
+)
+class SyncView(AsyncReadMixin, ReplicaReadMixin, generics.GenericAPIView):
+    """Changes to the user's recipes, tags and ingredients since a cursor
+
+    For offline clients - keep the returned cursor and ask for the changes
+    since then on the next sync, until has_more is false. An object changed
+    many times only shows up once, with its current state.
+    """
+
+    serializer_class = serializers.SyncSerializer
+    authentication_classes = [ExpiringTokenAuthentication]
+    permission_classes = [IsAuthenticated]
+    throttle_scope = "list"
+
+    def _int_param(self, name, default):
+        try:
+            value = int(self.request.query_params.get(name, default))
+        except ValueError:
+            value = -1
+        if value < 0:
+            raise ValidationError({name: ["Must be a non-negative integer."]})
+        return value
+
+    def get(self, request):
+        cursor = self._int_param("cursor", 0)
+        limit = self._int_param("limit", settings.SYNC_PAGE_SIZE)
+        limit = min(max(limit, 1), settings.SYNC_PAGE_SIZE)
+        changes, has_more = changelog.changes_since(
+            request.user, cursor, limit
+        )
+
+        changed = {kind: [] for kind in ("recipe", "tag", "ingredient")}
+        data = {
+            "cursor": changes[-1].seq if changes else cursor,
+            "has_more": has_more,
+            "recipe_tags": [],
+            "recipe_ingredients": [],
+            "deleted": {
+                "recipes": [],
+                "tags": [],
+                "ingredients": [],
+                "recipe_tags": [],
+                "recipe_ingredients": [],
+            },
+        }
+        for change in changes:
+            if change.kind in changed:
+                if change.deleted:
+                    data["deleted"][f"{change.kind}s"].append(change.object_id)
+                else:
+                    changed[change.kind].append(change.object_id)
+            else:
+                pairs = data["deleted"] if change.deleted else data
+                pairs[f"{change.kind}s"].append(
+                    [change.object_id, change.related_id]
+                )
+
+        # a link to something deleted in the same page would bring it back
+        deleted = data["deleted"]
+        for kind, attrs in (
+            ("recipe_tags", "tags"),
+            ("recipe_ingredients", "ingredients"),
+        ):
+            recipe_ids, attr_ids = set(deleted["recipes"]), set(deleted[attrs])
+            data[kind] = [
+                pair
+                for pair in data[kind]
+                if pair[0] not in recipe_ids and pair[1] not in attr_ids
+            ]
+
+        # the current state of everything changed, one query per model. Gone
+        # since the change was logged means the tombstone comes next sync
+        models = [(Recipe, "recipe"), (Tag, "tag"), (Ingredient, "ingredient")]
+        for model, kind in models:
+            objs = model.objects.filter(user=request.user).in_bulk(
+                changed[kind]
+            )
+            data[f"{kind}s"] = [objs[pk] for pk in changed[kind] if pk in objs]
+
+        return Response(self.get_serializer(data).data)
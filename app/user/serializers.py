@@ -56,3 +56,8 @@ class AuthTokenSerializer(serializers.Serializer):
 
         attrs["user"] = user
         return attrs
+
+
+class RevokeTokensSerializer(serializers.Serializer):
+    # e.g. "log out all other devices"
+    keep_current = serializers.BooleanField(default=False)
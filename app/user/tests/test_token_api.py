@@ -0,0 +1,138 @@
+"""Tests for the expiring tokens"""
+
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import ExpiringToken
+
+TOKEN_URL = reverse("user:token")
+REVOKE_URL = reverse("user:token-revoke")
+ME_URL = reverse("user:me")
+
+
+class TokenApiTests(TestCase):
+    """Test issuing, using and revoking tokens"""
+
+    def setUp(self):
+        caches["default"].clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "user@example.com", "testpass123"
+        )
+
+    def login(self):
+        res = self.client.post(
+            TOKEN_URL, {"email": "user@example.com", "password": "testpass123"}
+        )
+        return res.data["token"]
+
+    def get_me(self, key):
+        return self.client.get(ME_URL, HTTP_AUTHORIZATION=f"Token {key}")
+
+    def test_new_token_per_login(self):
+        res = self.client.post(
+            TOKEN_URL, {"email": "user@example.com", "password": "testpass123"}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn("expires", res.data)
+        self.login()
+        self.assertEqual(self.user.auth_tokens.count(), 2)
+
+    def test_browsable_api(self):
+        """The login page uses the default renderers, not just JSON"""
+        res = self.client.get(TOKEN_URL, HTTP_ACCEPT="text/html")
+
+        self.assertEqual(res.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+        self.assertTrue(res["Content-Type"].startswith("text/html"))
+
+    def test_authenticate_with_token(self):
+        res = self.get_me(self.login())
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["email"], "user@example.com")
+
+    def test_expired_token_rejected(self):
+        key = self.login()
+        ExpiringToken.objects.filter(key=key).update(
+            expires=timezone.now() - timedelta(seconds=1)
+        )
+
+        res = self.get_me(key)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(TOKEN_TTL=timedelta(days=7))
+    def test_expiry_slides_when_used(self):
+        key = self.login()
+        token = ExpiringToken.objects.get(key=key)
+
+        later = timezone.now() + timedelta(days=2)
+        with patch("django.utils.timezone.now", return_value=later):
+            self.get_me(key)
+
+        token.refresh_from_db()
+        self.assertAlmostEqual(
+            token.expires,
+            later + timedelta(days=7),
+            delta=timedelta(seconds=1),
+        )
+
+    def test_expiry_not_written_every_request(self):
+        key = self.login()
+        self.get_me(key)
+
+        # token + user lookup, no UPDATE
+        with self.assertNumQueries(1):
+            self.get_me(key)
+
+    @override_settings(TOKEN_MAX_AGE=timedelta(days=10))
+    def test_expiry_capped_by_max_age(self):
+        key = self.login()
+        token = ExpiringToken.objects.get(key=key)
+
+        later = token.created + timedelta(days=6)
+        with patch("django.utils.timezone.now", return_value=later):
+            self.get_me(key)
+
+        token.refresh_from_db()
+        self.assertEqual(token.expires, token.created + timedelta(days=10))
+
+    def test_revoke_all(self):
+        key = self.login()
+        other_key = self.login()
+
+        res = self.client.post(REVOKE_URL, HTTP_AUTHORIZATION=f"Token {key}")
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["revoked"], 2)
+        self.assertEqual(self.get_me(other_key).status_code, 401)
+        self.assertEqual(self.get_me(key).status_code, 401)
+
+    def test_revoke_keep_current(self):
+        key = self.login()
+        other_key = self.login()
+        other_user = get_user_model().objects.create_user(
+            "o@example.com", "pw123"
+        )
+        ExpiringToken.objects.create(user=other_user)
+
+        res = self.client.post(
+            REVOKE_URL,
+            {"keep_current": True},
+            HTTP_AUTHORIZATION=f"Token {key}",
+        )
+
+        self.assertEqual(res.data["revoked"], 1)
+        self.assertEqual(self.get_me(key).status_code, 200)
+        self.assertEqual(self.get_me(other_key).status_code, 401)
+        self.assertTrue(ExpiringToken.objects.filter(user=other_user).exists())
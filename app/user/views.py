@@ -1,10 +1,20 @@
 """Views for the user API"""
 
-from rest_framework import generics, authentication, permissions
+from rest_framework import generics, permissions
 from rest_framework.authtoken.views import ObtainAuthToken
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
 from rest_framework.settings import api_settings
 
-from user.serializers import UserSerializer, AuthTokenSerializer
+from core import metrics
+from core.authentication import ExpiringTokenAuthentication, issue_token
+from core.db_routers import ReplicaReadMixin
+from core.hashers import PasswordCheckBusy
+from user.serializers import (
+    UserSerializer,
+    AuthTokenSerializer,
+    RevokeTokensSerializer,
+)
 
 
 # the generics.CreateAPIView handles creating user object in the database
@@ -16,15 +26,49 @@ class CreateUserView(generics.CreateAPIView):
 
 class CreateTokenView(ObtainAuthToken):
     serializer_class = AuthTokenSerializer
+    # ObtainAuthToken turns throttling off, but every attempt is a (slow on
+    # purpose) password check
+    throttle_classes = api_settings.DEFAULT_THROTTLE_CLASSES
+    throttle_scope = "token"
     # we need to put that line if we want a nice browsable API docs in the browser from what I've gathered
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
 
+    def post(self, request, *args, **kwargs):
+        """Log in, handing out a new token every time"""
+        serializer = self.get_serializer(data=request.data)
+        if not serializer.is_valid():
+            if getattr(request, "password_check_busy", False):
+                # set by PasswordBackend, the password wasn't checked at all
+                raise PasswordCheckBusy()
+            metrics.LOGINS.inc(result="failed")
+            raise ValidationError(serializer.errors)
+        metrics.LOGINS.inc(result="ok")
+        token = issue_token(serializer.validated_data["user"])
+        return Response({"token": token.key, "expires": token.expires})
 
-class ManageUserView(generics.RetrieveUpdateAPIView):
+
+class RevokeTokensView(generics.GenericAPIView):
+    """Log out everywhere - revoke all the user's tokens at once"""
+
+    serializer_class = RevokeTokensSerializer
+    authentication_classes = [ExpiringTokenAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        tokens = request.user.auth_tokens.all()
+        if serializer.validated_data["keep_current"]:
+            tokens = tokens.exclude(key=request.auth.key)
+        revoked, _ = tokens.delete()
+        return Response({"revoked": revoked})
+
+
+class ManageUserView(ReplicaReadMixin, generics.RetrieveUpdateAPIView):
     """Manage the authenticated user"""
 
     serializer_class = UserSerializer
-    authentication_classes = [authentication.TokenAuthentication]
+    authentication_classes = [ExpiringTokenAuthentication]
     permission_classes = [permissions.IsAuthenticated]
 
     def get_object(self):
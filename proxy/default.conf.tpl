@@ -3,11 +3,17 @@ server {
 
     location /static {
         alias /vol/static;
+        # API responses are compressed by the app itself, static files here
+        gzip on;
+        gzip_min_length 1024;
+        gzip_types text/css application/javascript application/json image/svg+xml;
     }
 
     location / {
         uwsgi_pass           ${APP_HOST}:${APP_PORT};
         include              /etc/nginx/uwsgi_params;
+        # the throttles trust the last address in here (NUM_PROXIES=1)
+        uwsgi_param          HTTP_X_FORWARDED_FOR $proxy_add_x_forwarded_for;
         client_max_body_size 10M;
     }
-}
\ No newline at end of file
+}
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+"""Measure how fast requests fare while slow clients hold connections open
+
+Opens a number of "slow" connections that trickle their request headers in
+and then read the response a little at a time, and while they're hanging
+around fires normal requests and reports their latency. Run it once against
+the uWSGI setup and once with SERVER_MODE=asgi to compare, e.g.:
+
+    python scripts/bench_slow_clients.py http://localhost/api/health-check/ \
+        --slow 200 --fast 500 --token <token>
+
+Only uses the standard library so it can run from anywhere.
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from urllib.parse import urlsplit
+
+
+def build_request(url, token):
+    parts = urlsplit(url)
+    path = parts.path or "/"
+    if parts.query:
+        path += "?" + parts.query
+    headers = [
+        f"GET {path} HTTP/1.1",
+        f"Host: {parts.netloc}",
+        "Accept: application/json",
+        "Connection: close",
+    ]
+    if token:
+        headers.append(f"Authorization: Token {token}")
+    return ("\r\n".join(headers) + "\r\n\r\n").encode()
+
+
+async def open_connection(url):
+    parts = urlsplit(url)
+    port = parts.port or (443 if parts.scheme == "https" else 80)
+    return await asyncio.open_connection(
+        parts.hostname, port, ssl=parts.scheme == "https" or None
+    )
+
+
+async def slow_client(url, request, trickle, stop):
+    """Send the request a byte at a time, then read the response slowly"""
+    try:
+        reader, writer = await open_connection(url)
+        delay = trickle / len(request)
+        for i in range(len(request)):
+            writer.write(request[i : i + 1])
+            await writer.drain()
+            await asyncio.sleep(delay)
+        while not stop.is_set():
+            chunk = await reader.read(512)
+            if not chunk:
+                break
+            await asyncio.sleep(0.1)
+        writer.close()
+    except OSError:
+        pass
+
+
+async def fast_request(url, request):
+    """Return (latency seconds, status code) for one normal request"""
+    start = time.perf_counter()
+    reader, writer = await open_connection(url)
+    writer.write(request)
+    await writer.drain()
+    status_line = await reader.readline()
+    await reader.read()
+    writer.close()
+    status = int(status_line.split()[1]) if status_line else 0
+    return time.perf_counter() - start, status
+
+
+async def run(args):
+    request = build_request(args.url, args.token)
+    stop = asyncio.Event()
+    slow = [
+        asyncio.create_task(slow_client(args.url, request, args.trickle, stop))
+        for _ in range(args.slow)
+    ]
+    # give the slow clients time to grab their connections
+    await asyncio.sleep(min(args.trickle / 2, 2))
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def probe():
+        async with semaphore:
+            try:
+                return await asyncio.wait_for(
+                    fast_request(args.url, request), args.timeout
+                )
+            except (OSError, asyncio.TimeoutError):
+                return None, None
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(probe() for _ in range(args.fast)))
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    for task in slow:
+        task.cancel()
+    await asyncio.gather(*slow, return_exceptions=True)
+
+    latencies = sorted(r[0] for r in results if r[0] is not None)
+    errors = sum(1 for r in results if r[0] is None or r[1] >= 500)
+    print(f"slow clients:   {args.slow}")
+    print(f"fast requests:  {args.fast} ({errors} failed/timed out)")
+    print(f"throughput:     {len(latencies) / elapsed:.1f} req/s")
+    if latencies:
+        pct = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else []
+        print(f"latency p50:    {statistics.median(latencies) * 1000:.1f} ms")
+        if pct:
+            print(f"latency p95:    {pct[94] * 1000:.1f} ms")
+            print(f"latency p99:    {pct[98] * 1000:.1f} ms")
+        print(f"latency max:    {latencies[-1] * 1000:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("url")
+    parser.add_argument("--slow", type=int, default=100, help="slow connections")
+    parser.add_argument("--fast", type=int, default=200, help="normal requests")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument(
+        "--trickle", type=float, default=10.0, help="seconds to send slow headers"
+    )
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--token", help="API token for authenticated endpoints")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
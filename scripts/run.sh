@@ -3,8 +3,49 @@
 set -e
 
 python manage.py wait_for_db
-python manage.py collectstatic --noinput
-python manage.py migrate
 
+# COLLECTSTATIC=build (default) copies the files collected when the image was
+# built, and only if this image's build hasn't been copied yet. "always" runs
+# collectstatic on every start like before.
+if [ "${COLLECTSTATIC:-build}" = "always" ] || [ ! -f /static-build/.build-id ]; then
+    python manage.py collectstatic --noinput
+elif ! cmp -s /static-build/.build-id /vol/web/static/.build-id; then
+    cp -R /static-build/. /vol/web/static/
+fi
 
-uwsgi --socket :9000 --workers 4 --master --enable-threads --module app.wsgi
\ No newline at end of file
+# MIGRATE=check (default) only runs migrate when something is unapplied, "always"
+# runs it on every start and "skip" leaves it to a separate job, e.g.
+#   docker-compose run --rm app sh -c "python manage.py wait_for_db && python manage.py migrate"
+case "${MIGRATE:-check}" in
+    always) python manage.py migrate ;;
+    check) python manage.py check_migrations || python manage.py migrate ;;
+    skip) ;;
+esac
+
+# the worker processes keep their metrics in here (see core/metrics.py), it's
+# emptied on start so counters of the previous run don't linger
+export METRICS_DIR="${METRICS_DIR:-/vol/metrics}"
+mkdir -p "$METRICS_DIR"
+rm -f "$METRICS_DIR"/*.db
+
+CPUS=$(nproc)
+
+if [ "${SERVER_MODE:-uwsgi}" = "asgi" ]; then
+    # ASGI mode - gunicorn managing uvicorn workers, proxied over plain HTTP by nginx
+    exec gunicorn app.asgi:application \
+        --worker-class uvicorn.workers.UvicornWorker \
+        --bind :9000 \
+        --workers "${WEB_CONCURRENCY:-$CPUS}"
+fi
+
+# defaults for scripts/uwsgi.ini
+export WEB_CONCURRENCY="${WEB_CONCURRENCY:-$((CPUS * 2))}"
+export WEB_THREADS="${WEB_THREADS:-2}"
+export WEB_LAZY_APPS="${WEB_LAZY_APPS:-false}"
+export WEB_HARAKIRI="${WEB_HARAKIRI:-30}"
+export WEB_MAX_REQUESTS="${WEB_MAX_REQUESTS:-5000}"
+export WEB_RELOAD_ON_RSS="${WEB_RELOAD_ON_RSS:-256}"
+export WEB_LISTEN_BACKLOG="${WEB_LISTEN_BACKLOG:-1024}"
+export WEB_STATS="${WEB_STATS:-127.0.0.1:9191}"
+
+exec uwsgi --ini /scripts/uwsgi.ini